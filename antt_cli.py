@@ -0,0 +1,197 @@
+"""
+Execução em lote pela linha de comando (sem Streamlit), com o mesmo pipeline
+da UI: planilha -> consulta -> diário/checkpoint -> XLSX. Retoma sozinho a
+partir do checkpoint do mesmo arquivo.
+
+Exemplo:
+    ANTT_USUARIO=... ANTT_SENHA=... python antt_cli.py entrada.xlsx -o resultado.xlsx --workers 2
+"""
+import os
+import sys
+import json
+import shutil
+import signal
+import logging
+import argparse
+from typing import Tuple
+
+from antt_core import (
+    BACKEND_HTTP,
+    BACKEND_SELENIUM,
+    CFG,
+    JobParams,
+    JobState,
+    ResultCache,
+    carregar_df_or_checkpoint,
+    executar_job,
+    make_job_id,
+    modo_atualizacao,
+    novo_runtime,
+    paths_for_job,
+)
+
+logger = logging.getLogger("ANTT_BOT")
+
+
+def ler_credenciais(args: argparse.Namespace) -> Tuple[str, str]:
+    """
+    Ordem: --credenciais (JSON {"usuario", "senha"} ou duas linhas), depois as
+    variáveis ANTT_USUARIO / ANTT_SENHA.
+    """
+    if args.credenciais:
+        with open(args.credenciais, "r", encoding="utf-8") as f:
+            conteudo = f.read().strip()
+        try:
+            dados = json.loads(conteudo)
+        except ValueError:
+            linhas = conteudo.splitlines()
+            if len(linhas) < 2:
+                raise SystemExit("Arquivo de credenciais deve ter usuário e senha em linhas separadas.")
+            return linhas[0].strip(), linhas[1].strip()
+        if not isinstance(dados, dict) or "usuario" not in dados or "senha" not in dados:
+            raise SystemExit('Arquivo de credenciais em JSON deve ser um objeto {"usuario": ..., "senha": ...}.')
+        return str(dados["usuario"]), str(dados["senha"])
+
+    usuario = os.environ.get("ANTT_USUARIO", "")
+    senha = os.environ.get("ANTT_SENHA", "")
+    if not usuario or not senha:
+        raise SystemExit("Informe as credenciais via --credenciais ou ANTT_USUARIO/ANTT_SENHA.")
+    return usuario, senha
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Robô ANTT - consulta automatizada em lote (linha de comando).")
+    p.add_argument("entrada", help="Planilha .xlsx/.csv/.parquet com a coluna 'Auto de Infração'.")
+    p.add_argument("--manter-coluna", action="append", default=[], metavar="COLUNA",
+                   help="Coluna da entrada copiada para o resultado (pode repetir).")
+    p.add_argument("-o", "--saida", help="Caminho do XLSX de resultado (padrão: <entrada>_resultado.xlsx).")
+    p.add_argument("--credenciais", help="Arquivo com usuário e senha (JSON ou duas linhas).")
+    p.add_argument("--backend", choices=[BACKEND_SELENIUM, BACKEND_HTTP], default=BACKEND_SELENIUM)
+    p.add_argument("--workers", type=int, default=1, help="Sessões paralelas (cada uma com o seu login).")
+    p.add_argument("--vazao-fixa", action="store_true",
+                   help="Desliga a vazão adaptativa e usa o delay de --throttle.")
+    p.add_argument("--throttle", type=float, default=0.3, help="Delay fixo entre consultas (com --vazao-fixa).")
+    p.add_argument("--checkpoint-every", type=int, default=10, help="fsync do diário a cada N autos.")
+    p.add_argument("--timeout", type=int, default=CFG.timeout, help="Timeout das esperas do Selenium.")
+    p.add_argument("--detalhe-em-aba", action="store_true", help="Detalhe numa aba reutilizada (sem popup).")
+    p.add_argument("--perfil-enxuto", action="store_true", help="Chromium sem imagens/CSS/fontes e carga eager.")
+    p.add_argument("--abas", type=int, default=CFG.abas_por_driver,
+                   help="Abas de consulta por Chromium, no mesmo login (1 = sequencial).")
+    p.add_argument("--reciclar-apos-autos", type=int, default=CFG.reciclar_apos_autos,
+                   help="Recicla o Chromium após N autos (0 = nunca).")
+    p.add_argument("--reciclar-rss-mb", type=float, default=CFG.reciclar_rss_mb,
+                   help="Recicla quando o navegador passar deste RSS (0 = nunca).")
+    p.add_argument("--reciclar-idade-min", type=float, default=CFG.reciclar_idade_min,
+                   help="Recicla navegadores mais velhos que isto (0 = nunca).")
+    p.add_argument("--reserva-quente", action="store_true",
+                   help="Mantém um Chromium extra logado que assume na hora quando o de um worker cai.")
+    p.add_argument("--retentativas-adiadas", type=int, default=CFG.retentativas_adiadas,
+                   help="Rodadas no fim do job para autos com falha transitória.")
+    p.add_argument("--backoff-adiados-s", type=float, default=CFG.backoff_adiados_s,
+                   help="Espera antes da 1ª rodada adiada (dobra a cada rodada).")
+    p.add_argument("--sem-headless", action="store_true", help="Mostra o navegador.")
+    p.add_argument("--sem-cache", action="store_true", help="Não usa o cache de resultados entre jobs.")
+    p.add_argument("--forcar-atualizacao", action="store_true", help="Ignora o cache (mas o atualiza).")
+    p.add_argument("--sem-reusar-sessao", action="store_true", help="Não reaproveita cookies salvos do login.")
+    p.add_argument("--metricas-dir", default=CFG.metricas_dir, help="Destino de antt_metrics.json/.prom.")
+    p.add_argument("--atualizacao-incremental", action="store_true",
+                   help="A entrada é um resultado anterior: reconsulta só autos sem andamento final "
+                        "e não consultados recentemente, marcando os que mudaram.")
+    p.add_argument("--andamento-final", action="append", metavar="TEXTO",
+                   help="Andamento final, não reconsultado (pode repetir; substitui a lista padrão).")
+    p.add_argument("--atualizar-apos-h", type=float, default=CFG.atualizar_apos_h,
+                   help="Na atualização incremental, reconsulta só o consultado há mais de N horas.")
+    p.add_argument("--recomecar", action="store_true", help="Descarta o checkpoint deste arquivo.")
+    p.add_argument("--debug", action="store_true")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+    )
+    usuario, senha = ler_credenciais(args)
+
+    CFG.timeout = args.timeout
+    CFG.detalhe_em_aba = args.detalhe_em_aba
+    CFG.perfil_enxuto = args.perfil_enxuto
+    CFG.abas_por_driver = max(1, args.abas)
+    CFG.colunas_extra = tuple(args.manter_coluna)
+    CFG.reciclar_apos_autos = args.reciclar_apos_autos
+    CFG.reciclar_rss_mb = args.reciclar_rss_mb
+    CFG.reciclar_idade_min = args.reciclar_idade_min
+    CFG.reserva_quente = args.reserva_quente or CFG.reserva_quente
+    CFG.retentativas_adiadas = args.retentativas_adiadas
+    CFG.backoff_adiados_s = args.backoff_adiados_s
+    CFG.metricas_dir = args.metricas_dir
+    CFG.reusar_sessao = not args.sem_reusar_sessao
+    if args.andamento_final:
+        CFG.andamentos_finais = tuple(args.andamento_final)
+    CFG.atualizar_apos_h = args.atualizar_apos_h
+
+    with open(args.entrada, "rb") as f:
+        job_id = make_job_id(f.read(), modo_atualizacao() if args.atualizacao_incremental else "")
+
+    if args.recomecar:
+        for path in paths_for_job(job_id).values():
+            if os.path.exists(path):
+                os.remove(path)
+
+    job = JobState(job_id, eco=lambda ts, level, msg: print(f"[{ts}] {level.upper():7} {msg}", flush=True))
+    df = carregar_df_or_checkpoint(args.entrada, job, atualizacao=args.atualizacao_incremental)
+    if job.total <= 0 and not args.atualizacao_incremental:
+        logger.error("Nenhum auto encontrado.")
+        return 1
+
+    # +1 para a reserva quente (rodar_job a separa dos workers).
+    n_runtimes = max(1, args.workers) + (1 if CFG.reserva_quente and args.backend == BACKEND_SELENIUM else 0)
+    runtimes = [novo_runtime(args.backend) for _ in range(n_runtimes)]
+    params = JobParams(
+        usuario=usuario,
+        senha=senha,
+        headless=not args.sem_headless,
+        debug=args.debug,
+        checkpoint_every=args.checkpoint_every,
+        throttle=args.throttle,
+        vazao_adaptativa=not args.vazao_fixa,
+        n_workers=args.workers,
+        backend=args.backend,
+        cache=None if args.sem_cache else ResultCache(
+            CFG.cache_dir, CFG.cache_ttl_sucesso_h, CFG.cache_ttl_nao_encontrado_h, CFG.cache_max_mb
+        ),
+        forcar_atualizacao=args.forcar_atualizacao,
+        runtimes=runtimes,
+    )
+
+    # Ctrl+C / SIGTERM: para depois do auto em andamento, com checkpoint salvo.
+    def parar(signum, frame):
+        job.log("Sinal recebido. Parando após o auto em andamento...", "warning")
+        job.stop_event.set()
+
+    signal.signal(signal.SIGINT, parar)
+    signal.signal(signal.SIGTERM, parar)
+
+    job.running = True
+    try:
+        executar_job(job, df, params)
+    finally:
+        for rt in runtimes:
+            rt.stop()
+
+    if job.summary:
+        print(job.summary, flush=True)
+    if job.last_error or job.cursor < job.total:
+        return 1
+
+    if not job.result_xlsx_path:
+        return 1
+    saida = args.saida or os.path.splitext(args.entrada)[0] + "_resultado.xlsx"
+    shutil.copyfile(job.result_xlsx_path, saida)
+    print(f"Resultado: {saida}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
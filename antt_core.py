@@ -0,0 +1,4013 @@
+"""
+Núcleo do robô ANTT, sem dependência do Streamlit: runtimes (Selenium/HTTP),
+login, consulta, checkpoint em diário, cache e execução de jobs.
+Usado pela UI (app.py) e pela linha de comando (antt_cli.py).
+"""
+import os
+import re
+import time
+import json
+import queue
+import shutil
+import socket
+import hashlib
+import logging
+import sqlite3
+import threading
+import traceback
+import zipfile
+import datetime as dt
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import numpy as np
+import pandas as pd
+import requests
+from openpyxl import Workbook, load_workbook
+import urllib3
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import (
+    JavascriptException,
+    StaleElementReferenceException,
+    TimeoutException,
+    WebDriverException,
+)
+
+
+logger = logging.getLogger("ANTT_BOT")
+
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+# ANTT_BASE_URL aponta o robô para outro host (ex.: o mock de bench/mock_antt.py).
+BASE_URL_ANTT = os.environ.get("ANTT_BASE_URL", "https://appweb1.antt.gov.br").rstrip("/")
+PATH_LOGIN = "/spm/Site/Login.aspx"
+PATH_CONSULTA = "/spm/Site/DefesaCTB/ConsultaProcessoSituacao.aspx"
+
+
+@dataclass
+class Config:
+    # URL de login CORRIGIDA
+    url_login: str = BASE_URL_ANTT + PATH_LOGIN
+    url_consulta: str = BASE_URL_ANTT + PATH_CONSULTA
+    timeout: int = 20
+    # True: o detalhe do auto é carregado numa aba secundária reutilizada em vez
+    # de um popup novo por auto (ver JS_HOOK_WINDOW_OPEN).
+    detalhe_em_aba: bool = False
+
+    col_auto: str = "Auto de Infração"
+    col_processo: str = "Nº do Processo"
+    col_data: str = "Data da Infração"
+    col_codigo: str = "Código da Infração"
+    col_fato: str = "Fato Gerador"
+    col_andamento: str = "Último Andamento"
+    col_data_andamento: str = "Data do Último Andamento"
+    col_status: str = "Status Consulta"
+    col_consultado_em: str = "Consultado em"  # última resposta definitiva do site
+    col_alterado: str = "Alterado"  # só na atualização incremental
+    # Colunas da entrada copiadas para o resultado além do auto e das colunas
+    # de saída (as demais não são lidas).
+    colunas_extra: Tuple[str, ...] = ()
+
+    # Atualização incremental (planilha de resultado anterior como entrada):
+    # não reconsulta autos com andamento final nem os consultados há menos de
+    # atualizar_apos_h horas. Andamentos comparados sem caixa/espaços.
+    andamentos_finais: Tuple[str, ...] = (
+        "Arquivado",
+        "Processo Arquivado",
+        "Trânsito em Julgado",
+        "Multa Paga",
+        "Auto Cancelado",
+    )
+    atualizar_apos_h: float = 72.0
+
+    # Diretório dos arquivos de cada job (diário, meta, índice, XLSX, eventos).
+    # Na execução em shards aponta para o volume compartilhado.
+    jobs_dir: str = os.environ.get("ANTT_JOBS_DIR", "/tmp")
+
+    # Execução em shards (ver TabelaShards): autos por shard e duração da
+    # concessão de um shard, renovada pelo processo enquanto ele trabalha.
+    shards_dir: str = os.environ.get("ANTT_SHARDS_DIR", "/tmp/antt_shards")
+    autos_por_shard: int = 500
+    concessao_shard_s: float = 300.0
+
+    # Cache de resultados entre jobs (ver ResultCache)
+    cache_dir: str = os.environ.get("ANTT_CACHE_DIR", "/tmp/antt_cache")
+    cache_ttl_sucesso_h: float = 24.0
+    cache_ttl_nao_encontrado_h: float = 6.0
+    cache_max_mb: float = 256.0
+
+    # Onde antt_metrics.json / antt_metrics.prom são exportados
+    metricas_dir: str = os.environ.get("ANTT_METRICS_DIR", "/tmp")
+
+    # Cookies da sessão autenticada, reinjetados quando o driver reinicia
+    # (ver restaurar_sessao). Um arquivo por usuário/host.
+    reusar_sessao: bool = True
+
+    # Perfil "enxuto" do Chromium: carga eager, viewport menor, sem rede de
+    # fundo/extensões e com imagens, fontes, CSS e rastreadores bloqueados
+    # (ver BLOQUEIOS_PERFIL_ENXUTO). Só lemos valores de formulário e tabelas.
+    perfil_enxuto: bool = False
+
+    # Reciclagem preventiva do Chromium entre dois autos (0 = critério
+    # desligado). Ver motivo_reciclagem.
+    reciclar_apos_autos: int = 400
+    reciclar_rss_mb: float = 1200.0
+    reciclar_idade_min: float = 90.0
+    log_memoria_cada: int = 50  # autos entre duas linhas da curva de memória
+
+    # Falhas transitórias voltam para novas rodadas no fim do job, com espera
+    # crescente (backoff_adiados_s, 2x, 4x...).
+    retentativas_adiadas: int = 3
+    backoff_adiados_s: float = 30.0
+    sessao_dir: str = os.environ.get("ANTT_SESSION_DIR", "/tmp/antt_sessions")
+
+    # Teto de runtimes (Chromium/sessões HTTP) vivos no processo, somando
+    # todos os jobs; ociosos além de runtime_ocioso_min são encerrados.
+    # Ver GerenciadorRuntimes.
+    max_runtimes: int = int(os.environ.get("ANTT_MAX_RUNTIMES", "4"))
+    runtime_ocioso_min: float = 10.0
+
+    # Abas de consulta por Chromium (1 = fluxo sequencial de processar_auto).
+    # Com K > 1 cada worker consulta K autos ao mesmo tempo no mesmo login
+    # (ver processar_autos_em_abas).
+    abas_por_driver: int = 1
+
+    # Navegador reserva já logado, que assume o lugar de um Chromium que caiu
+    # (ou que vai ser reciclado) sem esperar a subida e o login. Ocupa um
+    # runtime a mais do teto; a sessão é mantida com uma sonda a cada
+    # reserva_sonda_s. Ver ReservaQuente.
+    reserva_quente: bool = os.environ.get("ANTT_RESERVA_QUENTE", "") == "1"
+    reserva_sonda_s: float = 120.0
+
+    def usar_base_url(self, base_url: str) -> None:
+        base = base_url.rstrip("/")
+        self.url_login = base + PATH_LOGIN
+        self.url_consulta = base + PATH_CONSULTA
+
+
+CFG = Config()
+
+
+def copiar_config(cfg: Optional[Config] = None) -> Config:
+    """Cópia independente de `cfg` (padrão: CFG) para um job ou uma sessão da UI."""
+    return replace(cfg or CFG)
+
+
+BACKEND_SELENIUM = "selenium"
+BACKEND_HTTP = "http"
+
+
+# =============================================================================
+# IDS DOS ELEMENTOS (ASP.NET)
+# =============================================================================
+ID_USUARIO = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_TextBoxUsuario"
+ID_SENHA = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_TextBoxSenha"
+ID_BTN_OK = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ButtonOk"
+ID_AUTO = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_txbAutoInfracao"
+ID_PESQUISAR = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_btnPesquisar"
+ID_EDITAR_0 = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_gdvAutoInfracao_btnEditar_0"
+ID_PROCESSO = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_txbProcesso"
+ID_DATA_INFRACAO = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_txbDataInfracao"
+ID_CODIGO = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_txbCodigoInfracao"
+ID_FATO = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_txbObservacaoFiscalizacao"
+ID_DOCUMENTOS = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_ucDocumentosDoProcesso442_gdvDocumentosProcesso"
+
+# Campos lidos na página de detalhe: chave em `dados` -> id do textbox.
+CAMPOS_DETALHE: Dict[str, str] = {
+    "processo": ID_PROCESSO,
+    "data_infracao": ID_DATA_INFRACAO,
+    "codigo": ID_CODIGO,
+    "fato": ID_FATO,
+}
+
+
+# =============================================================================
+# LOG
+# =============================================================================
+# Destino dos logs da thread atual: a thread do job e os seus workers apontam
+# para JobState.log; fora de um job, vai só para o logger.
+_LOG_CTX = threading.local()
+
+
+def ui_log(msg: str, level: str = "info"):
+    sink = getattr(_LOG_CTX, "sink", None)
+    if sink is not None:
+        sink(msg, level)
+    else:
+        logger.log(logging.getLevelName(level.upper()), msg)
+
+
+class DiarioEventos:
+    """
+    Eventos estruturados do job (JSONL append-only, um objeto por linha com
+    "ts" e "tipo"), para análise depois da execução (antt_relatorio.py).
+    Sem fsync: ao contrário do diário de checkpoint, perder as últimas
+    linhas numa queda não afeta a retomada.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        reparar_journal(path)
+        self._f = open(path, "a", encoding="utf-8")
+
+    def registrar(self, tipo: str, **campos: Any) -> None:
+        linha = json.dumps({"ts": round(time.time(), 3), "tipo": tipo, **campos}, ensure_ascii=False)
+        with self.lock:
+            if not self._f.closed:
+                self._f.write(linha + "\n")
+                self._f.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self._f.close()
+
+
+def registrar_evento(tipo: str, **campos: Any) -> None:
+    """Evento no diário do job da thread atual (ver _LOG_CTX); fora de um job, nada."""
+    eventos = getattr(_LOG_CTX, "eventos", None)
+    if eventos is not None:
+        eventos.registrar(tipo, **campos)
+
+
+# =============================================================================
+# MÉTRICAS (LATÊNCIA POR ETAPA + CONTADORES)
+# =============================================================================
+class Metricas:
+    """
+    Histogramas por etapa (janela das últimas `janela` amostras, de onde saem
+    p50/p95/p99) e contadores por desfecho. Exportável em JSON e no formato
+    texto do Prometheus.
+    """
+
+    def __init__(self, janela: int = 5000):
+        self.janela = janela
+        self.lock = threading.Lock()
+        self.amostras: Dict[str, deque] = {}
+        self.total: Dict[str, Tuple[int, float]] = {}  # etapa -> (count, soma)
+        self.contadores: Dict[str, int] = {}
+
+    @contextmanager
+    def medir(self, etapa: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, time.perf_counter() - t0)
+
+    def observar(self, etapa: str, segundos: float) -> None:
+        with self.lock:
+            self.amostras.setdefault(etapa, deque(maxlen=self.janela)).append(segundos)
+            n, soma = self.total.get(etapa, (0, 0.0))
+            self.total[etapa] = (n + 1, soma + segundos)
+
+    def contar(self, nome: str, n: int = 1) -> None:
+        with self.lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + n
+
+    def valor(self, nome: str) -> int:
+        with self.lock:
+            return self.contadores.get(nome, 0)
+
+    def resumo(self) -> Dict[str, Any]:
+        with self.lock:
+            etapas = {}
+            for etapa, valores in self.amostras.items():
+                ordenados = sorted(valores)
+                n, soma = self.total[etapa]
+                etapas[etapa] = {
+                    "count": n,
+                    "sum": round(soma, 3),
+                    "p50": percentil(ordenados, 50),
+                    "p95": percentil(ordenados, 95),
+                    "p99": percentil(ordenados, 99),
+                }
+            return {"etapas": etapas, "contadores": dict(self.contadores)}
+
+    def prometheus(self) -> str:
+        r = self.resumo()
+        linhas = [
+            "# HELP antt_etapa_segundos Latência por etapa da consulta (janela recente).",
+            "# TYPE antt_etapa_segundos summary",
+        ]
+        for etapa, h in sorted(r["etapas"].items()):
+            for q, rotulo in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+                linhas.append(f'antt_etapa_segundos{{etapa="{etapa}",quantile="{rotulo}"}} {h[q]}')
+            linhas.append(f'antt_etapa_segundos_sum{{etapa="{etapa}"}} {h["sum"]}')
+            linhas.append(f'antt_etapa_segundos_count{{etapa="{etapa}"}} {h["count"]}')
+        linhas.append("# HELP antt_eventos_total Contadores por desfecho/evento.")
+        linhas.append("# TYPE antt_eventos_total counter")
+        for nome, v in sorted(r["contadores"].items()):
+            linhas.append(f'antt_eventos_total{{evento="{nome}"}} {v}')
+        return "\n".join(linhas) + "\n"
+
+    def exportar(self, diretorio: str) -> None:
+        """Grava antt_metrics.json e antt_metrics.prom (troca atômica)."""
+        os.makedirs(diretorio, exist_ok=True)
+        for nome, conteudo in (
+            ("antt_metrics.json", json.dumps(self.resumo(), ensure_ascii=False)),
+            ("antt_metrics.prom", self.prometheus()),
+        ):
+            path = os.path.join(diretorio, nome)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(conteudo)
+            os.replace(path + ".tmp", path)
+
+
+def rss_processos_kb(pid: Optional[int] = None, tipo_chromium: Optional[str] = None) -> int:
+    """
+    RSS somado de `pid` (padrão: este processo) e de todos os descendentes
+    (chromedriver, Chromium e renderers), lido de /proc. 0 fora do Linux.
+    Com `tipo_chromium` (ex.: "renderer") só entram os processos cuja linha
+    de comando tem `--type=<tipo>`.
+    """
+    raiz = pid or os.getpid()
+    filhos: Dict[int, List[int]] = {}
+    try:
+        entradas = [e for e in os.listdir("/proc") if e.isdigit()]
+    except OSError:
+        return 0
+    for e in entradas:
+        try:
+            with open(f"/proc/{e}/stat", "rb") as f:
+                stat = f.read().decode("utf-8", "replace")
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        filhos.setdefault(ppid, []).append(int(e))
+
+    total = 0
+    pendentes = [raiz]
+    while pendentes:
+        p = pendentes.pop()
+        pendentes.extend(filhos.get(p, ()))
+        if tipo_chromium:
+            try:
+                with open(f"/proc/{p}/cmdline", "rb") as f:
+                    if f"--type={tipo_chromium}".encode() not in f.read().split(b"\0"):
+                        continue
+            except OSError:
+                continue
+        try:
+            with open(f"/proc/{p}/status", "r", encoding="utf-8") as f:
+                for linha in f:
+                    if linha.startswith("VmRSS:"):
+                        total += int(linha.split()[1])
+                        break
+        except (OSError, ValueError):
+            pass
+    return total
+
+
+def percentil(ordenados: List[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    k = max(0, min(len(ordenados) - 1, int(round(p / 100.0 * len(ordenados) + 0.5)) - 1))
+    return round(ordenados[k], 3)
+
+
+# Uma instância por processo (a UI e a CLI leem/exportam a mesma).
+METRICAS = Metricas()
+
+
+def marcar_tempo(tempos: Dict[str, float], chave: str, t0: float, etapa: Optional[str] = None) -> None:
+    """Registra a duração desde `t0` em `res["tempos"]` e no histograma da etapa."""
+    dur = time.time() - t0
+    tempos[chave] = round(dur, 3)
+    METRICAS.observar(etapa or chave, dur)
+
+
+# =============================================================================
+# JOB / CHECKPOINT PATHS
+# =============================================================================
+def make_job_id(file_bytes: bytes, modo: str = "") -> str:
+    # `modo` separa jobs do mesmo arquivo com seleção de linhas diferente
+    # (ver modo_atualizacao); vazio mantém os ids de sempre.
+    h = hashlib.sha256(file_bytes)
+    if modo:
+        h.update(b"\0" + modo.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def paths_for_job(job_id: str, jobs_dir: Optional[str] = None) -> Dict[str, str]:
+    """Arquivos do job em `jobs_dir` (padrão: CFG.jobs_dir; nos shards, o diretório compartilhado)."""
+    base = os.path.join(jobs_dir or CFG.jobs_dir, f"antt_{job_id}")
+    return {
+        "journal": f"{base}_journal.jsonl",
+        "checkpoint_meta": f"{base}_meta.json",
+        "result_xlsx": f"{base}_result.xlsx",
+        "result_meta": f"{base}_result.json",
+        "indice": f"{base}_indice.npz",
+        "eventos": f"{base}_eventos.jsonl",
+    }
+
+
+# Tipo das colunas do DataFrame do job. Armazenamento "python" de propósito:
+# o "pyarrow" é mais compacto, mas cada df.at[...] = v num array Arrow
+# (imutável) copia a coluna inteira, e gravamos célula a célula.
+TEXTO = pd.StringDtype("python")
+
+
+def colunas_saida() -> List[str]:
+    return [
+        CFG.col_processo,
+        CFG.col_data,
+        CFG.col_codigo,
+        CFG.col_fato,
+        CFG.col_andamento,
+        CFG.col_data_andamento,
+        CFG.col_status,
+        CFG.col_consultado_em,
+    ]
+
+
+def ensure_output_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # A leitura (ler_planilha_entrada) já entrega texto sem NaN; aqui
+    # completamos as colunas de saída que faltarem e deixamos todas como
+    # StringDtype (não `object`, que aceita qualquer coisa e mistura NaN/None).
+    for col in colunas_saida():
+        if col not in df.columns:
+            df[col] = pd.Series("", index=df.index, dtype=TEXTO)
+    for col in df.columns:
+        if df[col].dtype != TEXTO:
+            df[col] = df[col].astype(TEXTO)
+    return df
+
+
+def aplicar_resultado(df: pd.DataFrame, original_idx: Any, res: Dict[str, Any]) -> bool:
+    df.at[original_idx, CFG.col_status] = res.get("mensagem", "")
+    if res.get("status") in ("sucesso", "nao_encontrado"):
+        # Registros do diário e do cache trazem o ts da consulta; resultados ao vivo, agora.
+        df.at[original_idx, CFG.col_consultado_em] = res.get("ts") or time.strftime("%Y-%m-%d %H:%M:%S")
+
+    if res.get("status") != "sucesso":
+        return False
+
+    d = res.get("dados", {})
+    if CFG.col_alterado in df.columns:
+        # Atualização incremental: compara com o que veio da planilha anterior.
+        antes = (df.at[original_idx, CFG.col_andamento], df.at[original_idx, CFG.col_data_andamento])
+        depois = (str(d.get("andamento", "")).strip(), str(d.get("data_andamento", "")).strip())
+        if tuple("" if pd.isna(v) else str(v).strip() for v in antes) != depois:
+            df.at[original_idx, CFG.col_alterado] = "Sim"
+    df.at[original_idx, CFG.col_processo] = d.get("processo", "")
+    df.at[original_idx, CFG.col_data] = d.get("data_infracao", "")
+    df.at[original_idx, CFG.col_codigo] = d.get("codigo", "")
+    df.at[original_idx, CFG.col_fato] = d.get("fato", "")
+    df.at[original_idx, CFG.col_andamento] = d.get("andamento", "")
+    df.at[original_idx, CFG.col_data_andamento] = d.get("data_andamento", "")
+    return True
+
+
+def reparar_journal(path: str) -> int:
+    """
+    Descarta uma última linha incompleta (queda no meio de um write) para que
+    os próximos appends comecem numa fronteira de registro. Retorna o tamanho.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        tamanho = f.tell()
+        if tamanho == 0:
+            return 0
+        f.seek(max(0, tamanho - 1))
+        if f.read(1) == b"\n":
+            return tamanho
+        # Procura a última quebra de linha completa (lendo de trás para frente).
+        pos = tamanho
+        while pos > 0:
+            bloco = min(65536, pos)
+            pos -= bloco
+            f.seek(pos)
+            dados = f.read(bloco)
+            i = dados.rfind(b"\n")
+            if i >= 0:
+                f.truncate(pos + i + 1)
+                return pos + i + 1
+        f.truncate(0)
+        return 0
+
+
+class CheckpointJournal:
+    """
+    Diário append-only (JSONL) do job: um registro por auto processado.
+    Cada registro é gravado com um único write + flush; o fsync é feito em
+    lotes de `fsync_every` registros.
+    """
+
+    def __init__(self, job_id: str, fsync_every: int = 10, jobs_dir: Optional[str] = None):
+        self.path = paths_for_job(job_id, jobs_dir)["journal"]
+        self.fsync_every = max(1, int(fsync_every))
+        reparar_journal(self.path)
+        self._f = open(self.path, "ab")
+        self._pendentes = 0
+
+    def append(self, registro: Dict[str, Any]) -> int:
+        linha = (json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8")
+        self._f.write(linha)
+        self._f.flush()
+        self._pendentes += 1
+        if self._pendentes >= self.fsync_every:
+            self.sync()
+        return self._f.tell()
+
+    def sync(self) -> None:
+        if self._pendentes:
+            os.fsync(self._f.fileno())
+            self._pendentes = 0
+
+    def offset(self) -> int:
+        return self._f.tell()
+
+    def close(self) -> None:
+        try:
+            self.sync()
+        finally:
+            self._f.close()
+
+
+def registro_journal(pos: int, original_idx: Any, auto: str, res: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "pos": pos,
+        "i": int(original_idx),
+        "auto": auto,
+        "status": res.get("status", "erro"),
+        "mensagem": res.get("mensagem", ""),
+        "dados": res.get("dados", {}),
+        "cache": bool(res.get("cache")),
+        "falha": res.get("falha"),
+        "ts": res.get("ts") or time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def ler_journal(path: str):
+    """Itera os registros completos do diário (ignora linha final truncada)."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for linha in f:
+            if not linha.endswith(b"\n"):
+                break
+            try:
+                yield json.loads(linha)
+            except ValueError:
+                break
+
+
+def save_checkpoint(meta: Dict[str, Any], job_id: str, jobs_dir: Optional[str] = None) -> None:
+    # O meta é só o cursor/offset do diário; troca atômica via rename.
+    p = paths_for_job(job_id, jobs_dir)
+    tmp = p["checkpoint_meta"] + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, p["checkpoint_meta"])
+
+
+def load_checkpoint(df: pd.DataFrame, job_id: str, jobs_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Reaplica o diário do job sobre a planilha de entrada (`df`, alterado no
+    lugar). Retorna o meta reconstruído ou None se não houver checkpoint.
+    """
+    p = paths_for_job(job_id, jobs_dir)
+    if not os.path.exists(p["journal"]):
+        return None
+
+    meta: Dict[str, Any] = {}
+    if os.path.exists(p["checkpoint_meta"]):
+        with open(p["checkpoint_meta"], "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+    resultados: Dict[int, bool] = {}
+    hits: Dict[int, bool] = {}
+    adiados = set()
+    cursor = 0
+    for rec in ler_journal(p["journal"]):
+        resultados[rec["pos"]] = aplicar_resultado(df, rec["i"], rec)
+        hits[rec["pos"]] = bool(rec.get("cache"))
+        if rec.get("falha") in FALHAS_ADIAVEIS:
+            adiados.add(rec["pos"])
+        else:
+            adiados.discard(rec["pos"])
+        cursor = max(cursor, rec["pos"] + 1)
+
+    if not resultados:
+        return None
+
+    ok = sum(1 for v in resultados.values() if v)
+    meta.update({
+        "cursor": cursor,
+        "ok": ok,
+        "fail": len(resultados) - ok,
+        "cache_hits": sum(1 for v in hits.values() if v),
+        "adiados": sorted(adiados),
+    })
+    return meta
+
+
+def journal_offset(job_id: str, jobs_dir: Optional[str] = None) -> int:
+    p = paths_for_job(job_id, jobs_dir)
+    return os.path.getsize(p["journal"]) if os.path.exists(p["journal"]) else 0
+
+
+def result_xlsx_em_cache(job_id: str, offset: int, jobs_dir: Optional[str] = None) -> Optional[str]:
+    """Caminho do XLSX já gerado para este mesmo offset do diário, se houver."""
+    p = paths_for_job(job_id, jobs_dir)
+    if not (os.path.exists(p["result_xlsx"]) and os.path.exists(p["result_meta"])):
+        return None
+    try:
+        with open(p["result_meta"], "r", encoding="utf-8") as f:
+            gerado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return p["result_xlsx"] if gerado.get("offset") == offset else None
+
+
+def save_result_xlsx(
+    df: pd.DataFrame, job_id: str, offset: Optional[int] = None, jobs_dir: Optional[str] = None
+) -> str:
+    """
+    Gera o XLSX em modo write-only do openpyxl (linhas gravadas em streaming,
+    sem montar a planilha inteira em memória). Se `offset` for informado e o
+    arquivo já corresponder a ele, reaproveita o que está em disco.
+    """
+    p = paths_for_job(job_id, jobs_dir)
+    if offset is not None and result_xlsx_em_cache(job_id, offset, jobs_dir):
+        return p["result_xlsx"]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([str(c) for c in df.columns])
+    for row in df.itertuples(index=False, name=None):
+        ws.append(["" if pd.isna(v) else v for v in row])
+
+    tmp = p["result_xlsx"] + ".tmp"
+    wb.save(tmp)
+    os.replace(tmp, p["result_xlsx"])
+
+    with open(p["result_meta"], "w", encoding="utf-8") as f:
+        json.dump({"offset": offset}, f)
+    return p["result_xlsx"]
+
+
+class IndiceTrabalho:
+    """
+    Lista de trabalho do job: posição -> (linha da planilha, auto normalizado).
+    Calculada uma vez e gravada junto do checkpoint (.npz): as linhas num
+    array int64 e os autos concatenados em UTF-8 com um array de offsets,
+    em vez de uma lista de objetos Python por linha.
+    """
+
+    def __init__(self, linhas: np.ndarray, offsets: np.ndarray, blob: bytes, n_linhas: int, coluna: str):
+        self.linhas = linhas
+        self.offsets = offsets
+        self.blob = blob
+        self.n_linhas = n_linhas  # tamanho da planilha de origem, para validar
+        self.coluna = coluna
+
+    def __len__(self) -> int:
+        return int(self.linhas.shape[0])
+
+    def linha(self, pos: int) -> int:
+        return int(self.linhas[pos])
+
+    def auto(self, pos: int) -> str:
+        return self.blob[self.offsets[pos]:self.offsets[pos + 1]].decode("utf-8")
+
+    def fatia(self, inicio: int, fim: int) -> "IndiceTrabalho":
+        """Posições [inicio, fim) como um índice próprio (um shard), com as mesmas linhas da planilha."""
+        offsets = self.offsets[inicio:fim + 1]
+        return IndiceTrabalho(
+            linhas=self.linhas[inicio:fim],
+            offsets=offsets - offsets[0],
+            blob=self.blob[int(offsets[0]):int(offsets[-1])],
+            n_linhas=self.n_linhas,
+            coluna=self.coluna,
+        )
+
+    @classmethod
+    def construir(cls, df: pd.DataFrame, selecao: Optional[np.ndarray] = None) -> "IndiceTrabalho":
+        autos = df[CFG.col_auto].astype(TEXTO).str.strip().fillna("")
+        mascara = (autos != "").to_numpy(dtype=bool)
+        if selecao is not None:
+            mascara &= selecao
+        codificados = [a.encode("utf-8") for a in autos[mascara].tolist()]
+        offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in codificados], out=offsets[1:])
+        return cls(
+            linhas=np.asarray(df.index[mascara], dtype=np.int64),
+            offsets=offsets,
+            blob=b"".join(codificados),
+            n_linhas=len(df),
+            coluna=CFG.col_auto,
+        )
+
+    def salvar(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                linhas=self.linhas,
+                offsets=self.offsets,
+                blob=np.frombuffer(self.blob, dtype=np.uint8),
+                n_linhas=np.int64(self.n_linhas),
+                coluna=np.array(self.coluna),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def carregar(cls, path: str) -> Optional["IndiceTrabalho"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                return cls(
+                    linhas=z["linhas"],
+                    offsets=z["offsets"],
+                    blob=z["blob"].tobytes(),
+                    n_linhas=int(z["n_linhas"]),
+                    coluna=str(z["coluna"]),
+                )
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.warning("Índice do job ilegível (%s); recalculando.", e)
+            return None
+
+
+def carregar_ou_construir_indice(
+    df: pd.DataFrame, job_id: str, selecao: Optional[np.ndarray] = None, jobs_dir: Optional[str] = None
+) -> IndiceTrabalho:
+    """
+    Reaproveita o índice gravado do job; se faltar ou não bater com `df`,
+    recalcula (só com as linhas de `selecao`, se informada). Na retomada o
+    índice gravado prevalece, então a seleção é a da criação do job.
+    """
+    path = paths_for_job(job_id, jobs_dir)["indice"]
+    indice = IndiceTrabalho.carregar(path)
+    if indice is not None and indice.n_linhas == len(df) and indice.coluna == CFG.col_auto:
+        return indice
+    indice = IndiceTrabalho.construir(df, selecao)
+    try:
+        indice.salvar(path)
+    except OSError as e:
+        logger.warning("Falha ao gravar o índice do job: %s", e)
+    return indice
+
+
+def normalizar_andamento(texto: Any) -> str:
+    return " ".join(str(texto).split()).casefold()
+
+
+def modo_atualizacao(cfg: Optional[Config] = None) -> str:
+    """Parâmetros da atualização incremental, para o id do job (ver make_job_id)."""
+    cfg = cfg or CFG
+    finais = ";".join(sorted(normalizar_andamento(a) for a in cfg.andamentos_finais))
+    return f"atualizacao:{cfg.atualizar_apos_h:g}:{finais}"
+
+
+def linhas_para_atualizar(
+    df: pd.DataFrame, agora: Optional[float] = None, cfg: Optional[Config] = None
+) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Máscara das linhas a reconsultar numa planilha de resultado anterior:
+    fora as de andamento final e as com "Consultado em" mais recente que
+    cfg.atualizar_apos_h. Devolve também as contagens de cada motivo.
+    """
+    cfg = cfg or CFG
+    finais = {normalizar_andamento(a) for a in cfg.andamentos_finais}
+    andamento = df[cfg.col_andamento].fillna("").str.split().str.join(" ").str.casefold()
+    final = andamento.isin(finais).to_numpy(dtype=bool)
+
+    limite = pd.Timestamp.fromtimestamp(agora or time.time()) - pd.Timedelta(hours=cfg.atualizar_apos_h)
+    consultado = pd.to_datetime(df[cfg.col_consultado_em], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    recente = (consultado >= limite).to_numpy(dtype=bool) & ~final
+    return ~(final | recente), {"finais": int(final.sum()), "recentes": int(recente.sum())}
+
+
+# =============================================================================
+# SELENIUM RUNTIME
+# =============================================================================
+# Instalado em todo documento da aba principal. Com a flag `anttCapturar` no
+# sessionStorage (sobrevive ao postback), o window.open do btnEditar não abre
+# popup: apenas guarda a URL de destino para carregarmos na aba de detalhe.
+JS_HOOK_WINDOW_OPEN = """
+(function () {
+    var original = window.open;
+    window.open = function (url) {
+        try {
+            if (sessionStorage.getItem('anttCapturar') === '1' && url) {
+                sessionStorage.setItem('anttDetalheUrl', new URL(url, location.href).href);
+                return {closed: false, focus: function () {}, close: function () {}, document: {}};
+            }
+        } catch (e) {}
+        return original.apply(window, arguments);
+    };
+})();
+"""
+
+
+# Padrões para Network.setBlockedURLs no perfil enxuto. Os .axd do ASP.NET
+# (WebResource/ScriptResource) e os scripts da própria página não entram:
+# os postbacks dependem deles.
+BLOQUEIOS_PERFIL_ENXUTO = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.css",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*hotjar.com*", "*facebook.net*", "*clarity.ms*",
+]
+
+
+class SeleniumRuntime:
+    ROTULO = "WebDriver"  # nome nos logs (ver ensure_session)
+
+    def __init__(self):
+        self.driver: Optional[webdriver.Chrome] = None
+        self.wait: Optional[WebDriverWait] = None
+        self.janela_main: Optional[str] = None
+        self.aba_detalhe: Optional[str] = None
+        self.abas: List[Tuple[str, str]] = []  # pipeline: (aba da consulta, aba do detalhe) por slot
+        self.sessao_ts: float = 0.0  # saved_at dos cookies em uso (0 = nenhum)
+        self.iniciado_em: float = 0.0
+        self.autos_servidos: int = 0
+        self.relogins: int = 0  # acumulados na vida do objeto (ver ensure_session)
+        self.reinicios: int = 0
+        self.logins: int = 0  # todos os logins, inclusive o primeiro e os após reinício
+        self.excecoes: int = 0  # páginas "Exceção de Sistema" (sinal do ControleVazao)
+        # Configuração do job que usa o runtime (rodar_job troca pela do job).
+        self.cfg: Config = CFG
+
+    def start(self, headless: bool = True):
+        self.stop()
+        self.iniciado_em = time.time()
+        self.autos_servidos = 0
+
+        chrome_options = Options()
+        chrome_options.binary_location = "/usr/bin/chromium"
+        if headless:
+            chrome_options.add_argument("--headless=new")
+
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--disable-gpu")
+        enxuto = self.cfg.perfil_enxuto
+        if enxuto:
+            chrome_options.page_load_strategy = "eager"
+            chrome_options.add_argument("--window-size=1024,768")
+            for arg in (
+                "--disable-background-networking",
+                "--disable-extensions",
+                "--disable-component-update",
+                "--disable-default-apps",
+                "--disable-sync",
+                "--metrics-recording-only",
+                "--mute-audio",
+                "--no-first-run",
+                "--blink-settings=imagesEnabled=false",
+            ):
+                chrome_options.add_argument(arg)
+            chrome_options.add_experimental_option(
+                "prefs", {"profile.managed_default_content_settings.images": 2}
+            )
+        else:
+            chrome_options.add_argument("--window-size=1920,1080")
+        if enxuto or self.cfg.abas_por_driver > 1:
+            # As abas em segundo plano do pipeline não podem ter timers/render
+            # estrangulados pelo Chromium.
+            chrome_options.add_argument("--disable-background-timer-throttling")
+            chrome_options.add_argument("--disable-renderer-backgrounding")
+            chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+
+        # ===== NOVAS OPÇÕES PARA EVITAR ERR_CONNECTION_RESET =====
+        chrome_options.add_argument("--ignore-certificate-errors")
+        chrome_options.add_argument("--ignore-ssl-errors")
+        chrome_options.add_argument("--disable-web-security")
+        chrome_options.add_argument("--allow-insecure-localhost")
+        # ========================================================
+
+        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option("useAutomationExtension", False)
+
+        service = Service("/usr/bin/chromedriver")
+        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.driver.set_page_load_timeout(120)  # Aumentado de 60 para 120
+        self.driver.set_script_timeout(self.cfg.timeout + 10)  # esperas assíncronas (esperar_dados)
+        self.wait = WebDriverWait(self.driver, self.cfg.timeout)
+        self.janela_main = self.driver.current_window_handle
+        self.instalar_cdp()
+
+    def instalar_cdp(self) -> None:
+        """Hook de window.open e bloqueios do perfil enxuto, na aba atual (o CDP é por aba)."""
+        try:
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": JS_HOOK_WINDOW_OPEN})
+        except Exception as e:
+            logger.warning("Não foi possível instalar o hook de window.open: %s", e)
+        if self.cfg.perfil_enxuto:
+            try:
+                self.driver.execute_cdp_cmd("Network.enable", {})
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOQUEIOS_PERFIL_ENXUTO})
+            except Exception as e:
+                logger.warning("Não foi possível bloquear recursos no perfil enxuto: %s", e)
+
+    def stop(self):
+        try:
+            if self.driver is not None:
+                self.driver.quit()
+        except Exception:
+            pass
+        self.driver = None
+        self.wait = None
+        self.janela_main = None
+        self.aba_detalhe = None
+        self.abas = []
+        self.sessao_ts = 0.0
+
+    def assumir(self, outro: "SeleniumRuntime") -> None:
+        """Passa a usar o navegador (já logado) de `outro`, que fica vazio."""
+        self.stop()
+        for attr in ("driver", "wait", "janela_main", "aba_detalhe", "abas", "sessao_ts"):
+            setattr(self, attr, getattr(outro, attr))
+        # A idade conta a partir de quando o navegador entra em serviço: a
+        # reserva pode ter passado horas esperando e não deve ser reciclada já.
+        self.iniciado_em = time.time()
+        self.autos_servidos = 0
+        outro.driver = None
+        outro.stop()
+
+    def nova_aba(self) -> str:
+        self.driver.switch_to.new_window("tab")
+        self.instalar_cdp()
+        return self.driver.current_window_handle
+
+    def garantir_abas(self, k: int) -> None:
+        """Pipeline: `k` pares (consulta, detalhe); o slot 0 usa a janela principal."""
+        vivas = set(self.driver.window_handles)
+        self.abas = [par for par in self.abas if par[0] in vivas and par[1] in vivas]
+        while len(self.abas) < k:
+            livre = self.janela_main not in (par[0] for par in self.abas)
+            consulta = self.janela_main if livre else self.nova_aba()
+            self.abas.append((consulta, self.nova_aba()))
+        self.driver.switch_to.window(self.janela_main)
+
+    def abrir_aba_detalhe(self, url: str) -> None:
+        """Carrega `url` na aba secundária, criando-a só na primeira vez."""
+        if self.aba_detalhe not in self.driver.window_handles:
+            self.driver.switch_to.new_window("tab")
+            self.aba_detalhe = self.driver.current_window_handle
+        else:
+            self.driver.switch_to.window(self.aba_detalhe)
+        self.driver.get(url)
+
+    def memoria_kb(self, tipo_chromium: Optional[str] = None) -> int:
+        """RSS do chromedriver + Chromium deste runtime (ou só de um tipo de processo)."""
+        try:
+            pid = self.driver.service.process.pid
+        except Exception:
+            return 0
+        return rss_processos_kb(pid, tipo_chromium)
+
+    def is_alive(self) -> bool:
+        try:
+            if self.driver is None:
+                return False
+            _ = self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+
+def novo_runtime(backend: str = BACKEND_SELENIUM):
+    return HttpRuntime() if backend == BACKEND_HTTP else SeleniumRuntime()
+
+
+# =============================================================================
+# LOGIN / SESSION CHECKS (CORRIGIDO)
+# =============================================================================
+class CredenciaisRejeitadas(RuntimeError):
+    """O site devolveu o formulário de login após o envio: usuário/senha errados."""
+
+
+def is_logged_in(rt: SeleniumRuntime) -> bool:
+    if isinstance(rt, HttpRuntime):
+        return is_logged_in_http(rt)
+    try:
+        if rt.driver is None:
+            return False
+        rt.driver.find_element(By.ID, ID_AUTO)
+        return True
+    except Exception:
+        return False
+
+
+def realizar_login(rt: SeleniumRuntime, usuario: str, senha: str, debug: bool) -> bool:
+    """
+    Fluxo de login robusto:
+    - Preenche usuário e senha, clica em OK.
+    - Após login, navega diretamente para a página de consulta.
+    - Verifica se o campo de consulta está presente.
+    """
+    if isinstance(rt, HttpRuntime):
+        return realizar_login_http(rt, usuario, senha, debug=debug)
+
+    try:
+        ui_log("Abrindo página de login...")
+        rt.driver.get(rt.cfg.url_login)
+
+        # 1. Campo Usuário
+        campo_user = rt.wait.until(EC.visibility_of_element_located((By.ID, ID_USUARIO)))
+        campo_user.clear()
+        campo_user.send_keys(usuario)
+        ui_log("Usuário preenchido.")
+
+        # 2. Campo Senha
+        campo_senha = rt.wait.until(EC.visibility_of_element_located((By.ID, ID_SENHA)))
+        campo_senha.clear()
+        campo_senha.send_keys(senha)
+        ui_log("Senha preenchida.")
+
+        # 3. Botão OK
+        btn_ok = rt.wait.until(EC.element_to_be_clickable((By.ID, ID_BTN_OK)))
+        btn_ok.click()
+        ui_log("Botão OK clicado. Aguardando redirecionamento...")
+
+        # 4. Aguarda um tempo para o login processar
+        time.sleep(5)
+        if "login.aspx" in rt.driver.current_url.lower() and rt.driver.find_elements(By.ID, ID_SENHA):
+            raise CredenciaisRejeitadas("o formulário de login voltou após o envio")
+
+        # 5. *** NOVO: Navega diretamente para a página de consulta ***
+        url_consulta = rt.cfg.url_consulta
+        ui_log(f"Navegando para a página de consulta: {url_consulta}")
+        rt.driver.get(url_consulta)
+        time.sleep(3)
+
+        # 6. Verifica se a página de consulta carregou (campo de auto)
+        try:
+            rt.wait.until(EC.presence_of_element_located((By.ID, ID_AUTO)))
+            ui_log("Página de consulta carregada com sucesso.")
+            return True
+        except Exception:
+            # Se não encontrar, pode ser que a página de erro tenha aparecido novamente
+            ui_log("Campo de consulta não encontrado. Verificando se há erro...", "warning")
+            if "Exceção de Sistema" in rt.driver.page_source:
+                ui_log("Página de erro detectada. Tentando recarregar a consulta...", "warning")
+                # Tenta novamente após 3 segundos
+                time.sleep(3)
+                rt.driver.get(url_consulta)
+                time.sleep(3)
+                # Última tentativa
+                rt.wait.until(EC.presence_of_element_located((By.ID, ID_AUTO)))
+                ui_log("Página de consulta carregada na segunda tentativa.")
+                return True
+            else:
+                # Se não for erro, levanta exceção para tratamento superior
+                raise
+
+    except CredenciaisRejeitadas:
+        ui_log("Login recusado pelo site: verifique usuário e senha.", "error")
+        raise
+    except Exception as e:
+        ui_log("Falha no login ou no carregamento da página de consulta.", "error")
+        if debug:
+            logger.exception("Falha no login/consulta")
+            ui_log(f"Detalhe: {e}", "error")
+            try:
+                shot = os.path.join("/tmp", f"antt_login_debug_{int(time.time())}.png")
+                rt.driver.save_screenshot(shot)
+                ui_log(f"Screenshot de debug salvo em {shot}.", "warning")
+            except Exception:
+                pass
+        return False
+
+
+# =============================================================================
+# SESSÃO PERSISTIDA (COOKIES)
+# =============================================================================
+# Depois de um login bem-sucedido os cookies vão para disco; quando o driver
+# reinicia (ou outro worker já renovou a sessão) eles são reinjetados e uma
+# única carga da página de consulta confirma se ainda valem. Só se a sonda
+# falhar fazemos o login completo, com seus sleeps.
+def path_sessao(usuario: str, cfg: Config) -> str:
+    chave = hashlib.sha256(f"{usuario}\n{cfg.url_login}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cfg.sessao_dir, f"sessao_{chave}.json")
+
+
+def cookies_do_runtime(rt) -> List[Dict[str, Any]]:
+    if isinstance(rt, HttpRuntime):
+        return [
+            {
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "secure": bool(c.secure),
+                "expiry": c.expires,
+            }
+            for c in rt.session.cookies
+        ]
+    return rt.driver.get_cookies()
+
+
+def salvar_sessao(rt, usuario: str) -> None:
+    if not rt.cfg.reusar_sessao:
+        return
+    try:
+        agora = time.time()
+        os.makedirs(rt.cfg.sessao_dir, mode=0o700, exist_ok=True)
+        path = path_sessao(usuario, rt.cfg)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": agora, "cookies": cookies_do_runtime(rt)}, f)
+        os.replace(tmp, path)
+        rt.sessao_ts = agora
+    except Exception as e:
+        logger.warning("Não foi possível salvar os cookies da sessão: %s", e)
+
+
+def ler_sessao(usuario: str, cfg: Config) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path_sessao(usuario, cfg), "r", encoding="utf-8") as f:
+            sessao = json.load(f)
+        return sessao if sessao.get("cookies") else None
+    except (OSError, ValueError):
+        return None
+
+
+def injetar_cookies(rt, cookies: List[Dict[str, Any]]) -> None:
+    if isinstance(rt, HttpRuntime):
+        rt.session.cookies.clear()
+        for c in cookies:
+            rt.session.cookies.set(
+                c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"),
+                secure=c.get("secure", False), expires=c.get("expiry"),
+            )
+        return
+
+    params = []
+    for c in cookies:
+        p = {
+            "name": c["name"],
+            "value": c["value"],
+            "domain": c.get("domain", ""),
+            "path": c.get("path", "/"),
+            "secure": bool(c.get("secure", False)),
+            "httpOnly": bool(c.get("httpOnly", False)),
+        }
+        if c.get("expiry"):
+            p["expires"] = c["expiry"]
+        if c.get("sameSite") in ("Strict", "Lax", "None"):
+            p["sameSite"] = c["sameSite"]
+        params.append(p)
+    rt.driver.execute_cdp_cmd("Network.setCookies", {"cookies": params})
+
+
+def restaurar_sessao(rt, usuario: str) -> bool:
+    """
+    Reinjeta os cookies salvos (se forem mais novos que os já em uso por `rt`)
+    e sonda a página de consulta. True se a sessão restaurada é válida.
+    """
+    if not rt.cfg.reusar_sessao:
+        return False
+    sessao = ler_sessao(usuario, rt.cfg)
+    if sessao is None or sessao.get("saved_at", 0) <= rt.sessao_ts:
+        return False
+
+    try:
+        with METRICAS.medir("restaurar_sessao"):
+            injetar_cookies(rt, sessao["cookies"])
+            if isinstance(rt, HttpRuntime):
+                soup = rt.get(rt.cfg.url_consulta)
+                rt.pagina = soup if soup.find(id=ID_AUTO) is not None else None
+            else:
+                rt.driver.get(rt.cfg.url_consulta)
+            ok = is_logged_in(rt)
+    except Exception as e:
+        logger.warning("Falha ao restaurar cookies da sessão: %s", e)
+        ok = False
+
+    rt.sessao_ts = sessao["saved_at"]
+    if ok:
+        METRICAS.contar("sessao_restaurada")
+        ui_log("Sessão restaurada a partir dos cookies salvos.")
+    return ok
+
+
+def ensure_session(rt: SeleniumRuntime, usuario: str, senha: str, headless: bool, debug: bool) -> bool:
+    if not rt.is_alive():
+        # A primeira subida de um runtime não é reinício (ver ControleVazao).
+        METRICAS.contar("driver_restart" if rt.iniciado_em else "driver_inicio")
+        if rt.iniciado_em:
+            ui_log(f"{rt.ROTULO} não está ativo. Reiniciando...", "warning")
+            rt.reinicios += 1
+        else:
+            ui_log(f"Iniciando {rt.ROTULO}...")
+        with METRICAS.medir("driver_start"):
+            rt.start(headless=headless)
+
+    if is_logged_in(rt):
+        return True
+
+    if restaurar_sessao(rt, usuario):
+        return True
+
+    ui_log("Sessão não autenticada. Tentando relogin...", "warning")
+    METRICAS.contar("relogin" if rt.autos_servidos else "login")
+    if rt.autos_servidos:
+        rt.relogins += 1
+    rt.logins += 1
+    with METRICAS.medir("login"):
+        ok = realizar_login(rt, usuario, senha, debug=debug)
+    if ok:
+        salvar_sessao(rt, usuario)
+    return ok
+
+
+# =============================================================================
+# ESPERAS POR EVENTO
+# =============================================================================
+# Antes de clicar em Pesquisar marcamos a página atual (variável em window e
+# atributo no btnEditar_0 antigo). O desfecho só é aceito quando vem de uma
+# página/grade nova, então não confundimos o resultado do auto anterior com o
+# do atual e não precisamos de sleep fixo depois do clique.
+DESFECHO_RESULTADO = "resultado"
+DESFECHO_NENHUM = "nenhum"
+DESFECHO_EXCECAO = "excecao"
+DESFECHO_LOGIN = "login"  # sessão expirou: o postback caiu no Login.aspx
+TEXTO_NENHUM_REGISTRO = "Nenhum registro"  # única resposta definitiva de "auto não existe"
+
+JS_MARCAR_BUSCA = """
+window.__anttBusca = true;
+var b = document.getElementById(arguments[0]);
+if (b) { b.setAttribute('data-antt-velho', '1'); }
+var t = document.body ? document.body.innerText : '';
+window.__anttNenhumAntes = t.indexOf('Nenhum registro') >= 0;
+"""
+
+JS_DESFECHO_BUSCA = """
+if (document.readyState === 'loading') { return null; }
+var b = document.getElementById(arguments[0]);
+if (b && !b.hasAttribute('data-antt-velho')) { return 'resultado'; }
+var novaPagina = !window.__anttBusca;
+var t = document.body ? document.body.innerText : '';
+if (t.indexOf('Exceção de Sistema') >= 0) { return 'excecao'; }
+if (document.getElementById(arguments[1])) { return 'login'; }
+if (t.indexOf('Nenhum registro') >= 0 && (novaPagina || !window.__anttNenhumAntes) && !b) { return 'nenhum'; }
+return null;
+"""
+
+JS_ESPERAR_VALOR = """
+var id = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+function ler() {
+    var e = document.getElementById(id);
+    return (e && e.value && e.value.trim()) ? e.value : null;
+}
+var v = ler();
+if (v !== null) { done(v); return; }
+var fim = false;
+var obs = new MutationObserver(function () {
+    var v = ler();
+    if (v !== null && !fim) { fim = true; obs.disconnect(); done(v); }
+});
+obs.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+document.addEventListener('input', function () {
+    var v = ler();
+    if (v !== null && !fim) { fim = true; obs.disconnect(); done(v); }
+}, true);
+setTimeout(function () { if (!fim) { fim = true; obs.disconnect(); done(''); } }, timeoutMs);
+"""
+
+
+JS_PREPARAR_CAPTURA = """
+sessionStorage.setItem('anttCapturar', arguments[0]);
+sessionStorage.removeItem('anttDetalheUrl');
+"""
+
+
+def aguardar_destino_detalhe(driver, n_janelas: int, timeout: float) -> Optional[str]:
+    """
+    Depois do clique em btnEditar_0: devolve a URL capturada pelo hook de
+    window.open, ou None se um popup de verdade abriu (ou se esgotou o tempo).
+    """
+    def desfecho(d):
+        url = d.execute_script("return sessionStorage.getItem('anttDetalheUrl');")
+        if url:
+            return url
+        if len(d.window_handles) > n_janelas:
+            return "popup"
+        return None
+
+    try:
+        destino = WebDriverWait(
+            driver, timeout, poll_frequency=0.1,
+            ignored_exceptions=(JavascriptException, StaleElementReferenceException),
+        ).until(desfecho)
+    except TimeoutException:
+        return None
+    return None if destino == "popup" else destino
+
+
+def aguardar_desfecho_busca(driver, timeout: float) -> Optional[str]:
+    """
+    Corrida entre os desfechos possíveis da pesquisa. Como o clique dispara um
+    postback (navegação), um observer no DOM morreria com a página antiga; por
+    isso cada sondagem é um único execute_script em intervalo curto.
+    """
+    try:
+        return WebDriverWait(
+            driver, timeout, poll_frequency=0.1,
+            ignored_exceptions=(JavascriptException, StaleElementReferenceException),
+        ).until(lambda d: d.execute_script(JS_DESFECHO_BUSCA, ID_EDITAR_0, ID_USUARIO))
+    except TimeoutException:
+        return None
+
+
+# Lê CAMPOS_DETALHE e a gdvDocumentosProcesso inteira numa única chamada ao
+# chromedriver (cada find_element/get_attribute é um round trip HTTP).
+JS_EXTRAIR_DETALHE = """
+var campos = arguments[0], idTabela = arguments[1], out = {campos: {}, documentos: null};
+for (var k in campos) {
+    var e = document.getElementById(campos[k]);
+    out.campos[k] = e ? (e.value || '') : '';
+}
+var tab = document.getElementById(idTabela);
+if (tab) {
+    out.documentos = [];
+    var trs = tab.getElementsByTagName('tr');
+    for (var i = 0; i < trs.length; i++) {
+        var tds = trs[i].getElementsByTagName('td'), linha = [];
+        for (var j = 0; j < tds.length; j++) { linha.push(tds[j].innerText.trim()); }
+        out.documentos.push(linha);
+    }
+}
+return JSON.stringify(out);
+"""
+
+
+def extrair_detalhe(driver) -> Dict[str, Any]:
+    return json.loads(driver.execute_script(JS_EXTRAIR_DETALHE, CAMPOS_DETALHE, ID_DOCUMENTOS))
+
+
+def andamento_de_linhas(linhas: Optional[List[List[str]]]) -> Dict[str, str]:
+    """Último andamento a partir das linhas (textos dos `td`) da gdvDocumentosProcesso."""
+    if linhas is None:
+        return {"andamento": "Erro Tabela", "data_andamento": ""}
+
+    if len(linhas) <= 1:
+        return {"andamento": "Sem andamentos", "data_andamento": ""}
+
+    tds = linhas[-1]
+    if len(tds) >= 4:
+        return {"andamento": tds[1], "data_andamento": tds[3]}
+    if len(tds) >= 2:
+        return {"andamento": tds[0], "data_andamento": tds[-1]}
+    return {}
+
+
+def esperar_dados(rt: SeleniumRuntime, element_id: str, timeout: int = 10) -> str:
+    # Resolve no navegador (MutationObserver) assim que o campo tiver valor.
+    try:
+        return rt.driver.execute_async_script(JS_ESPERAR_VALOR, element_id, int(timeout * 1000)) or ""
+    except Exception:
+        return ""
+
+
+# =============================================================================
+# CONSULTA
+# =============================================================================
+def processar_auto(rt: SeleniumRuntime, auto: str) -> Dict[str, Any]:
+    if isinstance(rt, HttpRuntime):
+        return processar_auto_http(rt, auto)
+
+    res = {"status": "erro", "dados": {}, "mensagem": "", "tempos": {}}
+    tempos = res["tempos"]  # segundos efetivamente aguardados em cada etapa
+    driver = rt.driver
+    wait = rt.wait
+    janela_main = rt.janela_main or driver.current_window_handle
+    popup = False
+
+    try:
+        t0 = time.time()
+        campo = wait.until(EC.element_to_be_clickable((By.ID, ID_AUTO)))
+        campo.clear()
+        campo.send_keys(auto)
+        marcar_tempo(tempos, "campo_auto", t0)
+
+        encontrou = False
+        desfecho = None
+        for tentativa in range(3):
+            try:
+                btn = driver.find_element(By.ID, ID_PESQUISAR)
+                driver.execute_script(JS_MARCAR_BUSCA, ID_EDITAR_0)
+                t0 = time.time()
+                driver.execute_script("arguments[0].click();", btn)
+                desfecho = aguardar_desfecho_busca(driver, rt.cfg.timeout)
+                marcar_tempo(tempos, f"busca_{tentativa + 1}", t0, etapa="busca")
+
+                if desfecho == DESFECHO_RESULTADO:
+                    encontrou = True
+                    break
+                if desfecho in (DESFECHO_NENHUM, DESFECHO_LOGIN):
+                    break
+                if desfecho == DESFECHO_EXCECAO:
+                    # Página de erro do sistema: recarrega a consulta e tenta de novo.
+                    METRICAS.contar("pagina_excecao")
+                    rt.excecoes += 1
+                    driver.get(rt.cfg.url_consulta)
+                    campo = wait.until(EC.element_to_be_clickable((By.ID, ID_AUTO)))
+                    campo.clear()
+                    campo.send_keys(auto)
+            except Exception:
+                if TEXTO_NENHUM_REGISTRO in (driver.page_source or ""):
+                    desfecho = DESFECHO_NENHUM
+                    break
+
+        if not encontrou:
+            # Só "Nenhum registro" é resposta definitiva; exceção/timeout não.
+            if desfecho == DESFECHO_NENHUM:
+                res["status"] = "nao_encontrado"
+                res["mensagem"] = "Auto não localizado"
+            elif desfecho == DESFECHO_LOGIN:
+                res["mensagem"] = MSG_SESSAO_EXPIRADA
+            elif desfecho == DESFECHO_EXCECAO:
+                res["mensagem"] = "Erro fluxo: Exceção de Sistema"
+            else:
+                res["mensagem"] = "Erro fluxo: pesquisa sem resposta"
+            return res
+
+        btn_edit = driver.find_element(By.ID, ID_EDITAR_0)
+        janelas_antes = set(driver.window_handles)
+        driver.execute_script(JS_PREPARAR_CAPTURA, "1" if rt.cfg.detalhe_em_aba else "0")
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn_edit)
+        driver.execute_script("arguments[0].click();", btn_edit)
+
+        t0 = time.time()
+        destino = aguardar_destino_detalhe(driver, len(janelas_antes), 15)
+        if destino is None:
+            # Hook não capturou (ou modo popup): segue o fluxo com janela nova.
+            for w in driver.window_handles:
+                if w not in janelas_antes:
+                    driver.switch_to.window(w)
+                    popup = True
+                    break
+            if not popup:
+                raise TimeoutException("Detalhe do auto não abriu.")
+        else:
+            driver.execute_script("sessionStorage.removeItem('anttCapturar');")
+            rt.abrir_aba_detalhe(destino)
+        marcar_tempo(tempos, "popup", t0)
+
+        try:
+            t0 = time.time()
+            wait.until(EC.visibility_of_element_located((By.ID, ID_PROCESSO)))
+            esperar_dados(rt, ID_PROCESSO)
+            marcar_tempo(tempos, "detalhe", t0)
+
+            t0 = time.time()
+            payload = extrair_detalhe(driver)
+            marcar_tempo(tempos, "extracao", t0)
+
+            t0 = time.time()
+            dados = dict(payload["campos"])
+            dados.update(andamento_de_linhas(payload["documentos"]))
+            marcar_tempo(tempos, "documentos", t0)
+
+            res["status"] = "sucesso"
+            res["dados"] = dados
+            res["documentos"] = payload["documentos"]
+            res["mensagem"] = "Sucesso"
+
+        except Exception as e:
+            res["mensagem"] = f"Erro leitura: {e}"
+
+        t0 = time.time()
+        if popup:
+            try:
+                driver.close()
+            except Exception:
+                pass
+        driver.switch_to.window(janela_main)
+        marcar_tempo(tempos, "fechar_janela", t0)
+        return res
+
+    except Exception as e:
+        res["mensagem"] = f"Erro fluxo: {e}"
+        try:
+            driver.switch_to.window(janela_main)
+        except Exception:
+            pass
+        return res
+
+
+def processar_auto_com_recuperacao(
+    rt: SeleniumRuntime,
+    auto: str,
+    usuario: str,
+    senha: str,
+    headless: bool,
+    debug: bool,
+    max_retries: int = 2,
+) -> Dict[str, Any]:
+    """
+    Consulta um auto cuidando da sessão. Só a perda de sessão é repetida aqui
+    (depois do relogin); as demais falhas voltam na hora, classificadas em
+    res["falha"], e o job decide o que fazer (ver rodar_job).
+    """
+    if not auto_valido(auto):
+        return {"status": "erro", "dados": {}, "mensagem": "Número de auto inválido", "falha": FALHA_PERMANENTE}
+
+    res: Dict[str, Any] = {}
+    for attempt in range(max_retries + 1):
+        try:
+            ok = ensure_session(rt, usuario, senha, headless=headless, debug=debug)
+            if not ok:
+                return {"status": "erro", "dados": {}, "mensagem": "Falha no login/relogin", "falha": FALHA_TRANSITORIA}
+
+            res = processar_auto(rt, auto)
+            rt.autos_servidos += 1
+            res["falha"] = classificar_falha(res)
+            res["tentativas"] = attempt + 1
+
+            if res["falha"] == FALHA_SESSAO:
+                ui_log(f"Sessão expirada (tentativa {attempt+1}). Refazendo login...", "warning")
+                continue
+            return res
+
+        except CredenciaisRejeitadas as e:
+            return {"status": "erro", "dados": {}, "mensagem": f"Credenciais rejeitadas: {e}", "falha": FALHA_FATAL}
+        except WebDriverException as e:
+            ui_log("Erro WebDriver. Reiniciando driver para o próximo auto...", "warning")
+            rt.stop()
+            return {"status": "erro", "dados": {}, "mensagem": f"Erro WebDriver: {e.msg or e}", "falha": FALHA_TRANSITORIA}
+        except requests.RequestException as e:
+            ui_log("Erro HTTP. Reabrindo sessão para o próximo auto...", "warning")
+            rt.stop()
+            return {"status": "erro", "dados": {}, "mensagem": f"Erro HTTP: {e}", "falha": FALHA_TRANSITORIA}
+        except Exception as e:
+            return {"status": "erro", "dados": {}, "mensagem": f"Erro fluxo: {e}", "falha": FALHA_TRANSITORIA}
+
+    res["mensagem"] = f"Sessão perdida após {max_retries + 1} tentativas"
+    return res
+
+
+# =============================================================================
+# CONSULTA EM PIPELINE (VÁRIAS ABAS NO MESMO LOGIN)
+# =============================================================================
+# O chromedriver executa um comando por vez, mas cada aba carrega sozinha:
+# disparamos o postback numa aba (clique via JS, que não espera a navegação)
+# e passamos à próxima, sondando cada uma com um único execute_script. Cada
+# slot tem a sua aba de consulta e a sua aba de detalhe; todas usam os
+# cookies do mesmo login. O detalhe é sempre capturado pelo hook de
+# window.open (sessionStorage é por aba), nunca em popup.
+ETAPA_RECARREGAR = "recarregar"
+ETAPA_PESQUISAR = "pesquisar"
+ETAPA_BUSCA = "busca"
+ETAPA_DESTINO = "destino"
+ETAPA_DETALHE = "detalhe"
+ETAPA_FIM = "fim"
+
+# Navegação sem bloquear o chromedriver; a marca some com o documento antigo.
+JS_NAVEGAR = "window.__anttNavegando = true; location.href = arguments[0];"
+
+JS_ESTADO_CONSULTA = """
+if (window.__anttNavegando || document.readyState === 'loading') { return null; }
+if (document.getElementById(arguments[0])) { return 'pronta'; }
+if (document.getElementById(arguments[1])) { return 'login'; }
+return 'outra';
+"""
+
+JS_ESTADO_DETALHE = """
+if (window.__anttNavegando || document.readyState === 'loading') { return null; }
+var e = document.getElementById(arguments[0]);
+if (!e) { return null; }
+return (e.value && e.value.trim()) ? 'ok' : 'vazio';
+"""
+
+
+class SlotAba:
+    """Um auto em andamento num par de abas do pipeline."""
+
+    def __init__(self, auto: str, consulta: str, detalhe: str, cfg: Config):
+        self.cfg = cfg
+        self.auto = auto
+        self.consulta = consulta
+        self.detalhe = detalhe
+        self.res: Dict[str, Any] = {"status": "erro", "dados": {}, "mensagem": "", "tempos": {}}
+        self.inicio = time.time()
+        self.tentativa = 0  # pesquisas enviadas (exceções do site repetem até 3)
+        self.excecoes = 0
+        self.navegou = False
+        self.url_detalhe = ""
+        self.vazio_desde = 0.0
+        self.ir_para(ETAPA_RECARREGAR, cfg.timeout)
+
+    def ir_para(self, etapa: str, prazo_s: float) -> None:
+        self.etapa = etapa
+        self.t0 = time.time()
+        self.prazo = self.t0 + prazo_s
+        self.navegou = False
+
+    def concluir(self, status: str, mensagem: str) -> None:
+        self.res["status"] = status
+        self.res["mensagem"] = mensagem
+        self.etapa = ETAPA_FIM
+        self.res["duracao"] = round(time.time() - self.inicio, 3)
+        METRICAS.observar("auto", self.res["duracao"])
+
+
+def avancar_slot(driver, s: SlotAba) -> bool:
+    """Um passo do slot na aba já focada. Retorna True se algo mudou."""
+    agora = time.time()
+    tempos = s.res["tempos"]
+
+    if s.etapa == ETAPA_RECARREGAR:
+        estado = driver.execute_script(JS_ESTADO_CONSULTA, ID_AUTO, ID_USUARIO)
+        if estado == "pronta":
+            s.ir_para(ETAPA_PESQUISAR, s.cfg.timeout)
+            return True
+        if estado is not None and not s.navegou:
+            # about:blank, página de erro ou login de antes do relogin.
+            driver.execute_script(JS_NAVEGAR, s.cfg.url_consulta)
+            s.navegou = True
+            return True
+        if estado == "login":
+            s.concluir("erro", MSG_SESSAO_EXPIRADA)
+            return True
+        if agora > s.prazo:
+            s.concluir("erro", "Erro fluxo: página de consulta não carregou")
+            return True
+        return False
+
+    if s.etapa == ETAPA_PESQUISAR:
+        campo = driver.find_element(By.ID, ID_AUTO)
+        campo.clear()
+        campo.send_keys(s.auto)
+        driver.execute_script(JS_MARCAR_BUSCA, ID_EDITAR_0)
+        driver.execute_script("document.getElementById(arguments[0]).click();", ID_PESQUISAR)
+        s.tentativa += 1
+        s.ir_para(ETAPA_BUSCA, s.cfg.timeout)
+        return True
+
+    if s.etapa == ETAPA_BUSCA:
+        desfecho = driver.execute_script(JS_DESFECHO_BUSCA, ID_EDITAR_0, ID_USUARIO)
+        if desfecho is None:
+            if agora > s.prazo:
+                s.concluir("erro", "Erro fluxo: pesquisa sem resposta")
+                return True
+            return False
+        marcar_tempo(tempos, f"busca_{s.tentativa}", s.t0, etapa="busca")
+        if desfecho == DESFECHO_RESULTADO:
+            driver.execute_script(JS_PREPARAR_CAPTURA, "1")
+            driver.execute_script("document.getElementById(arguments[0]).click();", ID_EDITAR_0)
+            s.ir_para(ETAPA_DESTINO, 15)
+        elif desfecho == DESFECHO_NENHUM:
+            s.concluir("nao_encontrado", "Auto não localizado")
+        elif desfecho == DESFECHO_LOGIN:
+            s.concluir("erro", MSG_SESSAO_EXPIRADA)
+        else:
+            METRICAS.contar("pagina_excecao")
+            s.excecoes += 1
+            if s.tentativa >= 3:
+                s.concluir("erro", "Erro fluxo: Exceção de Sistema")
+            else:
+                s.ir_para(ETAPA_RECARREGAR, s.cfg.timeout)
+        return True
+
+    if s.etapa == ETAPA_DESTINO:
+        url = driver.execute_script("return sessionStorage.getItem('anttDetalheUrl');")
+        if not url:
+            if agora > s.prazo:
+                s.concluir("erro", "Erro fluxo: Detalhe do auto não abriu.")
+                return True
+            return False
+        driver.execute_script("sessionStorage.removeItem('anttCapturar');")
+        marcar_tempo(tempos, "popup", s.t0)
+        s.url_detalhe = url
+        s.ir_para(ETAPA_DETALHE, s.cfg.timeout)
+        return True
+
+    if s.etapa == ETAPA_DETALHE:
+        if not s.navegou:
+            driver.execute_script(JS_NAVEGAR, s.url_detalhe)
+            s.navegou = True
+            return True
+        estado = driver.execute_script(JS_ESTADO_DETALHE, ID_PROCESSO)
+        if estado == "vazio" and not s.vazio_desde:
+            s.vazio_desde = agora
+        # Campo vazio: espera até 10s pelo valor, como esperar_dados.
+        if estado == "ok" or (estado == "vazio" and agora - s.vazio_desde >= 10):
+            marcar_tempo(tempos, "detalhe", s.t0)
+            t0 = time.time()
+            payload = extrair_detalhe(driver)
+            marcar_tempo(tempos, "extracao", t0)
+            dados = dict(payload["campos"])
+            dados.update(andamento_de_linhas(payload["documentos"]))
+            s.res["dados"] = dados
+            s.res["documentos"] = payload["documentos"]
+            s.concluir("sucesso", "Sucesso")
+            return True
+        if agora > s.prazo:
+            s.concluir("erro", "Erro leitura: detalhe do auto não carregou")
+            return True
+        return False
+
+    return False
+
+
+def processar_autos_em_abas(rt: SeleniumRuntime, autos: List[str]) -> List[Dict[str, Any]]:
+    """
+    Consulta `autos` ao mesmo tempo, um por par de abas, alternando entre as
+    abas a cada passo. Os resultados voltam na ordem de `autos`.
+    """
+    driver = rt.driver
+    rt.garantir_abas(len(autos))
+    slots = [SlotAba(auto, *rt.abas[i], rt.cfg) for i, auto in enumerate(autos)]
+    focada = rt.janela_main
+    try:
+        while True:
+            ativos = [s for s in slots if s.etapa != ETAPA_FIM]
+            if not ativos:
+                break
+            progresso = False
+            for s in ativos:
+                aba = s.detalhe if s.etapa == ETAPA_DETALHE else s.consulta
+                if aba != focada:
+                    driver.switch_to.window(aba)
+                    focada = aba
+                try:
+                    progresso = avancar_slot(driver, s) or progresso
+                except (JavascriptException, StaleElementReferenceException):
+                    # Documento trocando no meio da sondagem: tenta no próximo passo.
+                    if time.time() > s.prazo:
+                        s.concluir("erro", "Erro fluxo: página não respondeu")
+                except Exception as e:
+                    s.concluir("erro", f"Erro fluxo: {e}")
+            if not progresso:
+                time.sleep(0.05)
+    finally:
+        rt.excecoes += sum(s.excecoes for s in slots)
+        try:
+            driver.switch_to.window(rt.janela_main)
+        except Exception:
+            pass
+    return [s.res for s in slots]
+
+
+def processar_autos_com_recuperacao(
+    rt: SeleniumRuntime,
+    autos: List[str],
+    usuario: str,
+    senha: str,
+    headless: bool,
+    debug: bool,
+    max_retries: int = 2,
+) -> List[Dict[str, Any]]:
+    """processar_auto_com_recuperacao para um lote consultado em abas paralelas."""
+    resultados: List[Dict[str, Any]] = [{} for _ in autos]
+    pendentes = []
+    for i, auto in enumerate(autos):
+        if auto_valido(auto):
+            pendentes.append(i)
+        else:
+            resultados[i] = {"status": "erro", "dados": {}, "mensagem": "Número de auto inválido",
+                             "falha": FALHA_PERMANENTE}
+
+    def falhar(mensagem: str, falha: str) -> List[Dict[str, Any]]:
+        for i in pendentes:
+            resultados[i] = {"status": "erro", "dados": {}, "mensagem": mensagem, "falha": falha}
+        return resultados
+
+    for attempt in range(max_retries + 1):
+        if not pendentes:
+            return resultados
+        try:
+            ok = ensure_session(rt, usuario, senha, headless=headless, debug=debug)
+            if not ok:
+                return falhar("Falha no login/relogin", FALHA_TRANSITORIA)
+
+            lote = processar_autos_em_abas(rt, [autos[i] for i in pendentes])
+            rt.autos_servidos += len(pendentes)
+            expirados = []
+            for i, res in zip(pendentes, lote):
+                res["falha"] = classificar_falha(res)
+                res["tentativas"] = attempt + 1
+                resultados[i] = res
+                if res["falha"] == FALHA_SESSAO:
+                    expirados.append(i)
+            if expirados:
+                ui_log(
+                    f"Sessão expirada em {len(expirados)} aba(s) (tentativa {attempt+1}). Refazendo login...",
+                    "warning",
+                )
+            pendentes = expirados
+
+        except CredenciaisRejeitadas as e:
+            return falhar(f"Credenciais rejeitadas: {e}", FALHA_FATAL)
+        except WebDriverException as e:
+            ui_log("Erro WebDriver. Reiniciando driver para o próximo lote...", "warning")
+            rt.stop()
+            return falhar(f"Erro WebDriver: {e.msg or e}", FALHA_TRANSITORIA)
+        except Exception as e:
+            return falhar(f"Erro fluxo: {e}", FALHA_TRANSITORIA)
+
+    for i in pendentes:
+        resultados[i]["mensagem"] = f"Sessão perdida após {max_retries + 1} tentativas"
+    return resultados
+
+
+# =============================================================================
+# CLASSIFICAÇÃO DE FALHAS + DISJUNTOR
+# =============================================================================
+# permanente: a resposta não muda se tentarmos de novo (auto não localizado,
+#             número inválido) -> grava e segue.
+# sessao:     deslogado no meio da consulta -> relogin e repete na hora.
+# transitoria: timeout, conexão resetada, "Exceção de Sistema" -> vai para
+#             as rodadas adiadas no fim do job.
+# fatal:      credenciais recusadas -> para o job.
+FALHA_PERMANENTE = "permanente"
+FALHA_SESSAO = "sessao"
+FALHA_TRANSITORIA = "transitoria"
+FALHA_FATAL = "fatal"
+FALHAS_ADIAVEIS = (FALHA_TRANSITORIA, FALHA_SESSAO)
+
+MSG_SESSAO_EXPIRADA = "Erro fluxo: sessão expirada"
+RE_AUTO_VALIDO = re.compile(r"^[A-Za-z0-9][A-Za-z0-9./-]{3,29}$")
+
+
+def auto_valido(auto: str) -> bool:
+    return bool(RE_AUTO_VALIDO.match(auto or ""))
+
+
+def classificar_falha(res: Dict[str, Any]) -> Optional[str]:
+    status = res.get("status")
+    if status == "sucesso":
+        return None
+    if status == "nao_encontrado":
+        return FALHA_PERMANENTE
+    if res.get("mensagem") == MSG_SESSAO_EXPIRADA:
+        return FALHA_SESSAO
+    return FALHA_TRANSITORIA
+
+
+DISJUNTOR_FECHADO = "fechado"
+DISJUNTOR_ABERTO = "aberto"
+DISJUNTOR_MEIO_ABERTO = "meio_aberto"
+
+
+class DisjuntorFalhas:
+    """
+    Abre quando a fração de falhas transitórias/de sessão nas últimas
+    `janela` consultas passa de `limite`: todos os workers param por
+    `pausa_s`. Depois um único worker faz uma consulta de sonda; se der
+    certo o disjuntor fecha, senão reabre com a pausa dobrada.
+    """
+
+    def __init__(self, janela: int = 20, limite: float = 0.5, minimo: int = 10,
+                 pausa_s: float = 60.0, pausa_max_s: float = 900.0):
+        self.lock = threading.Lock()
+        self.janela: deque = deque(maxlen=janela)
+        self.limite = limite
+        self.minimo = minimo
+        self.pausa_base_s = pausa_s
+        self.pausa_s = pausa_s
+        self.pausa_max_s = pausa_max_s
+        self.estado = DISJUNTOR_FECHADO
+        self.aberto_ate = 0.0
+        self.sonda: Optional[int] = None
+        self.aberturas = 0
+
+    def permitir(self, worker_id: int) -> bool:
+        with self.lock:
+            if self.estado == DISJUNTOR_FECHADO:
+                return True
+            if self.estado == DISJUNTOR_ABERTO:
+                if time.time() < self.aberto_ate:
+                    return False
+                self.estado = DISJUNTOR_MEIO_ABERTO
+                self.sonda = worker_id
+                ui_log(f"Disjuntor meio-aberto: W{worker_id} faz uma consulta de sonda.")
+                return True
+            return worker_id == self.sonda
+
+    def registrar(self, worker_id: int, res: Dict[str, Any]) -> None:
+        if res.get("cache") or res.get("falha") == FALHA_FATAL:
+            return
+        falhou = res.get("falha") in FALHAS_ADIAVEIS
+        with self.lock:
+            if self.estado == DISJUNTOR_MEIO_ABERTO:
+                if worker_id != self.sonda:
+                    return
+                if falhou:
+                    self.pausa_s = min(self.pausa_max_s, self.pausa_s * 2)
+                    self._abrir("a sonda falhou")
+                else:
+                    self.estado = DISJUNTOR_FECHADO
+                    self.sonda = None
+                    self.pausa_s = self.pausa_base_s
+                    self.janela.clear()
+                    ui_log("Disjuntor fechado: site respondendo de novo.")
+                    registrar_evento("disjuntor", estado=DISJUNTOR_FECHADO)
+                return
+            if self.estado != DISJUNTOR_FECHADO:
+                return
+            self.janela.append(falhou)
+            n = len(self.janela)
+            if n >= self.minimo and sum(self.janela) / n >= self.limite:
+                self._abrir(f"{sum(self.janela)}/{n} falhas recentes")
+
+    def _abrir(self, motivo: str) -> None:
+        self.estado = DISJUNTOR_ABERTO
+        self.aberto_ate = time.time() + self.pausa_s
+        self.sonda = None
+        self.janela.clear()
+        self.aberturas += 1
+        METRICAS.contar("disjuntor_aberto")
+        registrar_evento("disjuntor", estado=DISJUNTOR_ABERTO, motivo=motivo, pausa_s=self.pausa_s)
+        ui_log(f"Disjuntor aberto ({motivo}). Pausando consultas por {self.pausa_s:.0f}s.", "warning")
+
+    def resumo(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "estado": self.estado,
+                "aberto_ate": self.aberto_ate,
+                "aberturas": self.aberturas,
+            }
+
+
+# =============================================================================
+# RECICLAGEM DO DRIVER (LIMITE DE MEMÓRIA)
+# =============================================================================
+# Um Chromium de vida longa acumula memória nos renderers até o contêiner
+# matar o processo no meio de um auto. Entre dois autos (ponto seguro: nada
+# em voo) o worker troca o navegador quando algum limite é atingido; a sessão
+# volta pelos cookies salvos e nada conta como falha.
+def motivo_reciclagem(rt) -> Optional[str]:
+    if not isinstance(rt, SeleniumRuntime) or rt.driver is None:
+        return None
+    if rt.cfg.reciclar_apos_autos and rt.autos_servidos >= rt.cfg.reciclar_apos_autos:
+        return f"{rt.autos_servidos} autos servidos"
+    idade_min = (time.time() - rt.iniciado_em) / 60.0
+    if rt.cfg.reciclar_idade_min and idade_min >= rt.cfg.reciclar_idade_min:
+        return f"{idade_min:.0f} min de uso"
+    if rt.cfg.reciclar_rss_mb:
+        rss_mb = rt.memoria_kb() / 1024.0
+        if rss_mb >= rt.cfg.reciclar_rss_mb:
+            return f"RSS de {rss_mb:.0f} MB"
+    return None
+
+
+def reciclar_runtime(rt: SeleniumRuntime, motivo: str, usuario: str, senha: str, headless: bool, debug: bool) -> bool:
+    ui_log(
+        f"Reciclando o navegador ({motivo}): {rt.autos_servidos} autos, "
+        f"{rt.memoria_kb() / 1024.0:.0f} MB (renderers {rt.memoria_kb('renderer') / 1024.0:.0f} MB)."
+    )
+    METRICAS.contar("driver_reciclado")
+    registrar_evento("reciclagem", motivo=motivo, autos=rt.autos_servidos, rss_mb=round(rt.memoria_kb() / 1024.0))
+    with METRICAS.medir("reciclagem"):
+        rt.start(headless=headless)
+        try:
+            ok = ensure_session(rt, usuario, senha, headless=headless, debug=debug)
+        except CredenciaisRejeitadas:
+            ok = False  # o próximo auto recebe a falha fatal
+
+    ui_log(f"Navegador reciclado: {rt.memoria_kb() / 1024.0:.0f} MB após o login.")
+    return ok
+
+
+def falha_ao_reciclar(rt: SeleniumRuntime, worker_id: int, e: Exception) -> None:
+    """
+    O Chromium não subiu na reciclagem (ou na troca pela reserva): o worker
+    segue vivo e o próximo auto passa pelo reinício normal de ensure_session.
+    """
+    ui_log(f"W{worker_id}: falha ao reciclar o navegador ({e}). O próximo auto reinicia o {rt.ROTULO}.", "warning")
+    parar_runtime(rt)
+
+
+# =============================================================================
+# RESERVA QUENTE (FAILOVER DO DRIVER)
+# =============================================================================
+# Um Chromium que cai no meio do job custa uma subida a frio e um login
+# inteiro (dezenas de segundos) com o worker parado. Com a reserva, um
+# navegador extra fica aberto e logado em segundo plano; quando o de um
+# worker cai ou vai ser reciclado, o worker passa a usar o da reserva
+# (SeleniumRuntime.assumir) e a reserva começa a aquecer outro.
+class ReservaQuente:
+    """Um SeleniumRuntime logado à espera de substituir o de algum worker."""
+
+    def __init__(self, rt: SeleniumRuntime, usuario: str, senha: str, headless: bool, debug: bool,
+                 sonda_s: float = 120.0):
+        self.rt = rt
+        self.usuario = usuario
+        self.senha = senha
+        self.headless = headless
+        self.debug = debug
+        self.sonda_s = sonda_s
+        self.lock = threading.Lock()  # o driver da reserva é de quem segura o lock
+        self.pronta = False
+        self.sondando = False
+        self.trocas = 0
+        self._acordar = threading.Event()
+        self._fim = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self) -> None:
+        sink, eventos = getattr(_LOG_CTX, "sink", None), getattr(_LOG_CTX, "eventos", None)
+        self._thread = threading.Thread(
+            target=self._laco, args=(sink, eventos), name="antt-reserva", daemon=True
+        )
+        self._thread.start()
+
+    def _laco(self, sink, eventos) -> None:
+        _LOG_CTX.sink = sink
+        _LOG_CTX.eventos = eventos
+        while not self._fim.is_set():
+            if not self.pronta:
+                if not self._aquecer():
+                    return
+            elif not self._sondar():
+                ui_log("Navegador reserva perdeu a sessão. Aquecendo outro...", "warning")
+                continue
+            self._acordar.wait(self.sonda_s if self.pronta else 30.0)
+            self._acordar.clear()
+
+    def _aquecer(self) -> bool:
+        """Sobe e loga o navegador da reserva; False encerra a reserva (credenciais recusadas)."""
+        t0 = time.time()
+        try:
+            self.rt.start(headless=self.headless)
+            ok = restaurar_sessao(self.rt, self.usuario)
+            if not ok:
+                ok = realizar_login(self.rt, self.usuario, self.senha, debug=self.debug)
+                if ok:
+                    salvar_sessao(self.rt, self.usuario)
+        except CredenciaisRejeitadas as e:
+            ui_log(f"Navegador reserva desligado: credenciais rejeitadas ({e}).", "warning")
+            parar_runtime(self.rt)
+            return False
+        except Exception as e:
+            ok = False
+            logger.warning("Falha ao aquecer o navegador reserva: %s", e)
+        if not ok:
+            parar_runtime(self.rt)
+            return True  # tenta de novo depois de uma espera
+        with self.lock:
+            self.pronta = not self._fim.is_set()
+        METRICAS.observar("reserva_aquecimento", time.time() - t0)
+        ui_log(f"Navegador reserva pronto em {time.time() - t0:.1f}s.")
+        return True
+
+    def _sondar(self) -> bool:
+        # Recarregar a consulta mantém a sessão do ASP.NET viva e mostra se ela caiu.
+        # A sonda (até o timeout de carga da página) roda fora do lock: enquanto
+        # ela dura, assumir_em recusa a reserva e o worker segue pelo reinício a frio.
+        with self.lock:
+            if not self.pronta:
+                return True  # foi usada enquanto esperávamos
+            self.sondando = True
+        try:
+            self.rt.driver.get(self.rt.cfg.url_consulta)
+            vivo = is_logged_in(self.rt)
+        except Exception:
+            vivo = False
+        with self.lock:
+            self.sondando = False
+            if not vivo:
+                self.pronta = False
+        if not vivo:
+            parar_runtime(self.rt)
+        return vivo
+
+    def assumir_em(self, rt: SeleniumRuntime, worker_id: int, motivo: str) -> bool:
+        """Troca o navegador de `rt` pelo da reserva; False se ela não está pronta ou está em sonda."""
+        with self.lock:
+            if not self.pronta or self.sondando or self._fim.is_set():
+                return False
+            self.pronta = False
+            rt.assumir(self.rt)
+            self.trocas += 1
+        self._acordar.set()
+        METRICAS.contar("driver_reserva")
+        registrar_evento("reserva", worker=worker_id, motivo=motivo)
+        ui_log(f"W{worker_id}: navegador reserva assumiu ({motivo}). Aquecendo outro...")
+        return True
+
+    def encerrar(self) -> None:
+        """Para a thread; o runtime volta para quem o emprestou (logado, se estava pronto)."""
+        self._fim.set()
+        self._acordar.set()
+        with self.lock:
+            aquecendo = not self.pronta
+        if aquecendo:
+            parar_runtime(self.rt)  # aborta um login em curso
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+
+# =============================================================================
+# BACKEND HTTP (SEM NAVEGADOR)
+# =============================================================================
+# Fala o protocolo de postback do ASP.NET WebForms diretamente: cada página é
+# lida com BeautifulSoup, os campos ocultos (__VIEWSTATE, __EVENTVALIDATION...)
+# são reenviados e os cookies de Login.aspx ficam na requests.Session.
+RE_DO_POSTBACK = re.compile(r"__doPostBack\(\s*['\"]([^'\"]*)['\"]\s*,\s*['\"]([^'\"]*)['\"]")
+RE_WINDOW_OPEN = re.compile(r"window\.open\(\s*['\"]([^'\"]+)['\"]")
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+class HttpRuntime:
+    """Equivalente ao SeleniumRuntime para o backend HTTP (sessão com pool de conexões)."""
+
+    ROTULO = "Cliente HTTP"
+
+    def __init__(self):
+        self.session: Optional[requests.Session] = None
+        self.pagina: Optional[BeautifulSoup] = None  # última página com o formulário de consulta
+        self.url_pagina: str = ""
+        self.sessao_ts: float = 0.0
+        self.iniciado_em: float = 0.0
+        self.autos_servidos: int = 0
+        self.relogins: int = 0
+        self.reinicios: int = 0
+        self.logins: int = 0
+        self.excecoes: int = 0
+        self.cfg: Config = CFG  # ver SeleniumRuntime.cfg
+
+    def start(self, headless: bool = True):
+        self.stop()
+        self.iniciado_em = time.time()
+        self.autos_servidos = 0
+
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        s.verify = False  # mesmo comportamento do --ignore-certificate-errors do Chromium
+        s.headers.update({
+            "User-Agent": (
+                "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+            ),
+        })
+        self.session = s
+
+    def stop(self):
+        try:
+            if self.session is not None:
+                self.session.close()
+        except Exception:
+            pass
+        self.session = None
+        self.pagina = None
+        self.url_pagina = ""
+        self.sessao_ts = 0.0
+
+    def is_alive(self) -> bool:
+        return self.session is not None
+
+    def get(self, url: str) -> BeautifulSoup:
+        r = self.session.get(url, timeout=self.cfg.timeout)
+        r.raise_for_status()
+        self.url_pagina = r.url
+        return BeautifulSoup(r.text, "html.parser")
+
+    def postback(self, soup: BeautifulSoup, elemento_id: str, valores: Optional[Dict[str, str]] = None) -> BeautifulSoup:
+        """Submete o formulário de `soup` como se o elemento `elemento_id` tivesse sido clicado."""
+        form = soup.find("form")
+        if form is None:
+            raise ValueError("Formulário ASP.NET não encontrado na página.")
+
+        dados = campos_formulario(form)
+        for el_id, val in (valores or {}).items():
+            el = soup.find(id=el_id)
+            if el is None or not el.get("name"):
+                raise ValueError(f"Campo não encontrado: {el_id}")
+            dados[el["name"]] = val
+
+        el = soup.find(id=elemento_id)
+        if el is None:
+            raise ValueError(f"Elemento não encontrado: {elemento_id}")
+        tipo = (el.get("type") or "").lower()
+        if el.name == "input" and tipo == "image":
+            dados[f"{el['name']}.x"] = "1"
+            dados[f"{el['name']}.y"] = "1"
+        elif el.name in ("input", "button") and el.get("name"):
+            dados[el["name"]] = el.get("value", "")
+        else:
+            m = RE_DO_POSTBACK.search((el.get("href") or "") + " " + (el.get("onclick") or ""))
+            if not m:
+                raise ValueError(f"Não foi possível acionar o elemento: {elemento_id}")
+            dados["__EVENTTARGET"] = m.group(1)
+            dados["__EVENTARGUMENT"] = m.group(2)
+
+        action = urljoin(self.url_pagina, form.get("action") or self.url_pagina)
+        r = self.session.post(action, data=dados, timeout=self.cfg.timeout)
+        r.raise_for_status()
+        self.url_pagina = r.url
+        return BeautifulSoup(r.text, "html.parser")
+
+
+def campos_formulario(form) -> Dict[str, str]:
+    """Serializa o formulário como o navegador faria, sem os botões de submit."""
+    dados: Dict[str, str] = {}
+    for el in form.find_all(["input", "select", "textarea"]):
+        nome = el.get("name")
+        if not nome:
+            continue
+        if el.name == "input":
+            tipo = (el.get("type") or "text").lower()
+            if tipo in ("submit", "image", "button", "reset", "file"):
+                continue
+            if tipo in ("checkbox", "radio") and not el.has_attr("checked"):
+                continue
+            dados[nome] = el.get("value", "on" if tipo in ("checkbox", "radio") else "")
+        elif el.name == "select":
+            opt = el.find("option", selected=True) or el.find("option")
+            if opt is not None:
+                dados[nome] = opt.get("value", opt.get_text())
+        else:
+            dados[nome] = el.get_text()
+    # Se o clique vier de um __doPostBack estes campos são sobrescritos.
+    dados.setdefault("__EVENTTARGET", "")
+    dados.setdefault("__EVENTARGUMENT", "")
+    return dados
+
+
+def valor_campo(soup: BeautifulSoup, elemento_id: str) -> str:
+    el = soup.find(id=elemento_id)
+    if el is None:
+        return ""
+    if el.name == "textarea":
+        return el.get_text()
+    return el.get("value", "") or ""
+
+
+def is_logged_in_http(rt: HttpRuntime) -> bool:
+    return rt.pagina is not None and rt.pagina.find(id=ID_AUTO) is not None
+
+
+def realizar_login_http(rt: HttpRuntime, usuario: str, senha: str, debug: bool) -> bool:
+    try:
+        ui_log("Abrindo página de login (HTTP)...")
+        soup = rt.get(rt.cfg.url_login)
+        resposta = rt.postback(soup, ID_BTN_OK, {ID_USUARIO: usuario, ID_SENHA: senha})
+        if resposta.find(id=ID_SENHA) is not None:
+            raise CredenciaisRejeitadas("o formulário de login voltou após o envio")
+        ui_log("Credenciais enviadas. Abrindo página de consulta (HTTP)...")
+
+        for tentativa in range(2):
+            soup = rt.get(rt.cfg.url_consulta)
+            if soup.find(id=ID_AUTO) is not None:
+                rt.pagina = soup
+                ui_log("Página de consulta carregada com sucesso (HTTP).")
+                return True
+            if "Exceção de Sistema" not in soup.get_text():
+                break
+            ui_log("Página de erro detectada. Tentando recarregar a consulta...", "warning")
+            time.sleep(3)
+
+        raise RuntimeError("Campo de consulta não encontrado após o login.")
+
+    except CredenciaisRejeitadas:
+        rt.pagina = None
+        ui_log("Login recusado pelo site: verifique usuário e senha.", "error")
+        raise
+    except Exception as e:
+        rt.pagina = None
+        ui_log("Falha no login ou no carregamento da página de consulta (HTTP).", "error")
+        if debug:
+            logger.exception("Falha no login/consulta (HTTP)")
+            ui_log(f"Detalhe: {e}", "error")
+        return False
+
+
+def linhas_tabela(tabela) -> Optional[List[List[str]]]:
+    if tabela is None:
+        return None
+    return [[td.get_text(strip=True) for td in tr.find_all("td")] for tr in tabela.find_all("tr")]
+
+
+def processar_auto_http(rt: HttpRuntime, auto: str) -> Dict[str, Any]:
+    res = {"status": "erro", "dados": {}, "mensagem": "", "tempos": {}}
+    tempos = res["tempos"]
+
+    try:
+        if rt.pagina is None:
+            rt.pagina = rt.get(rt.cfg.url_consulta)
+
+        t0 = time.time()
+        resultado = rt.postback(rt.pagina, ID_PESQUISAR, {ID_AUTO: auto})
+        marcar_tempo(tempos, "busca", t0)
+        texto = resultado.get_text()
+
+        if resultado.find(id=ID_AUTO) is None:
+            # Voltou para o login (sessão expirada) ou para a página de erro.
+            rt.pagina = None
+            if resultado.find(id=ID_SENHA) is not None:
+                res["mensagem"] = MSG_SESSAO_EXPIRADA
+            elif "Exceção de Sistema" in texto:
+                METRICAS.contar("pagina_excecao")
+                rt.excecoes += 1
+                res["mensagem"] = "Erro fluxo: Exceção de Sistema"
+            else:
+                res["mensagem"] = "Erro fluxo: página de consulta não retornada"
+            return res
+        rt.pagina = resultado
+
+        if resultado.find(id=ID_EDITAR_0) is None:
+            # Como no Selenium, só "Nenhum registro" é resposta definitiva;
+            # página truncada/alterada volta como transitória (e fora do cache).
+            if TEXTO_NENHUM_REGISTRO in texto:
+                res["status"] = "nao_encontrado"
+                res["mensagem"] = "Auto não localizado"
+            elif "Exceção de Sistema" in texto:
+                METRICAS.contar("pagina_excecao")
+                rt.excecoes += 1
+                res["mensagem"] = "Erro fluxo: Exceção de Sistema"
+            else:
+                res["mensagem"] = "Erro fluxo: resultado da pesquisa não reconhecido"
+            return res
+
+        t0 = time.time()
+        detalhe = rt.postback(resultado, ID_EDITAR_0)
+        if detalhe.find(id=ID_AUTO) is not None:
+            # ViewState mais recente para a próxima pesquisa.
+            rt.pagina = detalhe
+
+        if detalhe.find(id=ID_PROCESSO) is None:
+            # O botão normalmente responde com um script que abre o popup.
+            m = None
+            for script in detalhe.find_all("script"):
+                m = RE_WINDOW_OPEN.search(script.get_text())
+                if m:
+                    break
+            if m is None:
+                res["mensagem"] = "Erro leitura: detalhe do auto não encontrado"
+                return res
+            url_consulta = rt.url_pagina
+            detalhe = rt.get(urljoin(url_consulta, m.group(1)))
+            rt.url_pagina = url_consulta
+        marcar_tempo(tempos, "detalhe", t0)
+
+        t0 = time.time()
+        documentos = linhas_tabela(detalhe.find(id=ID_DOCUMENTOS))
+        dados = {k: valor_campo(detalhe, el_id) for k, el_id in CAMPOS_DETALHE.items()}
+        dados.update(andamento_de_linhas(documentos))
+        marcar_tempo(tempos, "extracao", t0)
+
+        res["status"] = "sucesso"
+        res["dados"] = dados
+        res["documentos"] = documentos
+        res["mensagem"] = "Sucesso"
+        return res
+
+    except requests.RequestException:
+        raise
+    except Exception as e:
+        res["mensagem"] = f"Erro fluxo: {e}"
+        return res
+
+
+# =============================================================================
+# CACHE DE RESULTADOS (ENTRE JOBS)
+# =============================================================================
+class ResultCache:
+    """
+    Cache persistente (SQLite em modo WAL) do resultado de cada Auto de
+    Infração. Só guarda desfechos definitivos (sucesso / não encontrado), cada
+    um com o seu TTL; erros nunca entram no cache.
+    """
+
+    STATUS_CACHEAVEIS = ("sucesso", "nao_encontrado")
+
+    def __init__(
+        self,
+        diretorio: str,
+        ttl_sucesso_h: float,
+        ttl_nao_encontrado_h: float,
+        max_mb: float,
+    ):
+        os.makedirs(diretorio, exist_ok=True)
+        self.path = os.path.join(diretorio, "resultados.sqlite3")
+        self.ttl = {
+            "sucesso": ttl_sucesso_h * 3600,
+            "nao_encontrado": ttl_nao_encontrado_h * 3600,
+        }
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._local = threading.local()
+        self._puts = 0
+
+        con = self._con()
+        # Vale para um banco novo (antes da primeira tabela): as páginas que o
+        # evict libera voltam ao disco com incremental_vacuum, sem VACUUM.
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            " auto TEXT PRIMARY KEY, status TEXT NOT NULL, mensagem TEXT,"
+            " dados TEXT, ts REAL NOT NULL)"
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS idx_resultados_ts ON resultados (ts)")
+        con.commit()
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Banco criado sem o modo incremental: converte uma única vez, aqui.
+            con.execute("VACUUM")
+
+    def _con(self) -> sqlite3.Connection:
+        # Uma conexão por thread (os workers do pool consultam em paralelo).
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def get(self, auto: str) -> Optional[Dict[str, Any]]:
+        row = self._con().execute(
+            "SELECT status, mensagem, dados, ts FROM resultados WHERE auto = ?", (auto,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, mensagem, dados, ts = row
+        if time.time() - ts > self.ttl.get(status, 0):
+            return None
+        # "ts" é quando o site foi consultado, não agora: vira o "Consultado em".
+        return {
+            "status": status, "dados": json.loads(dados or "{}"), "mensagem": mensagem, "cache": True,
+            "ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+        }
+
+    def put(self, auto: str, res: Dict[str, Any]) -> None:
+        if res.get("status") not in self.STATUS_CACHEAVEIS:
+            return
+        con = self._con()
+        con.execute(
+            "INSERT OR REPLACE INTO resultados (auto, status, mensagem, dados, ts) VALUES (?, ?, ?, ?, ?)",
+            (
+                auto,
+                res["status"],
+                res.get("mensagem", ""),
+                json.dumps(res.get("dados", {}), ensure_ascii=False),
+                time.time(),
+            ),
+        )
+        con.commit()
+
+        self._puts += 1
+        if self._puts % 200 == 0:
+            self.evict()
+
+    def tamanho_bytes(self) -> int:
+        """Bytes em uso (páginas livres, ainda não devolvidas ao disco, não contam)."""
+        con = self._con()
+        paginas = con.execute("PRAGMA page_count").fetchone()[0]
+        livres = con.execute("PRAGMA freelist_count").fetchone()[0]
+        tam_pagina = con.execute("PRAGMA page_size").fetchone()[0]
+        return (paginas - livres) * tam_pagina
+
+    def evict(self) -> int:
+        """
+        Acima de `max_bytes`, remove numa só passada as entradas mais antigas
+        até ~90% do limite (pelo tamanho médio de uma entrada) e devolve as
+        páginas liberadas com incremental_vacuum.
+        """
+        con = self._con()
+        usado = self.tamanho_bytes()
+        if usado <= self.max_bytes:
+            return 0
+        total = con.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+        if total == 0:
+            return 0
+        alvo = int(self.max_bytes * 0.9)
+        remover = min(total, (total * (usado - alvo) + usado - 1) // usado)
+        con.execute(
+            "DELETE FROM resultados WHERE auto IN (SELECT auto FROM resultados ORDER BY ts LIMIT ?)",
+            (remover,),
+        )
+        con.commit()
+        con.execute("PRAGMA incremental_vacuum").fetchall()
+        logger.info("Cache: %d entradas antigas removidas.", remover)
+        return remover
+
+
+def processar_auto_com_cache(
+    rt: SeleniumRuntime,
+    auto: str,
+    usuario: str,
+    senha: str,
+    headless: bool,
+    debug: bool,
+    cache: Optional[ResultCache] = None,
+    forcar_atualizacao: bool = False,
+    max_retries: int = 2,
+) -> Dict[str, Any]:
+    if cache is not None and not forcar_atualizacao:
+        try:
+            res = cache.get(auto)
+            if res is not None:
+                METRICAS.contar("cache_hit")
+                return res
+        except sqlite3.Error as e:
+            logger.warning("Cache indisponível (%s); consultando o site.", e)
+
+    with METRICAS.medir("auto"):
+        res = processar_auto_com_recuperacao(
+            rt, auto, usuario, senha,
+            headless=headless, debug=debug, max_retries=max_retries
+        )
+    METRICAS.contar(res.get("status", "erro"))
+    if res.get("falha"):
+        METRICAS.contar(f"falha_{res['falha']}")
+
+    if cache is not None:
+        try:
+            cache.put(auto, res)
+        except sqlite3.Error as e:
+            logger.warning("Falha ao gravar no cache: %s", e)
+    return res
+
+
+def processar_autos_com_cache(
+    rt: SeleniumRuntime,
+    autos: List[str],
+    usuario: str,
+    senha: str,
+    headless: bool,
+    debug: bool,
+    cache: Optional[ResultCache] = None,
+    forcar_atualizacao: bool = False,
+    max_retries: int = 2,
+) -> List[Dict[str, Any]]:
+    """processar_auto_com_cache para um lote: só os que faltam no cache vão para as abas."""
+    resultados: List[Dict[str, Any]] = [{} for _ in autos]
+    faltam = []
+    for i, auto in enumerate(autos):
+        res = None
+        if cache is not None and not forcar_atualizacao:
+            try:
+                res = cache.get(auto)
+            except sqlite3.Error as e:
+                logger.warning("Cache indisponível (%s); consultando o site.", e)
+        if res is not None:
+            METRICAS.contar("cache_hit")
+            resultados[i] = res
+        else:
+            faltam.append(i)
+    if not faltam:
+        return resultados
+
+    lote = processar_autos_com_recuperacao(
+        rt, [autos[i] for i in faltam], usuario, senha,
+        headless=headless, debug=debug, max_retries=max_retries
+    )
+    for i, res in zip(faltam, lote):
+        METRICAS.contar(res.get("status", "erro"))
+        if res.get("falha"):
+            METRICAS.contar(f"falha_{res['falha']}")
+        if cache is not None:
+            try:
+                cache.put(autos[i], res)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao gravar no cache: %s", e)
+        resultados[i] = res
+    return resultados
+
+
+# =============================================================================
+# CONTROLE ADAPTATIVO DE VAZÃO (AIMD)
+# =============================================================================
+# Sinais de congestionamento: páginas "Exceção de Sistema", falhas
+# transitórias, latência muito acima da linha de base, `max_reinicios`
+# reinícios de driver/sessão HTTP (conexão resetada) em `janela_reinicios_s`
+# segundos e relogins acima de `max_relogins_por_worker` por worker em
+# `janela_relogins_s` (a sessão do ASP.NET vence a cada ~20 min; bem acima
+# disso é o site derrubando sessões). As janelas são de tempo e não de
+# consultas, senão desacelerar aumentaria a frequência medida. Os sinais vêm
+# dos runtimes do próprio job (ver worker_loop), não das métricas do
+# processo, que somam todos os jobs. Cada sinal dobra o atraso entre
+# consultas e corta pela metade os workers ativos; cada consulta saudável
+# reduz o atraso em um passo fixo e, a cada `sucessos_para_subir`, reativa um
+# worker.
+class ControleVazao:
+    def __init__(
+        self,
+        max_workers: int,
+        adaptativo: bool = True,
+        atraso_fixo: float = 0.0,
+        atraso_max: float = 5.0,
+        passo_atraso: float = 0.1,
+        atraso_min_recuo: float = 0.5,
+        fator_latencia: float = 2.5,
+        latencia_min_s: float = 2.0,
+        sucessos_para_subir: int = 20,
+        janela_reinicios_s: float = 60.0,
+        max_reinicios: int = 3,
+        janela_relogins_s: float = 300.0,
+        max_relogins_por_worker: int = 2,
+    ):
+        self.lock = threading.Lock()
+        self.adaptativo = adaptativo
+        self.max_workers = max(1, max_workers)
+        self.atraso = 0.0 if adaptativo else atraso_fixo
+        self.concorrencia = self.max_workers
+        self.atraso_max = atraso_max
+        self.passo_atraso = passo_atraso
+        self.atraso_min_recuo = atraso_min_recuo
+        self.fator_latencia = fator_latencia
+        self.latencia_min_s = latencia_min_s
+        self.sucessos_para_subir = sucessos_para_subir
+        self.janela_reinicios_s = janela_reinicios_s
+        self.max_reinicios = max_reinicios
+        self.janela_relogins_s = janela_relogins_s
+        self.max_relogins = max(1, max_relogins_por_worker) * self.max_workers
+
+        self.latencia_base: Optional[float] = None  # EWMA das consultas saudáveis
+        self.ultimo_sinal = ""
+        self.reducoes = 0
+        self._sucessos = 0
+        self._recuo_ate = 0.0
+        self._reinicios: deque = deque()  # instante de cada reinício
+        self._relogins: deque = deque()
+
+    @staticmethod
+    def _frequencia(instantes: deque, novos: int, agora: float, janela_s: float, maximo: int) -> int:
+        """Registra `novos` eventos; devolve quantos houve na janela se chegou a `maximo` (e zera), senão 0."""
+        instantes.extend([agora] * novos)
+        while instantes and instantes[0] <= agora - janela_s:
+            instantes.popleft()
+        if len(instantes) < maximo:
+            return 0
+        n = len(instantes)
+        instantes.clear()
+        return n
+
+    def registrar(self, res: Dict[str, Any], segundos: float, preparo_sessao: bool = False) -> None:
+        """
+        Alimenta o controle com o desfecho de uma consulta (hits de cache não
+        contam). "reinicios", "relogins" e "excecoes" do resultado são os da
+        chamada ao runtime (ver worker_loop); `preparo_sessao` diz que ela
+        incluiu subida do navegador ou login, e então a latência não conta.
+        """
+        if not self.adaptativo or res.get("cache"):
+            return
+        with self.lock:
+            agora = time.time()
+            sinais = []
+            if res.get("excecoes"):
+                sinais.append("exceção de sistema")
+
+            n = self._frequencia(
+                self._reinicios, res.get("reinicios", 0), agora, self.janela_reinicios_s, self.max_reinicios
+            )
+            if n:
+                sinais.append(f"{n} reinícios em {self.janela_reinicios_s:.0f}s")
+            n = self._frequencia(
+                self._relogins, res.get("relogins", 0), agora, self.janela_relogins_s, self.max_relogins
+            )
+            if n:
+                sinais.append(f"{n} relogins em {self.janela_relogins_s:.0f}s")
+
+            if res.get("falha") == FALHA_TRANSITORIA:
+                sinais.append("falha transitória")
+            # Consulta que incluiu login/reinício é lenta por isso, não pelo site.
+            if (
+                not preparo_sessao
+                and self.latencia_base is not None
+                and segundos > self.latencia_min_s
+                and segundos > self.fator_latencia * self.latencia_base
+            ):
+                sinais.append(f"latência {segundos:.1f}s (base {self.latencia_base:.1f}s)")
+
+            if sinais:
+                self._recuar(sinais)
+            else:
+                self._avancar(None if preparo_sessao else segundos)
+
+    def _recuar(self, sinais: List[str]) -> None:
+        agora = time.time()
+        self._sucessos = 0
+        self.ultimo_sinal = ", ".join(sinais)
+        # Uma rajada de erros é um único evento: após recuar, espera o novo
+        # ritmo fazer efeito antes de recuar de novo.
+        if agora < self._recuo_ate:
+            return
+        self.atraso = min(self.atraso_max, max(self.atraso_min_recuo, self.atraso * 2))
+        self.concorrencia = max(1, self.concorrencia // 2)
+        self._recuo_ate = agora + max(2.0, 2 * self.atraso)
+        self.reducoes += 1
+        METRICAS.contar("vazao_recuo")
+        ui_log(
+            f"Vazão reduzida ({self.ultimo_sinal}): atraso {self.atraso:.2f}s, "
+            f"{self.concorrencia}/{self.max_workers} worker(s).",
+            "warning",
+        )
+
+    def _avancar(self, segundos: Optional[float]) -> None:
+        if segundos is not None:  # None: consulta com login/subida, fora da linha de base
+            self.latencia_base = segundos if self.latencia_base is None else 0.9 * self.latencia_base + 0.1 * segundos
+        self.atraso = max(0.0, self.atraso - self.passo_atraso)
+        self._sucessos += 1
+        if self._sucessos >= self.sucessos_para_subir and self.concorrencia < self.max_workers:
+            self.concorrencia += 1
+            self._sucessos = 0
+
+    def ativo(self, worker_id: int) -> bool:
+        return worker_id < self.concorrencia
+
+    def estado(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "adaptativo": self.adaptativo,
+                "atraso": round(self.atraso, 2),
+                "concorrencia": self.concorrencia,
+                "max_workers": self.max_workers,
+                "reducoes": self.reducoes,
+                "ultimo_sinal": self.ultimo_sinal,
+            }
+
+
+# =============================================================================
+# CONCESSÃO DE RUNTIMES (VÁRIOS JOBS NO MESMO PROCESSO)
+# =============================================================================
+# A UI atende várias sessões do Streamlit no mesmo processo. Em vez de um
+# runtime compartilhado por todas, cada job pede uma concessão: há um teto
+# global de runtimes vivos, os pedidos são atendidos em ordem de chegada e um
+# runtime ocioso só é reaproveitado pela mesma credencial e backend (um
+# Chromium logado como outro usuário é encerrado antes de trocar de dono).
+def chave_credencial(usuario: str, senha: str) -> str:
+    return hashlib.sha256(f"{usuario}\n{senha}".encode("utf-8")).hexdigest()[:16]
+
+
+def perfil_navegador(cfg: Config) -> str:
+    """Opções com que o Chromium é aberto (SeleniumRuntime.start): só reaproveita quem bate."""
+    return f"enxuto={cfg.perfil_enxuto};abas={cfg.abas_por_driver > 1};timeout={cfg.timeout}"
+
+
+class Concessao:
+    """Runtimes emprestados a um job; devolvidos com devolver() ao fim dele."""
+
+    def __init__(self, gerenciador: "GerenciadorRuntimes", dono: str, chave: str, backend: str, runtimes: List[Any]):
+        self.gerenciador = gerenciador
+        self.dono = dono
+        self.chave = chave
+        self.backend = backend
+        self.runtimes = runtimes
+        self.concedida_em = time.time()
+        self.devolvida = False
+
+    def devolver(self) -> None:
+        self.gerenciador.devolver(self)
+
+
+class GerenciadorRuntimes:
+    """
+    Empresta runtimes aos jobs com no máximo `max_runtimes` vivos (em uso +
+    ociosos). Quem não cabe espera numa fila FIFO: só o primeiro da fila é
+    atendido, com tantos runtimes quantos houver livres (até o pedido). Os
+    devolvidos ficam ociosos, ainda logados, para a mesma credencial; uma
+    thread encerra os que passam de `ocioso_s` sem uso.
+    """
+
+    def __init__(self, max_runtimes: int = 4, ocioso_s: float = 600.0,
+                 fabrica: Optional[Callable[[str], Any]] = None):
+        self.max_runtimes = max(1, int(max_runtimes))
+        self.ocioso_s = ocioso_s
+        self.fabrica = fabrica or novo_runtime
+        self._cond = threading.Condition()
+        self._fila: deque = deque()  # pedidos aguardando, na ordem de chegada
+        self._ociosos: List[Tuple[float, str, str, Any]] = []  # (desde, chave, backend, rt)
+        self._concessoes: Dict[int, Concessao] = {}
+        self._em_uso = 0
+        self._fim = threading.Event()
+        self._ceifador: Optional[threading.Thread] = None
+
+    def obter(self, dono: str, n: int, backend: str, usuario: str, senha: str,
+              cancelar: Optional[threading.Event] = None, perfil: str = "") -> Optional[Concessao]:
+        """
+        Bloqueia até haver runtime livre; None se `cancelar` for setado antes.
+        Ociosos só são reaproveitados com a mesma credencial e `perfil`.
+        """
+        chave = chave_credencial(usuario, senha) + (f"|{perfil}" if perfil else "")
+        pedido = object()
+        with self._cond:
+            self._fila.append(pedido)
+            try:
+                avisado = False
+                while not (self._fila[0] is pedido and self._em_uso < self.max_runtimes):
+                    if cancelar is not None and cancelar.is_set():
+                        return None
+                    if not avisado:
+                        ui_log(
+                            f"Aguardando runtime livre ({self._em_uso}/{self.max_runtimes} em uso, "
+                            f"posição {list(self._fila).index(pedido) + 1} na fila)."
+                        )
+                        avisado = True
+                    self._cond.wait(0.5)
+                k = min(max(1, n), self.max_runtimes - self._em_uso)
+                reaproveitados, descartar = self._reservar(chave, backend, k)
+            finally:
+                self._fila.remove(pedido)
+                self._cond.notify_all()
+
+        # Fora do lock: encerrar/abrir um Chromium leva segundos.
+        for rt in descartar:
+            parar_runtime(rt)
+        runtimes = reaproveitados + [self.fabrica(backend) for _ in range(k - len(reaproveitados))]
+        concessao = Concessao(self, dono, chave, backend, runtimes)
+        with self._cond:
+            self._concessoes[id(concessao)] = concessao
+        if reaproveitados:
+            METRICAS.contar("runtime_reaproveitado", len(reaproveitados))
+        if k < n:
+            ui_log(f"Teto de runtimes: job segue com {k} de {n} worker(s).", "warning")
+        return concessao
+
+    def _reservar(self, chave: str, backend: str, k: int) -> Tuple[List[Any], List[Any]]:
+        # Chamado com o lock. Prefere os ociosos da mesma credencial (os mais
+        # recentes) e abre espaço encerrando os ociosos mais antigos de outros.
+        mesmos = [o for o in self._ociosos if o[1] == chave and o[2] == backend][-k:]
+        for o in mesmos:
+            self._ociosos.remove(o)
+        excesso = self._em_uso + k + len(self._ociosos) - self.max_runtimes
+        descartar = []
+        while excesso > 0 and self._ociosos:
+            descartar.append(self._ociosos.pop(0)[3])
+            excesso -= 1
+        self._em_uso += k
+        return [o[3] for o in mesmos], descartar
+
+    def devolver(self, concessao: Concessao) -> None:
+        with self._cond:
+            if concessao.devolvida:
+                return
+            concessao.devolvida = True
+            self._concessoes.pop(id(concessao), None)
+            self._em_uso -= len(concessao.runtimes)
+            agora = time.time()
+            mortos = []
+            for rt in concessao.runtimes:
+                if rt.is_alive():
+                    self._ociosos.append((agora, concessao.chave, concessao.backend, rt))
+                else:
+                    mortos.append(rt)
+            self._cond.notify_all()
+            if self._ceifador is None:
+                self._ceifador = threading.Thread(target=self._ceifar, name="antt-runtimes-ociosos", daemon=True)
+                self._ceifador.start()
+        for rt in mortos:
+            parar_runtime(rt)
+
+    def recolher_ociosos(self, todos: bool = False) -> int:
+        """Encerra os runtimes ociosos há mais de `ocioso_s` (ou todos)."""
+        limite = time.time() - self.ocioso_s
+        with self._cond:
+            vencidos = [o for o in self._ociosos if todos or o[0] < limite]
+            for o in vencidos:
+                self._ociosos.remove(o)
+        for o in vencidos:
+            parar_runtime(o[3])
+        if vencidos:
+            METRICAS.contar("runtime_ocioso_encerrado", len(vencidos))
+        return len(vencidos)
+
+    def _ceifar(self) -> None:
+        intervalo = max(5.0, min(60.0, self.ocioso_s / 4))
+        while not self._fim.wait(intervalo):
+            try:
+                self.recolher_ociosos()
+            except Exception as e:
+                logger.warning("Falha ao encerrar runtimes ociosos: %s", e)
+
+    def encerrar(self) -> None:
+        self._fim.set()
+        self.recolher_ociosos(todos=True)
+
+    def resumo(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max": self.max_runtimes,
+                "em_uso": self._em_uso,
+                "ociosos": len(self._ociosos),
+                "fila": len(self._fila),
+                "concessoes": [
+                    {"dono": c.dono, "runtimes": len(c.runtimes), "desde": c.concedida_em}
+                    for c in self._concessoes.values()
+                ],
+            }
+
+
+def parar_runtime(rt) -> None:
+    try:
+        rt.stop()
+    except Exception:
+        pass
+
+
+# =============================================================================
+# JOB EM SEGUNDO PLANO + CHECKPOINT
+# =============================================================================
+@dataclass
+class JobParams:
+    usuario: str
+    senha: str
+    headless: bool = True
+    debug: bool = False
+    checkpoint_every: int = 10
+    throttle: float = 0.3  # atraso fixo, usado só com vazao_adaptativa=False
+    vazao_adaptativa: bool = True
+    n_workers: int = 1
+    backend: str = BACKEND_SELENIUM
+    cache: Optional[ResultCache] = None
+    forcar_atualizacao: bool = False
+    # Com gerenciador, os runtimes vêm de uma concessão (UI com vários
+    # usuários); sem ele, usa `runtimes` e cria os que faltarem (CLI/bench).
+    gerenciador: Optional[GerenciadorRuntimes] = None
+    runtimes: List[Any] = field(default_factory=list)
+    gerar_xlsx: bool = True  # False nos shards: o XLSX sai de juntar_shards
+    # Cópia de CFG fixada na criação do job: os workers e os runtimes do job
+    # leem daqui, então mudar CFG (ou a barra lateral de outra sessão) não
+    # afeta um job já em andamento.
+    config: Config = field(default_factory=lambda: copiar_config())
+
+
+class JobState:
+    """
+    Estado de um job, compartilhado entre a thread que o executa e a UI (que
+    só lê). Substitui os contadores que ficavam em st.session_state.
+    """
+
+    def __init__(self, job_id: str, eco: Optional[Callable[[str, str, str], None]] = None):
+        self.job_id = job_id
+        self.eco = eco  # opcional: repassa cada log (ex.: stdout na linha de comando)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        self.running = False
+        self.cursor = 0
+        self.total = 0
+        self.ok = 0
+        self.fail = 0
+        self.cache_hits = 0
+        self.summary = ""
+        self.last_error = ""
+        self.result_xlsx_path: Optional[str] = None
+        self.result_xlsx_name: Optional[str] = None
+        self.logs: deque = deque(maxlen=120)  # (HH:MM:SS, level, msg)
+        self.worker_stats: Dict[int, Dict[str, float]] = {}  # worker_id -> {"autos", "segundos"}
+        self.vazao: Optional[ControleVazao] = None
+        self.disjuntor: Optional[DisjuntorFalhas] = None
+        self.adiados: set = set()  # posições com falha transitória, para as rodadas adiadas
+        self.indice: Optional[IndiceTrabalho] = None
+        self.atualizacao = False  # entrada é um resultado anterior (ver carregar_df_or_checkpoint)
+        self.eventos: Optional[DiarioEventos] = None  # aberto enquanto o job roda (executar_job)
+        self.reserva: Optional[ReservaQuente] = None  # só com config.reserva_quente (ver rodar_job)
+        self.config: Optional[Config] = None  # a de JobParams, a partir de rodar_job
+        # Consultado antes de cada gravação no diário/meta; nos shards, falso
+        # assim que a concessão é perdida ou vence sem renovação.
+        self.pode_gravar: Callable[[], bool] = lambda: True
+
+    def log(self, msg: str, level: str = "info") -> None:
+        ts = time.strftime("%H:%M:%S")
+        with self.lock:
+            self.logs.append((ts, level, msg))
+        if self.eco is not None:
+            self.eco(ts, level, msg)
+        eventos = self.eventos
+        if eventos is not None and level != "info":
+            eventos.registrar("log", nivel=level, msg=msg)
+
+    def ultimos_logs(self, n: int = 25) -> List[Tuple[str, str, str]]:
+        with self.lock:
+            return list(self.logs)[-n:]
+
+
+class JobEmUso(RuntimeError):
+    """O job é de outra sessão da UI ou está rodando: não pode ser recarregado nem removido."""
+
+
+class JobManager:
+    """
+    Dono das threads de job: a UI só inicia, para e consulta o estado. O id
+    do job vem do conteúdo da planilha (make_job_id), então duas sessões com o
+    mesmo arquivo chegam ao mesmo job: cada job tem a sessão dona e só ela o
+    recarrega, para ou remove. Um job parado passa para outra sessão quando a
+    dona já terminou (`sessao_ativa`), o que permite retomar depois de
+    recarregar a página; sem `sessao_ativa`, o dono nunca muda.
+    """
+
+    def __init__(self, sessao_ativa: Optional[Callable[[str], bool]] = None):
+        self._jobs: Dict[str, JobState] = {}
+        self._donos: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._sessao_ativa = sessao_ativa or (lambda sessao: True)
+
+    def get(self, job_id: Optional[str], dono: Optional[str] = None) -> Optional[JobState]:
+        """O job, se ele é de `dono` (a UI não mostra o job de outra sessão)."""
+        if not job_id:
+            return None
+        with self._lock:
+            if self._donos.get(job_id) != dono:
+                return None
+            return self._jobs.get(job_id)
+
+    def obter_ou_criar(self, job_id: str, dono: Optional[str] = None) -> JobState:
+        """O job de `dono` (sessão da UI); JobEmUso se ele está rodando ou é de outra sessão viva."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = JobState(job_id)
+                self._jobs[job_id] = job
+                self._donos[job_id] = dono
+                return job
+            if job.running:
+                raise JobEmUso(f"O job {job_id} já está em execução.")
+            atual = self._donos.get(job_id)
+            if atual != dono:
+                if atual is not None and self._sessao_ativa(atual):
+                    raise JobEmUso(f"O job {job_id} (mesma planilha) está aberto em outra sessão.")
+                self._donos[job_id] = dono
+            return job
+
+    def iniciar(self, job: JobState, df: pd.DataFrame, params: JobParams) -> None:
+        with self._lock:
+            if job.running:
+                return
+            job.running = True
+            job.stop_event.clear()
+            job.summary = ""
+            job.last_error = ""
+            job.thread = threading.Thread(
+                target=executar_job, args=(job, df, params), name=f"antt-job-{job.job_id}", daemon=True
+            )
+            job.thread.start()
+
+    def parar(self, job_id: Optional[str], dono: Optional[str] = None) -> bool:
+        """Para o job se ele é de `dono`; False se não existe ou é de outra sessão."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or self._donos.get(job_id) != dono:
+                return False
+            job.stop_event.set()
+            return True
+
+    def remover(self, job_id: Optional[str], dono: Optional[str] = None) -> bool:
+        """Para e esquece o job se ele é de `dono`; o de outra sessão fica intacto (False)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or self._donos.get(job_id) != dono:
+                return False
+            job.stop_event.set()
+            del self._jobs[job_id]
+            del self._donos[job_id]
+            return True
+
+
+def texto_celula(v: Any) -> str:
+    """Valor de célula como texto, do jeito que aparece na planilha (123, não 123.0)."""
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        if v != v:  # NaN
+            return ""
+        if v.is_integer():
+            return str(int(v))
+    if isinstance(v, dt.datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    return str(v).strip()
+
+
+def colunas_entrada(cfg: Optional[Config] = None) -> List[str]:
+    """Projeção da leitura: o auto, as colunas de saída (se já vierem) e as extras."""
+    vistas = []
+    for c in [CFG.col_auto, *(cfg or CFG).colunas_extra, *colunas_saida()]:
+        if c not in vistas:
+            vistas.append(c)
+    return vistas
+
+
+def ler_xlsx_streaming(f, colunas: List[str]) -> Dict[str, List[str]]:
+    """
+    Lê só `colunas` da primeira aba com o openpyxl em modo read-only (linha a
+    linha, sem carregar a planilha inteira, e só até a última coluna
+    projetada). O cabeçalho é a primeira linha não vazia e, com nomes
+    repetidos, vale a primeira coluna. Linhas em branco no fim são
+    descartadas, as do meio mantidas, como no pd.read_excel.
+    """
+    wb = load_workbook(f, read_only=True, data_only=True)
+    try:
+        cabecalho: List[str] = []
+        linha_cab = 0
+        for linha_cab, row in enumerate(wb.worksheets[0].iter_rows(values_only=True), start=1):
+            cabecalho = [texto_celula(v) for v in row]
+            if any(cabecalho):
+                break
+        posicoes = {c: cabecalho.index(c) for c in colunas if c in cabecalho}
+        if CFG.col_auto not in posicoes:
+            raise ValueError(f"Coluna obrigatória ausente: {CFG.col_auto}")
+
+        ultima = max(posicoes.values()) + 1
+        dados: Dict[str, List[str]] = {c: [] for c in posicoes}
+        for row in wb.worksheets[0].iter_rows(min_row=linha_cab + 1, max_col=ultima, values_only=True):
+            for c, j in posicoes.items():
+                dados[c].append(texto_celula(row[j]) if j < len(row) else "")
+        return aparar_linhas_vazias(dados)
+    finally:
+        wb.close()
+
+
+def aparar_linhas_vazias(dados: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+    colunas = list(dados.values())
+    n = max((len(v) for v in colunas), default=0)
+    while n and not any(v[n - 1] if n <= len(v) else "" for v in colunas):
+        n -= 1
+    for v in colunas:
+        del v[n:]
+        v.extend([""] * (n - len(v)))
+    return dados
+
+
+def separador_csv(amostra: str) -> str:
+    cabecalho = amostra.splitlines()[0] if amostra else ""
+    contagens = {sep: cabecalho.count(sep) for sep in (";", ",", "\t", "|")}
+    sep, n = max(contagens.items(), key=lambda kv: kv[1])
+    return sep if n else ","
+
+
+def ler_csv(f, colunas: List[str]) -> pd.DataFrame:
+    if isinstance(f, (str, os.PathLike)):
+        with open(f, "rb") as fh:
+            amostra = fh.read(64 * 1024)
+    else:
+        amostra = f.read(64 * 1024)
+        f.seek(0)
+    amostra_txt = amostra.decode("utf-8-sig", "replace")
+    return pd.read_csv(
+        f,
+        sep=separador_csv(amostra_txt),
+        usecols=lambda c: c in colunas,
+        dtype=TEXTO,
+        keep_default_na=False,
+        encoding="utf-8-sig",
+    )
+
+
+def ler_parquet(f, colunas: List[str]) -> pd.DataFrame:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Leitura de .parquet requer o pacote pyarrow.")
+    presentes = [c for c in colunas if c in pq.read_schema(f).names]
+    if hasattr(f, "seek"):
+        f.seek(0)
+    df = pd.read_parquet(f, columns=presentes)
+    for c in presentes:
+        df[c] = [texto_celula(v) for v in df[c].tolist()]
+    return df
+
+
+def ler_planilha_entrada(uploaded_file, cfg: Optional[Config] = None) -> pd.DataFrame:
+    """
+    Lê .xlsx (streaming), .csv, .parquet ou .xls projetando só as colunas
+    de colunas_entrada(); todos os valores viram texto sem NaN.
+    `uploaded_file` pode ser o UploadedFile do Streamlit ou um caminho.
+    """
+    nome = str(getattr(uploaded_file, "name", uploaded_file)).lower()
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    colunas = colunas_entrada(cfg)
+
+    if nome.endswith(".csv"):
+        df = ler_csv(uploaded_file, colunas)
+    elif nome.endswith(".parquet"):
+        df = ler_parquet(uploaded_file, colunas)
+    elif nome.endswith(".xls"):
+        df = pd.read_excel(uploaded_file, usecols=lambda c: c in colunas, dtype=object)
+        for c in df.columns:
+            df[c] = [texto_celula(v) for v in df[c].tolist()]
+    else:
+        df = pd.DataFrame(ler_xlsx_streaming(uploaded_file, colunas))
+
+    if CFG.col_auto not in df.columns:
+        raise ValueError(f"Coluna obrigatória ausente: {CFG.col_auto}")
+    # Ordem estável: auto, extras, saída.
+    df = df.reindex(columns=[c for c in colunas if c in df.columns])
+    return ensure_output_columns(df)
+
+
+def carregar_df_or_checkpoint(
+    uploaded_file, job: JobState, atualizacao: bool = False, cfg: Optional[Config] = None
+) -> pd.DataFrame:
+    """
+    Lê a planilha e reaplica o checkpoint do job. Com `atualizacao` a entrada
+    é um resultado anterior: só as linhas de linhas_para_atualizar entram no
+    índice, e as que mudarem de andamento ficam marcadas em cfg.col_alterado
+    (o id do job deve vir de make_job_id(..., modo_atualizacao(cfg))). `cfg`
+    é a configuração do job (padrão: CFG).
+    """
+    cfg = cfg or CFG
+    df = ler_planilha_entrada(uploaded_file, cfg)
+
+    selecao = None
+    job.atualizacao = atualizacao
+    if atualizacao:
+        df[cfg.col_alterado] = pd.Series("", index=df.index, dtype=TEXTO)
+        selecao, motivos = linhas_para_atualizar(df, cfg=cfg)
+        job.log(
+            f"Atualização incremental: {motivos['finais']} auto(s) com andamento final e "
+            f"{motivos['recentes']} consultado(s) há menos de {cfg.atualizar_apos_h:g}h ficam como estão."
+        )
+
+    job.indice = carregar_ou_construir_indice(df, job.job_id, selecao, cfg.jobs_dir)
+    job.total = len(job.indice)
+
+    meta = load_checkpoint(df, job.job_id, cfg.jobs_dir)
+    restaurar_contadores(job, meta)
+    if meta is not None:
+        job.log(f"Checkpoint carregado. Retomando em {job.cursor}/{job.total}.")
+        return df
+
+    job.log(f"Planilha carregada. Total de autos: {job.total}.")
+    return df
+
+
+def restaurar_contadores(job: JobState, meta: Optional[Dict[str, Any]]) -> None:
+    """Cursor e contadores do job a partir do meta de load_checkpoint (None = do zero)."""
+    meta = meta or {}
+    job.cursor = int(meta.get("cursor", 0))
+    job.ok = int(meta.get("ok", 0))
+    job.fail = int(meta.get("fail", 0))
+    job.cache_hits = int(meta.get("cache_hits", 0))
+    job.adiados = set(meta.get("adiados", []))
+
+
+def abas_do_runtime(rt) -> int:
+    return max(1, rt.cfg.abas_por_driver) if isinstance(rt, SeleniumRuntime) else 1
+
+
+def worker_loop(
+    worker_id: int,
+    rt: SeleniumRuntime,
+    fila: "queue.Queue[Tuple[int, str]]",
+    resultados: "queue.Queue[Tuple[int, int, Dict[str, Any], float]]",
+    job: JobState,
+    params: JobParams,
+):
+    """
+    Cada worker tem o seu próprio Chromium/login e consome a fila compartilhada
+    até esvaziá-la (ou até o job ser parado), um auto por vez ou, com
+    params.config.abas_por_driver > 1, em lotes consultados em abas paralelas. Os
+    resultados voltam para a thread do job, que é a única que escreve no
+    DataFrame.
+    """
+    _LOG_CTX.sink = job.log
+    _LOG_CTX.eventos = job.eventos
+    vazao = job.vazao
+    disjuntor = job.disjuntor
+    while not job.stop_event.is_set():
+        # Worker desligado pelo controle de vazão ou disjuntor aberto: aguarda.
+        if not vazao.ativo(worker_id) or not disjuntor.permitir(worker_id):
+            if fila.empty():
+                return
+            job.stop_event.wait(0.5)
+            continue
+        # Com várias abas por driver o worker pega até K autos de uma vez
+        # (um só enquanto o disjuntor não está fechado: a sonda é um auto).
+        abas = abas_do_runtime(rt) if disjuntor.resumo()["estado"] == DISJUNTOR_FECHADO else 1
+        lote: List[Tuple[int, str]] = []
+        try:
+            while len(lote) < abas:
+                lote.append(fila.get_nowait())
+        except queue.Empty:
+            pass
+        if not lote:
+            return
+
+        servidos_antes = getattr(rt, "autos_servidos", 0)
+        sessao_antes = (rt.relogins, rt.reinicios, rt.excecoes)
+        preparo_antes = (rt.logins, rt.iniciado_em)
+        t0 = time.time()
+        try:
+            if len(lote) == 1:
+                ress = [processar_auto_com_cache(
+                    rt, lote[0][1], params.usuario, params.senha,
+                    headless=params.headless, debug=params.debug,
+                    cache=params.cache, forcar_atualizacao=params.forcar_atualizacao, max_retries=2
+                )]
+            else:
+                ress = processar_autos_com_cache(
+                    rt, [auto for _, auto in lote], params.usuario, params.senha,
+                    headless=params.headless, debug=params.debug,
+                    cache=params.cache, forcar_atualizacao=params.forcar_atualizacao, max_retries=2
+                )
+        except Exception as e:
+            ress = [
+                {"status": "erro", "dados": {}, "mensagem": f"Erro no worker {worker_id}: {e}",
+                 "falha": FALHA_TRANSITORIA}
+                for _ in lote
+            ]
+        # Num lote os autos correm juntos: cada um "custa" a fração do tempo total.
+        dur = (time.time() - t0) / len(lote)
+
+        # O Chromium caiu (processar_auto_com_recuperacao o parou): a reserva
+        # assume já, em vez de o próximo auto esperar uma subida e um login.
+        reserva = job.reserva
+        if (
+            reserva is not None and isinstance(rt, SeleniumRuntime) and rt.driver is None
+            and not job.stop_event.is_set()
+        ):
+            try:
+                if reserva.assumir_em(rt, worker_id, "driver caiu"):
+                    METRICAS.contar("driver_restart")
+                    rt.reinicios += 1  # segue como sinal para o ControleVazao
+            except Exception as e:
+                falha_ao_reciclar(rt, worker_id, e)
+
+        # Relogins/reinícios/exceções da chamada vão no primeiro resultado (para
+        # o ControleVazao e o diário de eventos): são deste job, não do processo.
+        sessao = (rt.relogins, rt.reinicios, rt.excecoes)
+        for nome, depois, antes in zip(("relogins", "reinicios", "excecoes"), sessao, sessao_antes):
+            if depois != antes:
+                ress[0][nome] = depois - antes
+        preparo_sessao = (rt.logins, rt.iniciado_em) != preparo_antes
+        for (pos, _), res in zip(lote, ress):
+            if res.get("falha") == FALHA_FATAL and not job.stop_event.is_set():
+                job.last_error = res["mensagem"]
+                ui_log(f"Falha fatal: {res['mensagem']}. Parando o job.", "error")
+                job.stop_event.set()
+            resultados.put((worker_id, pos, res, dur))
+            vazao.registrar(res, dur, preparo_sessao=preparo_sessao)
+            disjuntor.registrar(worker_id, res)
+        consultou = any(not res.get("cache") for res in ress)
+
+        if isinstance(rt, SeleniumRuntime) and consultou and rt.driver is not None:
+            cada = params.config.log_memoria_cada
+            if cada and rt.autos_servidos // cada != servidos_antes // cada:
+                rss_mb = rt.memoria_kb() / 1024.0
+                with job.lock:
+                    s = job.worker_stats.setdefault(worker_id, {"autos": 0, "segundos": 0.0})
+                    s["rss_mb"] = rss_mb
+                ui_log(
+                    f"W{worker_id}: {rt.autos_servidos} autos neste navegador, {rss_mb:.0f} MB "
+                    f"(renderers {rt.memoria_kb('renderer') / 1024.0:.0f} MB)."
+                )
+            motivo = motivo_reciclagem(rt)
+            if motivo and not job.stop_event.is_set():
+                try:
+                    if reserva is None or not reserva.assumir_em(rt, worker_id, f"reciclagem: {motivo}"):
+                        reciclar_runtime(rt, motivo, params.usuario, params.senha, params.headless, params.debug)
+                except Exception as e:
+                    falha_ao_reciclar(rt, worker_id, e)
+                with job.lock:
+                    s = job.worker_stats.setdefault(worker_id, {"autos": 0, "segundos": 0.0})
+                    s["reciclagens"] = s.get("reciclagens", 0) + 1
+                    s["rss_mb"] = rt.memoria_kb() / 1024.0
+
+        if vazao.atraso > 0 and consultou:
+            job.stop_event.wait(vazao.atraso)
+
+
+def executar_job(job: JobState, df: pd.DataFrame, params: JobParams) -> None:
+    _LOG_CTX.sink = job.log
+    try:
+        job.eventos = DiarioEventos(paths_for_job(job.job_id, params.config.jobs_dir)["eventos"])
+    except OSError as e:
+        logger.warning("Diário de eventos indisponível: %s", e)
+    _LOG_CTX.eventos = job.eventos
+    try:
+        rodar_job(job, df, params)
+    except Exception as e:
+        job.last_error = str(e)
+        job.log(f"Erro no processamento: {e}", "error")
+        if params.debug:
+            job.log(traceback.format_exc(), "error")
+    finally:
+        registrar_evento(
+            "fim", cursor=job.cursor, total=job.total, ok=job.ok, fail=job.fail,
+            cache_hits=job.cache_hits, adiados=len(job.adiados), erro=job.last_error, resumo=job.summary,
+        )
+        if job.eventos is not None:
+            job.eventos.close()
+        job.eventos = None
+        job.running = False
+        _LOG_CTX.sink = None
+        _LOG_CTX.eventos = None
+        try:
+            METRICAS.exportar(params.config.metricas_dir)
+        except OSError as e:
+            logger.warning("Falha ao exportar métricas: %s", e)
+
+
+def executar_passada(
+    job: JobState,
+    df: pd.DataFrame,
+    indice: IndiceTrabalho,
+    posicoes: List[int],
+    runtimes: List[Any],
+    params: JobParams,
+    journal: CheckpointJournal,
+    retentativa: bool = False,
+) -> None:
+    """
+    Consulta `posicoes` com um worker por runtime e aplica os resultados na
+    ordem de `posicoes`. Na passada principal as posições são o restante da
+    planilha e o cursor avança junto; nas rodadas adiadas (`retentativa`) são
+    as posições com falha transitória, que já contavam como falha.
+    """
+    fila: "queue.Queue[Tuple[int, str]]" = queue.Queue()
+    for pos in posicoes:
+        fila.put((pos, indice.auto(pos)))
+    resultados: "queue.Queue[Tuple[int, int, Dict[str, Any], float]]" = queue.Queue()
+
+    threads = []
+    for wid, rt in enumerate(runtimes[:max(1, min(len(runtimes), len(posicoes)))]):
+        t = threading.Thread(
+            target=worker_loop,
+            args=(wid, rt, fila, resultados, job, params),
+            name=f"antt-worker-{wid}",
+            daemon=True,
+        )
+        t.start()
+        threads.append(t)
+
+    total = job.total
+    pendentes: Dict[int, Dict[str, Any]] = {}
+    k = 0  # próxima posição (em `posicoes`) a aplicar
+    try:
+        # Os resultados chegam fora de ordem; só aplicamos o prefixo contíguo já
+        # concluído, de modo que DataFrame e diário fiquem iguais aos de uma
+        # execução sequencial.
+        while k < len(posicoes):
+            try:
+                wid, pos, res, dur = resultados.get(timeout=0.5)
+            except queue.Empty:
+                # Job parado: os workers saem depois do auto em andamento.
+                if not any(t.is_alive() for t in threads) and resultados.empty():
+                    break
+                continue
+            registrar_evento(
+                "auto", pos=pos, linha=indice.linha(pos), auto=indice.auto(pos), worker=wid,
+                adiada=retentativa, status=res.get("status", "erro"), falha=res.get("falha"),
+                mensagem=res.get("mensagem", ""), cache=bool(res.get("cache")),
+                duracao=res.get("duracao", round(dur, 3)), tempos=res.get("tempos", {}),
+                tentativas=res.get("tentativas", 1), relogins=res.get("relogins", 0),
+                reinicios=res.get("reinicios", 0),
+            )
+            if res.get("falha") == FALHA_FATAL:
+                continue  # não é resultado do auto: fica para a retomada
+            pendentes[pos] = res
+
+            with job.lock:
+                s = job.worker_stats.setdefault(wid, {"autos": 0, "segundos": 0.0})
+                s["autos"] += 1
+                s["segundos"] += dur
+
+            while k < len(posicoes) and posicoes[k] in pendentes:
+                if not job.pode_gravar():
+                    # Concessão do shard perdida: os resultados são descartados
+                    # (outro processo refaz os autos) e nada mais é gravado.
+                    job.stop_event.set()
+                    break
+                pos = posicoes[k]
+                k += 1
+                original_idx = indice.linha(pos)
+
+                res = pendentes.pop(pos)
+                auto = indice.auto(pos)
+                journal.append(registro_journal(pos, original_idx, auto, res))
+
+                if retentativa:
+                    job.fail -= 1
+                if aplicar_resultado(df, original_idx, res):
+                    job.ok += 1
+                else:
+                    job.fail += 1
+                if res.get("cache"):
+                    job.cache_hits += 1
+                if res.get("falha") in FALHAS_ADIAVEIS:
+                    job.adiados.add(pos)
+                else:
+                    job.adiados.discard(pos)
+
+                if not retentativa:
+                    job.cursor = pos + 1
+                feitos = job.cursor if not retentativa else k
+                alvo = total if not retentativa else len(posicoes)
+
+                if (feitos % 10 == 0) or (feitos == alvo):
+                    ui_log(
+                        f"{'Rodada adiada' if retentativa else 'Progresso'}: {feitos}/{alvo} "
+                        f"(OK: {job.ok}, Falhas: {job.fail})."
+                    )
+
+                if (feitos % params.checkpoint_every == 0) or (feitos == alvo):
+                    meta = {
+                        "cursor": job.cursor,
+                        "offset": journal.offset(),
+                        "total": total,
+                        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    }
+
+                    try:
+                        with METRICAS.medir("checkpoint"):
+                            journal.sync()
+                            save_checkpoint(meta, job.job_id, params.config.jobs_dir)
+                        ui_log(f"Checkpoint salvo em {job.cursor}/{total}.")
+                    except Exception as e:
+                        ui_log(f"Falha ao salvar checkpoint (seguindo execução): {e}", "warning")
+
+                    try:
+                        METRICAS.exportar(params.config.metricas_dir)
+                    except OSError as e:
+                        logger.warning("Falha ao exportar métricas: %s", e)
+    finally:
+        # Com o job parado os workers saem após o auto em andamento.
+        if k < len(posicoes):
+            job.stop_event.set()
+        for t in threads:
+            t.join()
+
+
+def rodar_job(job: JobState, df: pd.DataFrame, params: JobParams) -> None:
+    job_id = job.job_id
+
+    # Calculado em carregar_df_or_checkpoint; sem ele (df montado por fora),
+    # vem do disco ou é recalculado uma vez.
+    cfg = params.config
+    job.config = cfg
+    if job.indice is None:
+        job.indice = carregar_ou_construir_indice(df, job_id, jobs_dir=cfg.jobs_dir)
+    indice = job.indice
+    total = len(indice)
+    job.total = total
+
+    start_cursor = job.cursor
+    n_workers = max(1, min(params.n_workers, max(total - start_cursor, len(job.adiados))))
+    # A reserva é um runtime a mais da mesma concessão (conta no teto).
+    quer_reserva = cfg.reserva_quente and params.backend == BACKEND_SELENIUM
+    n_pedidos = n_workers + (1 if quer_reserva else 0)
+
+    journal = CheckpointJournal(job_id, fsync_every=params.checkpoint_every, jobs_dir=cfg.jobs_dir)
+    concessao: Optional[Concessao] = None
+    try:
+        if params.gerenciador is not None:
+            # None: job parado ainda na fila; nada roda e o resumo é de interrupção.
+            concessao = params.gerenciador.obter(
+                job_id, n_pedidos, params.backend, params.usuario, params.senha, cancelar=job.stop_event,
+                perfil=perfil_navegador(cfg),
+            )
+            runtimes = list(concessao.runtimes) if concessao is not None else []
+        else:
+            runtimes = list(params.runtimes[:n_pedidos])
+            while len(runtimes) < n_pedidos:
+                runtimes.append(novo_runtime(params.backend))
+        for rt in runtimes:
+            rt.cfg = cfg
+        if quer_reserva:
+            if len(runtimes) == n_pedidos:
+                job.reserva = ReservaQuente(
+                    runtimes.pop(), params.usuario, params.senha, params.headless, params.debug,
+                    sonda_s=cfg.reserva_sonda_s,
+                )
+                job.reserva.iniciar()
+            elif runtimes:
+                ui_log("Sem runtime livre para o navegador reserva: job segue sem ele.", "warning")
+        n_workers = max(1, len(runtimes))
+        registrar_evento(
+            "inicio", job_id=job_id, total=total, cursor=start_cursor, adiados=len(job.adiados),
+            workers=len(runtimes), backend=params.backend, abas=cfg.abas_por_driver,
+            atualizacao=job.atualizacao, reserva=job.reserva is not None,
+        )
+        job.vazao = ControleVazao(n_workers, adaptativo=params.vazao_adaptativa, atraso_fixo=params.throttle)
+        job.disjuntor = DisjuntorFalhas()
+
+        if start_cursor < total and runtimes:
+            ui_log(f"Iniciando: {start_cursor+1} até {total} ({n_workers} worker(s)).")
+            executar_passada(job, df, indice, list(range(start_cursor, total)), runtimes, params, journal)
+
+        # Rodadas adiadas: só depois da planilha inteira, com espera crescente
+        # para o site se recuperar.
+        for rodada in range(1, cfg.retentativas_adiadas + 1):
+            if job.stop_event.is_set() or job.cursor < total or not job.adiados or not runtimes:
+                break
+            espera = cfg.backoff_adiados_s * 2 ** (rodada - 1)
+            ui_log(
+                f"{len(job.adiados)} auto(s) com falha transitória. "
+                f"Rodada adiada {rodada}/{cfg.retentativas_adiadas} em {espera:.0f}s..."
+            )
+            if job.stop_event.wait(espera):
+                break
+            registrar_evento("rodada_adiada", rodada=rodada, autos=len(job.adiados), espera_s=espera)
+            executar_passada(
+                job, df, indice, sorted(job.adiados), runtimes, params, journal, retentativa=True
+            )
+    finally:
+        if job.reserva is not None:
+            job.reserva.encerrar()
+            job.reserva = None
+        if concessao is not None:
+            concessao.devolver()
+        journal.close()
+        if job.pode_gravar():
+            save_checkpoint(
+                {
+                    "cursor": job.cursor,
+                    "offset": journal_offset(job_id, cfg.jobs_dir),
+                    "total": total,
+                    "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                },
+                job_id,
+                cfg.jobs_dir,
+            )
+
+    if job.cursor >= total:
+        if params.gerar_xlsx:
+            ui_log("Processamento finalizado. Gerando arquivo final...")
+            try:
+                with METRICAS.medir("xlsx"):
+                    final_path = save_result_xlsx(
+                        df, job_id, offset=journal_offset(job_id, cfg.jobs_dir), jobs_dir=cfg.jobs_dir
+                    )
+                job.result_xlsx_path = final_path
+                job.result_xlsx_name = f"ANTT_Resultado_{time.strftime('%Y%m%d_%H%M%S')}.xlsx"
+                ui_log("Arquivo final pronto para download.")
+            except Exception as e:
+                ui_log(f"Falha ao gerar XLSX final: {e}", "error")
+
+        job.summary = (
+            f"Concluído. OK: {job.ok} | Falhas/Não encontrados: {job.fail}"
+            f" | Cache: {job.cache_hits}"
+        )
+        if job.adiados:
+            job.summary += f" | {len(job.adiados)} com falha transitória persistente"
+        if job.atualizacao:
+            alterados = int((df[params.config.col_alterado] == "Sim").sum())
+            job.summary += f" | Reconsultados: {total} | Alterados: {alterados}"
+    else:
+        ui_log(f"Execução interrompida em {job.cursor}/{total}.", "warning")
+        job.summary = (
+            f"Interrompido em {job.cursor}/{total}. OK: {job.ok} | Falhas: {job.fail}"
+            f" | Cache: {job.cache_hits}"
+        )
+
+
+# =============================================================================
+# EXECUÇÃO EM SHARDS (VÁRIOS PROCESSOS / CONTÊINERES)
+# =============================================================================
+# Para a planilha grande do mês: preparar_shards copia a entrada para um
+# diretório compartilhado (<shards_dir>/<job_id>), grava o índice do job e
+# divide as posições em shards numa tabela SQLite. Cada processo
+# (processar_shards) pega um shard por concessão com prazo, renova-a enquanto
+# trabalha e grava diário/meta do shard no mesmo diretório; se o processo
+# morre, a concessão vence e outro retoma o shard do checkpoint dele. Os
+# registros do diário guardam a linha original da planilha, então
+# juntar_shards só reaplica os diários de todos os shards sobre a entrada.
+SHARD_PENDENTE = "pendente"
+SHARD_EM_ANDAMENTO = "em_andamento"
+SHARD_CONCLUIDO = "concluido"
+
+
+def dir_shards(job_id: str, base: Optional[str] = None) -> str:
+    """Diretório compartilhado do job: o jobs_dir dos shards (ver processar_shards)."""
+    return os.path.join(base or CFG.shards_dir, job_id)
+
+
+def shard_job_id(job_id: str, shard: int) -> str:
+    return f"{job_id}_s{shard:05d}"
+
+
+class TabelaShards:
+    """
+    Concessões dos shards de um job (SQLite no diretório compartilhado). Sem
+    WAL, cujo índice em memória compartilhada não vale entre contêineres: o
+    journal padrão só depende de locks de arquivo, e toda escrita é uma
+    transação BEGIN IMMEDIATE.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()  # usada pela thread do job e pela de renovação
+        self.con = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=DELETE")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " id INTEGER PRIMARY KEY, inicio INTEGER NOT NULL, fim INTEGER NOT NULL,"
+            " estado TEXT NOT NULL, dono TEXT, expira REAL,"
+            " tentativas INTEGER NOT NULL DEFAULT 0, atualizado REAL)"
+        )
+
+    @contextmanager
+    def _transacao(self):
+        with self.lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.con
+            except BaseException:
+                self.con.execute("ROLLBACK")
+                raise
+            self.con.execute("COMMIT")
+
+    def criar(self, total: int, tamanho: int) -> int:
+        """Divide as posições [0, total) em shards de `tamanho`; numa tabela já criada, não mexe."""
+        tamanho = max(1, int(tamanho))
+        with self._transacao() as con:
+            if con.execute("SELECT COUNT(*) FROM shards").fetchone()[0] == 0:
+                con.executemany(
+                    "INSERT INTO shards (id, inicio, fim, estado) VALUES (?, ?, ?, ?)",
+                    [
+                        (i, inicio, min(total, inicio + tamanho), SHARD_PENDENTE)
+                        for i, inicio in enumerate(range(0, total, tamanho))
+                    ],
+                )
+            return con.execute("SELECT COUNT(*) FROM shards").fetchone()[0]
+
+    def reivindicar(self, dono: str, concessao_s: float) -> Optional[Dict[str, Any]]:
+        """Primeiro shard pendente ou com a concessão vencida, agora de `dono`."""
+        agora = time.time()
+        with self._transacao() as con:
+            row = con.execute(
+                "SELECT id, inicio, fim, estado, dono, tentativas FROM shards"
+                " WHERE estado = ? OR (estado = ? AND expira < ?) ORDER BY id LIMIT 1",
+                (SHARD_PENDENTE, SHARD_EM_ANDAMENTO, agora),
+            ).fetchone()
+            if row is None:
+                return None
+            con.execute(
+                "UPDATE shards SET estado = ?, dono = ?, expira = ?, tentativas = tentativas + 1,"
+                " atualizado = ? WHERE id = ?",
+                (SHARD_EM_ANDAMENTO, dono, agora + concessao_s, agora, row[0]),
+            )
+        return {
+            "id": row[0],
+            "inicio": row[1],
+            "fim": row[2],
+            "tentativas": row[5] + 1,
+            "vencido_de": row[4] if row[3] == SHARD_EM_ANDAMENTO else None,
+        }
+
+    def _atualizar_do_dono(self, shard_id: int, dono: str, estado: str, expira: Optional[float]) -> bool:
+        # Só quem ainda detém a concessão muda o shard (outro pode tê-lo retomado).
+        with self._transacao() as con:
+            cur = con.execute(
+                "UPDATE shards SET estado = ?, dono = ?, expira = ?, atualizado = ?"
+                " WHERE id = ? AND dono = ? AND estado = ?",
+                (estado, dono if estado != SHARD_PENDENTE else None, expira, time.time(),
+                 shard_id, dono, SHARD_EM_ANDAMENTO),
+            )
+            return cur.rowcount == 1
+
+    def renovar(self, shard_id: int, dono: str, concessao_s: float) -> bool:
+        return self._atualizar_do_dono(shard_id, dono, SHARD_EM_ANDAMENTO, time.time() + concessao_s)
+
+    def concluir(self, shard_id: int, dono: str) -> bool:
+        return self._atualizar_do_dono(shard_id, dono, SHARD_CONCLUIDO, None)
+
+    def liberar(self, shard_id: int, dono: str) -> bool:
+        return self._atualizar_do_dono(shard_id, dono, SHARD_PENDENTE, None)
+
+    def listar(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = self.con.execute(
+                "SELECT id, inicio, fim, estado, dono, expira, tentativas FROM shards ORDER BY id"
+            ).fetchall()
+        campos = ("id", "inicio", "fim", "estado", "dono", "expira", "tentativas")
+        return [dict(zip(campos, row)) for row in rows]
+
+    def contagem(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.con.execute("SELECT estado, COUNT(*) FROM shards GROUP BY estado").fetchall()
+        return {estado: n for estado, n in rows}
+
+    def close(self) -> None:
+        with self.lock:
+            self.con.close()
+
+
+def path_info_shards(diretorio: str) -> str:
+    return os.path.join(diretorio, "job.json")
+
+
+def config_shards(info: Dict[str, Any], cfg: Config) -> Config:
+    """`cfg` com as colunas extras gravadas em preparar_shards (a mesma leitura em todo processo)."""
+    return replace(cfg, colunas_extra=tuple(info.get("colunas_extra", cfg.colunas_extra)))
+
+
+def ler_info_shards(diretorio: str) -> Dict[str, Any]:
+    path = path_info_shards(diretorio)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Job em shards não preparado em {diretorio} (rode preparar_shards).")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def preparar_shards(
+    entrada: str, base: Optional[str] = None, tamanho: Optional[int] = None, cfg: Optional[Config] = None
+) -> str:
+    """
+    Copia a entrada para o diretório compartilhado, grava o índice e cria os
+    shards. Idempotente: o mesmo arquivo dá o mesmo job (make_job_id) e um
+    job já preparado é só reaberto. As colunas extras de `cfg` (padrão: CFG)
+    ficam gravadas no job e valem para os workers e para juntar_shards.
+    Devolve o job_id.
+    """
+    cfg = cfg or CFG
+    with open(entrada, "rb") as f:
+        job_id = make_job_id(f.read())
+    diretorio = dir_shards(job_id, base)
+    os.makedirs(diretorio, exist_ok=True)
+    if os.path.exists(path_info_shards(diretorio)):
+        return job_id
+
+    nome = "entrada" + os.path.splitext(entrada)[1].lower()
+    shutil.copyfile(entrada, os.path.join(diretorio, nome + ".tmp"))
+    os.replace(os.path.join(diretorio, nome + ".tmp"), os.path.join(diretorio, nome))
+
+    df = ler_planilha_entrada(os.path.join(diretorio, nome), cfg)
+    indice = carregar_ou_construir_indice(df, job_id, jobs_dir=diretorio)
+    tamanho = max(1, int(tamanho or cfg.autos_por_shard))
+    tabela = TabelaShards(os.path.join(diretorio, "shards.db"))
+    try:
+        n_shards = tabela.criar(len(indice), tamanho)
+    finally:
+        tabela.close()
+
+    info = {
+        "job_id": job_id,
+        "entrada": nome,
+        "origem": os.path.basename(entrada),
+        "total": len(indice),
+        "autos_por_shard": tamanho,
+        "shards": n_shards,
+        "colunas_extra": list(cfg.colunas_extra),
+        "criado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    tmp = path_info_shards(diretorio) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False)
+    os.replace(tmp, path_info_shards(diretorio))
+    logger.info("Job %s: %d autos em %d shard(s) de até %d.", job_id, len(indice), n_shards, tamanho)
+    return job_id
+
+
+def processar_shard(
+    tabela: TabelaShards,
+    shard: Dict[str, Any],
+    df: pd.DataFrame,
+    indice: IndiceTrabalho,
+    job_id: str,
+    params: JobParams,
+    dono: str,
+    parar: threading.Event,
+    concessao_s: float,
+    eco: Optional[Callable[[str, str, str], None]] = None,
+) -> JobState:
+    """
+    Roda um shard como um job próprio (diário e meta em shard_job_id), com uma
+    thread renovando a concessão. Nada é gravado depois que uma renovação é
+    recusada (outro processo retomou o shard) ou depois do prazo da última
+    renovação bem-sucedida: os autos em andamento são descartados. Ao fim o
+    shard é concluído ou devolvido como pendente.
+    """
+    job = JobState(shard_job_id(job_id, shard["id"]), eco=eco)
+    job.indice = indice.fatia(shard["inicio"], shard["fim"])
+    job.total = len(job.indice)
+    restaurar_contadores(job, load_checkpoint(df, job.job_id, params.config.jobs_dir))
+    origem = f", retomado de {shard['vencido_de']}" if shard["vencido_de"] else ""
+    job.log(
+        f"Shard {shard['id']}: posições {shard['inicio']}..{shard['fim'] - 1}, "
+        f"tentativa {shard['tentativas']}{origem}, em {job.cursor}/{job.total}."
+    )
+
+    perdida = threading.Event()
+    fim = threading.Event()
+    # Prazo para gravar: o da concessão, contado do início da última renovação
+    # bem-sucedida, com folga para relógios um pouco diferentes entre máquinas.
+    folga = concessao_s / 6
+    valida_ate = [time.time() + concessao_s - folga]
+    job.pode_gravar = lambda: not perdida.is_set() and time.time() < valida_ate[0]
+
+    def renovar() -> None:
+        proxima = time.time() + concessao_s / 3
+        while not fim.wait(1.0):
+            if parar.is_set():
+                job.stop_event.set()
+            if time.time() < proxima:
+                continue
+            inicio = proxima = time.time()
+            proxima += concessao_s / 3
+            try:
+                ok = tabela.renovar(shard["id"], dono, concessao_s)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao renovar a concessão do shard %s: %s", shard["id"], e)
+                continue  # tenta de novo antes de a concessão vencer
+            if not ok:
+                perdida.set()
+                job.stop_event.set()
+                job.log(f"Concessão do shard {shard['id']} perdida. Parando sem gravar mais nada...", "warning")
+                return
+            valida_ate[0] = inicio + concessao_s - folga
+
+    renovador = threading.Thread(target=renovar, name=f"antt-shard-{shard['id']}", daemon=True)
+    renovador.start()
+    job.running = True
+    try:
+        executar_job(job, df, params)
+    finally:
+        fim.set()
+        renovador.join()
+
+    if not job.pode_gravar():
+        return job
+    if job.cursor >= job.total and not job.last_error:
+        tabela.concluir(shard["id"], dono)
+    else:
+        tabela.liberar(shard["id"], dono)
+    return job
+
+
+def processar_shards(
+    job_id: str,
+    params: JobParams,
+    base: Optional[str] = None,
+    dono: Optional[str] = None,
+    parar: Optional[threading.Event] = None,
+    eco: Optional[Callable[[str, str, str], None]] = None,
+    esperar: bool = True,
+    concessao_s: Optional[float] = None,
+) -> Dict[str, int]:
+    """
+    Laço de um processo: pega shards até não sobrar nenhum livre. Com
+    `esperar`, segue sondando enquanto houver shards de outros processos em
+    andamento, para retomar os de concessão vencida (processo morto).
+    Uma falha fatal (credenciais) para o laço. Devolve a contagem por estado.
+    Os arquivos dos shards vão para o diretório do job (config.jobs_dir).
+    """
+    diretorio = dir_shards(job_id, base)
+    info = ler_info_shards(diretorio)
+    dono = dono or f"{socket.gethostname()}:{os.getpid()}"
+    parar = parar or threading.Event()
+    concessao_s = concessao_s or params.config.concessao_shard_s
+    params = replace(params, gerar_xlsx=False, config=replace(config_shards(info, params.config), jobs_dir=diretorio))
+
+    df = ler_planilha_entrada(os.path.join(diretorio, info["entrada"]), params.config)
+    indice = carregar_ou_construir_indice(df, job_id, jobs_dir=diretorio)
+    tabela = TabelaShards(os.path.join(diretorio, "shards.db"))
+    processados = 0
+    try:
+        while not parar.is_set():
+            shard = tabela.reivindicar(dono, concessao_s)
+            if shard is None:
+                if not esperar or not tabela.contagem().get(SHARD_EM_ANDAMENTO):
+                    break
+                parar.wait(min(30.0, concessao_s / 2))
+                continue
+            job = processar_shard(tabela, shard, df, indice, job_id, params, dono, parar, concessao_s, eco)
+            processados += 1
+            if job.last_error:
+                logger.error("Shard %s falhou: %s. Encerrando este processo.", shard["id"], job.last_error)
+                break
+        contagem = tabela.contagem()
+    finally:
+        tabela.close()
+    contagem["processados"] = processados
+    return contagem
+
+
+def juntar_shards(
+    job_id: str, base: Optional[str] = None, parcial: bool = False, cfg: Optional[Config] = None
+) -> str:
+    """
+    Reaplica os diários de todos os shards sobre a entrada original e gera o
+    XLSX do job, na ordem de linhas da planilha. Sem `parcial`, exige todos
+    os shards concluídos.
+    """
+    diretorio = dir_shards(job_id, base)
+    info = ler_info_shards(diretorio)
+    tabela = TabelaShards(os.path.join(diretorio, "shards.db"))
+    try:
+        shards = tabela.listar()
+    finally:
+        tabela.close()
+    faltando = [s["id"] for s in shards if s["estado"] != SHARD_CONCLUIDO]
+    if faltando and not parcial:
+        raise RuntimeError(f"{len(faltando)} de {len(shards)} shard(s) ainda não concluído(s): {faltando[:10]}")
+
+    df = ler_planilha_entrada(os.path.join(diretorio, info["entrada"]), config_shards(info, cfg or CFG))
+    for s in shards:
+        load_checkpoint(df, shard_job_id(job_id, s["id"]), diretorio)
+    with METRICAS.medir("xlsx"):
+        return save_result_xlsx(df, job_id, jobs_dir=diretorio)
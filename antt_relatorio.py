@@ -0,0 +1,237 @@
+"""
+Relatório offline de um job a partir do diário de eventos
+(/tmp/antt_<job>_eventos.jsonl): vazão ao longo do tempo, percentis de
+latência (total e por etapa), autos mais lentos, falhas agrupadas por mensagem
+e degradação por hora do dia. Serve para planejar capacidade e notar lentidão
+do site da ANTT depois que o job terminou.
+
+Exemplo:
+    python antt_relatorio.py <job_id ou caminho do .jsonl> --intervalo-min 10
+"""
+import os
+import re
+import sys
+import json
+import argparse
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List
+
+from antt_core import DISJUNTOR_FECHADO, paths_for_job, percentil
+
+RE_SUFIXO_ETAPA = re.compile(r"_\d+$")
+RE_DIGITOS = re.compile(r"\d+")
+
+
+def ler_eventos(path: str) -> List[Dict[str, Any]]:
+    """Lê o diário ignorando linhas truncadas (queda no meio de uma escrita)."""
+    eventos = []
+    with open(path, "r", encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                ev = json.loads(linha)
+            except ValueError:
+                continue
+            if isinstance(ev, dict) and "ts" in ev:
+                eventos.append(ev)
+    return eventos
+
+
+def _ts(ev: Dict[str, Any]) -> datetime:
+    return datetime.fromtimestamp(float(ev["ts"]))
+
+
+def _quando(ev: Dict[str, Any]) -> str:
+    return _ts(ev).isoformat(sep=" ", timespec="seconds")
+
+
+def _percentis(valores: List[float]) -> Dict[str, float]:
+    ordenados = sorted(valores)
+    return {
+        "n": len(ordenados),
+        "p50": percentil(ordenados, 50),
+        "p90": percentil(ordenados, 90),
+        "p95": percentil(ordenados, 95),
+        "p99": percentil(ordenados, 99),
+        "max": round(ordenados[-1], 3) if ordenados else 0.0,
+    }
+
+
+def _chave_falha(ev: Dict[str, Any]) -> str:
+    """Agrupa mensagens que só diferem em números (autos, segundos, códigos HTTP...)."""
+    msg = RE_DIGITOS.sub("#", str(ev.get("mensagem") or "")).strip()
+    return f"[{ev.get('falha') or ev.get('status')}] {msg[:120]}"
+
+
+def resumir(eventos: List[Dict[str, Any]], intervalo_min: int = 5, top: int = 10) -> Dict[str, Any]:
+    autos = [ev for ev in eventos if ev.get("tipo") == "auto"]
+    consultas = [ev for ev in autos if not ev.get("cache")]
+    resumo: Dict[str, Any] = {
+        "eventos": len(eventos),
+        "execucoes": sum(1 for ev in eventos if ev.get("tipo") == "inicio"),
+        "autos": len(autos),
+        "consultas": len(consultas),
+        "cache": len(autos) - len(consultas),
+    }
+    if eventos:
+        resumo["inicio"] = _quando(eventos[0])
+        resumo["fim"] = _quando(eventos[-1])
+
+    resumo["resultados"] = dict(Counter(ev.get("falha") or ev.get("status") for ev in autos).most_common())
+
+    # Latência: só consultas de fato (o cache não diz nada sobre o site).
+    resumo["latencia"] = _percentis([float(ev.get("duracao") or 0.0) for ev in consultas])
+    por_etapa: Dict[str, List[float]] = defaultdict(list)
+    for ev in consultas:
+        for chave, valor in (ev.get("tempos") or {}).items():
+            por_etapa[RE_SUFIXO_ETAPA.sub("", chave)].append(float(valor))
+    resumo["etapas"] = {etapa: _percentis(v) for etapa, v in sorted(por_etapa.items())}
+
+    # Vazão por janela de `intervalo_min` minutos.
+    janelas: Dict[datetime, List[Dict[str, Any]]] = defaultdict(list)
+    for ev in autos:
+        t = _ts(ev)
+        minuto = t.minute - t.minute % max(1, intervalo_min)
+        janelas[t.replace(minute=minuto, second=0, microsecond=0)].append(ev)
+    resumo["vazao"] = [
+        {
+            "janela": inicio.isoformat(sep=" ", timespec="minutes"),
+            "autos": len(evs),
+            "por_min": round(len(evs) / max(1, intervalo_min), 2),
+            "falhas": sum(1 for ev in evs if ev.get("status") == "erro"),
+            "p50": percentil(sorted(float(ev.get("duracao") or 0.0) for ev in evs if not ev.get("cache")), 50),
+        }
+        for inicio, evs in sorted(janelas.items())
+    ]
+
+    resumo["mais_lentos"] = [
+        {**{k: ev.get(k) for k in ("auto", "linha", "duracao", "status", "tentativas")}, "ts": _quando(ev)}
+        for ev in sorted(consultas, key=lambda e: float(e.get("duracao") or 0.0), reverse=True)[:top]
+    ]
+
+    grupos: Dict[str, Dict[str, Any]] = {}
+    for ev in autos:
+        if ev.get("status") != "erro":
+            continue
+        g = grupos.setdefault(_chave_falha(ev), {"n": 0, "primeira": _quando(ev)})
+        g["n"] += 1
+        g["ultima"] = _quando(ev)
+    resumo["falhas"] = [
+        {"mensagem": msg, **g}
+        for msg, g in sorted(grupos.items(), key=lambda item: item[1]["n"], reverse=True)[:top]
+    ]
+
+    # Degradação por hora do dia: juntando todas as execuções do diário.
+    por_hora: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for ev in consultas:
+        por_hora[_ts(ev).hour].append(ev)
+    resumo["por_hora"] = []
+    for hora, evs in sorted(por_hora.items()):
+        duracoes = sorted(float(ev.get("duracao") or 0.0) for ev in evs)
+        resumo["por_hora"].append({
+            "hora": hora,
+            "n": len(evs),
+            "p50": percentil(duracoes, 50),
+            "p95": percentil(duracoes, 95),
+            "taxa_falha": round(sum(1 for ev in evs if ev.get("status") == "erro") / len(evs), 3),
+        })
+
+    resumo["sessao"] = {
+        "tentativas_extras": sum(max(0, int(ev.get("tentativas") or 1) - 1) for ev in autos),
+        "relogins": sum(int(ev.get("relogins") or 0) for ev in autos),
+        "reinicios": sum(int(ev.get("reinicios") or 0) for ev in autos),
+        "reciclagens": sum(1 for ev in eventos if ev.get("tipo") == "reciclagem"),
+        "trocas_reserva": sum(1 for ev in eventos if ev.get("tipo") == "reserva"),
+        "disjuntor_aberto": sum(
+            1 for ev in eventos if ev.get("tipo") == "disjuntor" and ev.get("estado") != DISJUNTOR_FECHADO
+        ),
+        "rodadas_adiadas": sum(1 for ev in eventos if ev.get("tipo") == "rodada_adiada"),
+    }
+    avisos = Counter(
+        RE_DIGITOS.sub("#", str(ev.get("msg") or ""))[:120]
+        for ev in eventos if ev.get("tipo") == "log"
+    )
+    resumo["avisos"] = [{"mensagem": m, "n": n} for m, n in avisos.most_common(top)]
+    return resumo
+
+
+def formatar(resumo: Dict[str, Any]) -> str:
+    linhas = [
+        f"Período: {resumo.get('inicio', '-')} até {resumo.get('fim', '-')} "
+        f"({resumo['execucoes']} execução(ões), {resumo['eventos']} eventos)",
+        f"Autos: {resumo['autos']} ({resumo['consultas']} consultados, {resumo['cache']} do cache)",
+        "Resultados: " + (", ".join(f"{k}={v}" for k, v in resumo["resultados"].items()) or "-"),
+        "",
+        "Latência (s)       n      p50      p90      p95      p99      max",
+    ]
+
+    def linha_pct(nome: str, p: Dict[str, float]) -> str:
+        return (f"{nome[:16]:16} {p['n']:>5} {p['p50']:>8.2f} {p['p90']:>8.2f} "
+                f"{p['p95']:>8.2f} {p['p99']:>8.2f} {p['max']:>8.2f}")
+
+    linhas.append(linha_pct("total", resumo["latencia"]))
+    for etapa, p in resumo["etapas"].items():
+        linhas.append(linha_pct(f"  {etapa}", p))
+
+    linhas += ["", "Vazão               autos   /min  falhas   p50(s)"]
+    for v in resumo["vazao"]:
+        linhas.append(f"{v['janela']:18} {v['autos']:>6} {v['por_min']:>6.1f} {v['falhas']:>7} {v['p50']:>8.2f}")
+
+    linhas += ["", "Por hora do dia     n   p50(s)   p95(s)  falhas"]
+    for h in resumo["por_hora"]:
+        linhas.append(f"{h['hora']:02d}h {h['n']:>14} {h['p50']:>8.2f} {h['p95']:>8.2f} {h['taxa_falha']:>7.1%}")
+
+    linhas += ["", "Mais lentos"]
+    for ev in resumo["mais_lentos"]:
+        linhas.append(f"  {ev['duracao']:>7.2f}s  {ev['auto']}  (linha {ev['linha']}, {ev['status']}, "
+                      f"{ev['tentativas']} tentativa(s), {ev['ts']})")
+
+    linhas += ["", "Falhas por mensagem"]
+    for g in resumo["falhas"]:
+        linhas.append(f"  {g['n']:>5}x {g['mensagem']}  [{g['primeira']} .. {g['ultima']}]")
+    if not resumo["falhas"]:
+        linhas.append("  (nenhuma)")
+
+    s = resumo["sessao"]
+    linhas += [
+        "",
+        f"Sessão: {s['tentativas_extras']} tentativa(s) extra, {s['relogins']} relogin(s), "
+        f"{s['reinicios']} reinício(s), {s['reciclagens']} reciclagem(ns), "
+        f"{s['trocas_reserva']} troca(s) pela reserva, "
+        f"disjuntor aberto {s['disjuntor_aberto']}x, {s['rodadas_adiadas']} rodada(s) adiada(s)",
+    ]
+    if resumo["avisos"]:
+        linhas.append("Avisos mais frequentes")
+        for a in resumo["avisos"]:
+            linhas.append(f"  {a['n']:>5}x {a['mensagem']}")
+    return "\n".join(linhas)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Relatório de um job a partir do diário de eventos.")
+    p.add_argument("diario", help="Caminho do *_eventos.jsonl ou o job_id.")
+    p.add_argument("--intervalo-min", type=int, default=5, help="Janela (min) da tabela de vazão.")
+    p.add_argument("--top", type=int, default=10, help="Quantos autos lentos / grupos de falha listar.")
+    p.add_argument("--json", action="store_true", help="Emite o resumo em JSON.")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    path = args.diario if os.path.exists(args.diario) else paths_for_job(args.diario)["eventos"]
+    if not os.path.exists(path):
+        print(f"Diário de eventos não encontrado: {path}", file=sys.stderr)
+        return 1
+    resumo = resumir(ler_eventos(path), intervalo_min=args.intervalo_min, top=args.top)
+    if args.json:
+        print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    else:
+        print(formatar(resumo))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Execução de um job em shards, por vários processos (ou contêineres) que
+compartilham um diretório: cada processo pega shards por concessão, consulta
+com os seus próprios runtimes e grava o checkpoint de cada shard; no fim os
+shards são juntados num único XLSX, na ordem da planilha.
+
+Exemplo:
+    python antt_shards.py preparar entrada.xlsx --dir /dados/antt --autos-por-shard 500
+    ANTT_USUARIO=... ANTT_SENHA=... python antt_shards.py worker <job_id> --dir /dados/antt   (em cada contêiner)
+    python antt_shards.py juntar <job_id> --dir /dados/antt -o resultado.xlsx
+"""
+import os
+import sys
+import shutil
+import signal
+import logging
+import argparse
+import threading
+import time
+
+from antt_cli import ler_credenciais
+from antt_core import (
+    BACKEND_HTTP,
+    BACKEND_SELENIUM,
+    CFG,
+    JobParams,
+    ResultCache,
+    TabelaShards,
+    dir_shards,
+    juntar_shards,
+    ler_info_shards,
+    novo_runtime,
+    preparar_shards,
+    processar_shards,
+)
+
+logger = logging.getLogger("ANTT_BOT")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument("--dir", default=CFG.shards_dir, help="Diretório compartilhado pelos processos.")
+    comum.add_argument("--debug", action="store_true")
+
+    p = argparse.ArgumentParser(description="Robô ANTT - um job dividido em shards entre vários processos.")
+    sub = p.add_subparsers(dest="comando", required=True)
+
+    pp = sub.add_parser("preparar", parents=[comum], help="Copia a entrada para --dir e cria os shards; imprime o job_id.")
+    pp.add_argument("entrada", help="Planilha .xlsx/.csv/.parquet com a coluna 'Auto de Infração'.")
+    pp.add_argument("--autos-por-shard", type=int, default=CFG.autos_por_shard)
+
+    pw = sub.add_parser("worker", parents=[comum], help="Processa shards livres (ou de concessão vencida) até acabarem.")
+    pw.add_argument("job_id")
+    pw.add_argument("--credenciais", help="Arquivo com usuário e senha (JSON ou duas linhas).")
+    pw.add_argument("--backend", choices=[BACKEND_SELENIUM, BACKEND_HTTP], default=BACKEND_SELENIUM)
+    pw.add_argument("--workers", type=int, default=1, help="Sessões paralelas neste processo.")
+    pw.add_argument("--abas", type=int, default=CFG.abas_por_driver, help="Abas de consulta por Chromium.")
+    pw.add_argument("--perfil-enxuto", action="store_true", help="Chromium sem imagens/CSS/fontes e carga eager.")
+    pw.add_argument("--sem-headless", action="store_true", help="Mostra o navegador.")
+    pw.add_argument("--sem-cache", action="store_true", help="Não usa o cache de resultados entre jobs.")
+    pw.add_argument("--checkpoint-every", type=int, default=10, help="fsync do diário a cada N autos.")
+    pw.add_argument("--concessao-s", type=float, default=CFG.concessao_shard_s,
+                    help="Prazo da concessão de um shard; renovado a cada 1/3 dele.")
+    pw.add_argument("--sem-esperar", action="store_true",
+                    help="Sai quando não houver shard livre, sem esperar concessões de outros vencerem.")
+
+    pj = sub.add_parser("juntar", parents=[comum], help="Gera o XLSX final a partir dos shards, na ordem da planilha.")
+    pj.add_argument("job_id")
+    pj.add_argument("-o", "--saida", help="Caminho do XLSX (padrão: resultado_<job_id>.xlsx).")
+    pj.add_argument("--parcial", action="store_true", help="Junta mesmo com shards não concluídos.")
+
+    ps = sub.add_parser("status", parents=[comum], help="Situação de cada shard.")
+    ps.add_argument("job_id")
+    return p.parse_args(argv)
+
+
+def cmd_preparar(args: argparse.Namespace) -> int:
+    job_id = preparar_shards(args.entrada, base=args.dir, tamanho=args.autos_por_shard)
+    info = ler_info_shards(dir_shards(job_id, args.dir))
+    print(f"{job_id}: {info['total']} autos em {info['shards']} shard(s) de até {info['autos_por_shard']}.",
+          file=sys.stderr, flush=True)
+    print(job_id, flush=True)
+    return 0
+
+
+def cmd_worker(args: argparse.Namespace) -> int:
+    usuario, senha = ler_credenciais(args)
+    CFG.abas_por_driver = max(1, args.abas)
+    CFG.perfil_enxuto = args.perfil_enxuto
+
+    runtimes = [novo_runtime(args.backend) for _ in range(max(1, args.workers))]
+    params = JobParams(
+        usuario=usuario,
+        senha=senha,
+        headless=not args.sem_headless,
+        debug=args.debug,
+        checkpoint_every=args.checkpoint_every,
+        n_workers=args.workers,
+        backend=args.backend,
+        cache=None if args.sem_cache else ResultCache(
+            CFG.cache_dir, CFG.cache_ttl_sucesso_h, CFG.cache_ttl_nao_encontrado_h, CFG.cache_max_mb
+        ),
+        runtimes=runtimes,
+    )
+
+    # Ctrl+C / SIGTERM: o shard atual para depois do auto em andamento e volta
+    # a ficar pendente (com o checkpoint) para outro processo.
+    parar = threading.Event()
+
+    def ao_sinal(signum, frame):
+        logger.warning("Sinal recebido. Devolvendo o shard após o auto em andamento...")
+        parar.set()
+
+    signal.signal(signal.SIGINT, ao_sinal)
+    signal.signal(signal.SIGTERM, ao_sinal)
+
+    try:
+        contagem = processar_shards(
+            args.job_id, params, base=args.dir, parar=parar, esperar=not args.sem_esperar,
+            eco=lambda ts, level, msg: print(f"[{ts}] {level.upper():7} {msg}", flush=True),
+            concessao_s=max(30.0, args.concessao_s),
+        )
+    except FileNotFoundError as e:
+        logger.error("%s", e)
+        return 1
+    finally:
+        for rt in runtimes:
+            rt.stop()
+
+    print(
+        f"Shards processados aqui: {contagem.pop('processados')} | "
+        + " | ".join(f"{estado}: {n}" for estado, n in sorted(contagem.items())),
+        flush=True,
+    )
+    return 0 if not parar.is_set() else 1
+
+
+def cmd_juntar(args: argparse.Namespace) -> int:
+    try:
+        path = juntar_shards(args.job_id, base=args.dir, parcial=args.parcial)
+    except (RuntimeError, FileNotFoundError) as e:
+        logger.error("%s", e)
+        return 1
+    saida = args.saida or f"resultado_{args.job_id}.xlsx"
+    shutil.copyfile(path, saida)
+    print(f"Resultado: {saida}", flush=True)
+    return 0
+
+
+def cmd_status(args: argparse.Namespace) -> int:
+    diretorio = dir_shards(args.job_id, args.dir)
+    try:
+        info = ler_info_shards(diretorio)
+    except FileNotFoundError as e:
+        logger.error("%s", e)
+        return 1
+    tabela = TabelaShards(os.path.join(diretorio, "shards.db"))
+    try:
+        shards = tabela.listar()
+    finally:
+        tabela.close()
+    print(f"{info['job_id']} ({info['origem']}): {info['total']} autos, {len(shards)} shard(s)")
+    agora = time.time()
+    for s in shards:
+        prazo = f", vence em {s['expira'] - agora:.0f}s" if s["expira"] else ""
+        dono = f" [{s['dono']}{prazo}]" if s["dono"] else ""
+        print(f"  {s['id']:>5}  {s['inicio']:>7}..{s['fim'] - 1:<7} {s['estado']:12} "
+              f"{s['tentativas']} tentativa(s){dono}")
+    return 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+    )
+    comandos = {"preparar": cmd_preparar, "worker": cmd_worker, "juntar": cmd_juntar, "status": cmd_status}
+    return comandos[args.comando](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
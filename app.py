@@ -1,23 +1,37 @@
 import os
 import time
-import json
-import hashlib
 import logging
-from dataclasses import dataclass
-from typing import Dict, Any, Optional, Tuple
+from typing import Optional
 
-import pandas as pd
 import streamlit as st
-
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import WebDriverException
+from streamlit.runtime import get_instance
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from antt_core import (
+    BACKEND_HTTP,
+    BACKEND_SELENIUM,
+    CFG,
+    DISJUNTOR_ABERTO,
+    DISJUNTOR_MEIO_ABERTO,
+    GerenciadorRuntimes,
+    JobEmUso,
+    JobManager,
+    JobParams,
+    JobState,
+    METRICAS,
+    ResultCache,
+    carregar_df_or_checkpoint,
+    copiar_config,
+    journal_offset,
+    ler_planilha_entrada,
+    load_checkpoint,
+    make_job_id,
+    modo_atualizacao,
+    paths_for_job,
+    result_xlsx_em_cache,
+    save_result_xlsx,
+)
+from antt_relatorio import formatar, ler_eventos, resumir
 
 
 # =============================================================================
@@ -36,44 +50,16 @@ logger = logging.getLogger("ANTT_BOT")
 MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
 
-# =============================================================================
-# CONFIG
-# =============================================================================
-@dataclass
-class Config:
-    # URL de login CORRIGIDA
-    url_login: str = "https://appweb1.antt.gov.br/spm/Site/Login.aspx"
-    timeout: int = 20
-
-    col_auto: str = "Auto de Infração"
-    col_processo: str = "Nº do Processo"
-    col_data: str = "Data da Infração"
-    col_codigo: str = "Código da Infração"
-    col_fato: str = "Fato Gerador"
-    col_andamento: str = "Último Andamento"
-    col_data_andamento: str = "Data do Último Andamento"
-    col_status: str = "Status Consulta"
-
-
-CFG = Config()
-
-
 # =============================================================================
 # SESSION STATE
 # =============================================================================
 def init_state():
     defaults = {
         "job_id": None,
-        "running": False,
-        "cursor": 0,
-        "total": 0,
-        "ok": 0,
-        "fail": 0,
+        "job_em_andamento": False,  # último estado visto pela UI (para o rerun ao terminar)
         "result_xlsx_path": None,
         "result_xlsx_name": None,
-        "summary": "",
         "last_error": "",
-        "ui_logs": [],  # lista de (HH:MM:SS, level, msg)
     }
     for k, v in defaults.items():
         if k not in st.session_state:
@@ -82,686 +68,398 @@ def init_state():
 
 init_state()
 
+# Configuração desta sessão: a barra lateral só altera esta cópia, e cada job
+# leva a sua (JobParams.config), então um usuário não muda o job de outro.
+if "cfg" not in st.session_state:
+    st.session_state.cfg = copiar_config()
+cfg = st.session_state.cfg
 
-def ui_log(msg: str, level: str = "info"):
-    ts = time.strftime("%H:%M:%S")
-    st.session_state.ui_logs.append((ts, level, msg))
-    st.session_state.ui_logs = st.session_state.ui_logs[-120:]
-
-
-# =============================================================================
-# JOB / CHECKPOINT PATHS
-# =============================================================================
-def make_job_id(file_bytes: bytes) -> str:
-    return hashlib.sha256(file_bytes).hexdigest()[:16]
-
-
-def paths_for_job(job_id: str) -> Dict[str, str]:
-    base = f"antt_{job_id}"
-    return {
-        "checkpoint_csv": os.path.join("/tmp", f"{base}_checkpoint.csv.gz"),
-        "checkpoint_meta": os.path.join("/tmp", f"{base}_meta.json"),
-        "result_xlsx": os.path.join("/tmp", f"{base}_result.xlsx"),
-    }
-
-
-def ensure_output_columns(df: pd.DataFrame) -> pd.DataFrame:
-    for col in [
-        CFG.col_processo,
-        CFG.col_data,
-        CFG.col_codigo,
-        CFG.col_fato,
-        CFG.col_andamento,
-        CFG.col_data_andamento,
-        CFG.col_status,
-    ]:
-        if col not in df.columns:
-            df[col] = ""
-    df = df.astype(object).replace("nan", "").fillna("")
-    return df
-
-
-def save_checkpoint(df: pd.DataFrame, meta: Dict[str, Any], job_id: str) -> None:
-    p = paths_for_job(job_id)
-    df.to_csv(p["checkpoint_csv"], index=False, encoding="utf-8-sig", compression="gzip")
-    with open(p["checkpoint_meta"], "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False)
-
-
-def load_checkpoint(job_id: str) -> Tuple[Optional[pd.DataFrame], Optional[Dict[str, Any]]]:
-    p = paths_for_job(job_id)
-    if not (os.path.exists(p["checkpoint_csv"]) and os.path.exists(p["checkpoint_meta"])):
-        return None, None
-
-    df = pd.read_csv(p["checkpoint_csv"], dtype=str, compression="gzip")
-    df = df.astype(object).replace("nan", "").fillna("")
-
-    with open(p["checkpoint_meta"], "r", encoding="utf-8") as f:
-        meta = json.load(f)
-
-    return df, meta
-
-
-def save_result_xlsx(df: pd.DataFrame, job_id: str) -> str:
-    p = paths_for_job(job_id)
-    with pd.ExcelWriter(p["result_xlsx"], engine="openpyxl") as writer:
-        df.to_excel(writer, index=False)
-    return p["result_xlsx"]
+# Dona dos jobs que esta sessão cria (ver JobManager): outra sessão com a
+# mesma planilha não recarrega, para nem remove o job desta.
+SESSAO = get_script_run_ctx().session_id
 
 
 # =============================================================================
-# SELENIUM RUNTIME (PERSISTE ENTRE RERUNS)
+# RECURSOS COMPARTILHADOS (PERSISTEM ENTRE RERUNS E ENTRE SESSÕES)
 # =============================================================================
-class SeleniumRuntime:
-    def __init__(self):
-        self.driver: Optional[webdriver.Chrome] = None
-        self.wait: Optional[WebDriverWait] = None
-
-    def start(self, headless: bool = True):
-        self.stop()
-
-        chrome_options = Options()
-        chrome_options.binary_location = "/usr/bin/chromium"
-        if headless:
-            chrome_options.add_argument("--headless=new")
-
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-
-        # ===== NOVAS OPÇÕES PARA EVITAR ERR_CONNECTION_RESET =====
-        chrome_options.add_argument("--ignore-certificate-errors")
-        chrome_options.add_argument("--ignore-ssl-errors")
-        chrome_options.add_argument("--disable-web-security")
-        chrome_options.add_argument("--allow-insecure-localhost")
-        # ========================================================
-
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option("useAutomationExtension", False)
-
-        service = Service("/usr/bin/chromedriver")
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
-        self.driver.set_page_load_timeout(120)  # Aumentado de 60 para 120
-        self.wait = WebDriverWait(self.driver, CFG.timeout)
-
-    def stop(self):
-        try:
-            if self.driver is not None:
-                self.driver.quit()
-        except Exception:
-            pass
-        self.driver = None
-        self.wait = None
-
-    def is_alive(self) -> bool:
-        try:
-            if self.driver is None:
-                return False
-            _ = self.driver.current_url
-            return True
-        except Exception:
-            return False
+@st.cache_resource
+def get_gerenciador_runtimes() -> GerenciadorRuntimes:
+    # Único por processo: cada job pede runtimes a ele (ver rodar_job), com
+    # teto global e fila entre os usuários.
+    return GerenciadorRuntimes(CFG.max_runtimes, ocioso_s=CFG.runtime_ocioso_min * 60.0)
 
 
 @st.cache_resource
-def get_runtime() -> SeleniumRuntime:
-    return SeleniumRuntime()
+def get_result_cache(
+    diretorio: str, ttl_sucesso_h: float, ttl_nao_encontrado_h: float, max_mb: float
+) -> ResultCache:
+    return ResultCache(diretorio, ttl_sucesso_h, ttl_nao_encontrado_h, max_mb)
 
 
-# =============================================================================
-# LOGIN / SESSION CHECKS (CORRIGIDO)
-# =============================================================================
-def is_logged_in(rt: SeleniumRuntime) -> bool:
+def sessao_ativa(sessao_id: str) -> bool:
     try:
-        if rt.driver is None:
-            return False
-        rt.driver.find_element(
-            By.ID,
-            "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_txbAutoInfracao",
-        )
-        return True
+        return get_instance().is_active_session(sessao_id)
     except Exception:
-        return False
+        return True  # na dúvida a dona segue viva e o job não muda de sessão
 
 
-def realizar_login(rt: SeleniumRuntime, usuario: str, senha: str, debug: bool) -> bool:
-    """
-    Fluxo de login robusto:
-    - Preenche usuário e senha, clica em OK.
-    - Após login, navega diretamente para a página de consulta.
-    - Verifica se o campo de consulta está presente.
-    """
-    try:
-        ui_log("Abrindo página de login...")
-        rt.driver.get(CFG.url_login)
-
-        # 1. Campo Usuário
-        id_user = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_TextBoxUsuario"
-        campo_user = rt.wait.until(EC.visibility_of_element_located((By.ID, id_user)))
-        campo_user.clear()
-        campo_user.send_keys(usuario)
-        ui_log("Usuário preenchido.")
-
-        # 2. Campo Senha
-        id_senha = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_TextBoxSenha"
-        campo_senha = rt.wait.until(EC.visibility_of_element_located((By.ID, id_senha)))
-        campo_senha.clear()
-        campo_senha.send_keys(senha)
-        ui_log("Senha preenchida.")
-
-        # 3. Botão OK
-        id_btn_ok = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ButtonOk"
-        btn_ok = rt.wait.until(EC.element_to_be_clickable((By.ID, id_btn_ok)))
-        btn_ok.click()
-        ui_log("Botão OK clicado. Aguardando redirecionamento...")
-
-        # 4. Aguarda um tempo para o login processar
-        time.sleep(5)
-
-        # 5. *** NOVO: Navega diretamente para a página de consulta ***
-        url_consulta = "https://appweb1.antt.gov.br/spm/Site/DefesaCTB/ConsultaProcessoSituacao.aspx"
-        ui_log(f"Navegando para a página de consulta: {url_consulta}")
-        rt.driver.get(url_consulta)
-        time.sleep(3)
-
-        # 6. Verifica se a página de consulta carregou (campo de auto)
-        campo_auto_id = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_txbAutoInfracao"
-        try:
-            rt.wait.until(EC.presence_of_element_located((By.ID, campo_auto_id)))
-            ui_log("Página de consulta carregada com sucesso.")
-            return True
-        except Exception:
-            # Se não encontrar, pode ser que a página de erro tenha aparecido novamente
-            ui_log("Campo de consulta não encontrado. Verificando se há erro...", "warning")
-            if "Exceção de Sistema" in rt.driver.page_source:
-                ui_log("Página de erro detectada. Tentando recarregar a consulta...", "warning")
-                # Tenta novamente após 3 segundos
-                time.sleep(3)
-                rt.driver.get(url_consulta)
-                time.sleep(3)
-                # Última tentativa
-                rt.wait.until(EC.presence_of_element_located((By.ID, campo_auto_id)))
-                ui_log("Página de consulta carregada na segunda tentativa.")
-                return True
-            else:
-                # Se não for erro, levanta exceção para tratamento superior
-                raise
-
-    except Exception as e:
-        ui_log("Falha no login ou no carregamento da página de consulta.", "error")
-        if debug:
-            st.exception(e)
-            try:
-                st.image(rt.driver.get_screenshot_as_png(), caption="Debug - falha no login/consulta")
-            except Exception:
-                pass
-        return False
-
-
-def ensure_session(rt: SeleniumRuntime, usuario: str, senha: str, headless: bool, debug: bool) -> bool:
-    if not rt.is_alive():
-        ui_log("WebDriver não está ativo. Reiniciando driver...", "warning")
-        rt.start(headless=headless)
-
-    if is_logged_in(rt):
-        return True
-
-    ui_log("Sessão não autenticada. Tentando relogin...", "warning")
-    return realizar_login(rt, usuario, senha, debug=debug)
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    return JobManager(sessao_ativa)
 
 
 # =============================================================================
-# CONSULTA
+# UI
 # =============================================================================
-def esperar_dados(rt: SeleniumRuntime, element_id: str, timeout: int = 10) -> str:
-    end = time.time() + timeout
-    while time.time() < end:
-        try:
-            val = rt.driver.find_element(By.ID, element_id).get_attribute("value")
-            if val and val.strip():
-                return val
-            time.sleep(0.5)
-        except Exception:
-            pass
-    return ""
+st.title("Robô ANTT - Consulta Automatizada (Robusto)")
 
+manager = get_job_manager()
+gerenciador = get_gerenciador_runtimes()
+job = manager.get(st.session_state.job_id, SESSAO)
+running = job is not None and job.running
+
+
+def render_runtimes() -> None:
+    r = gerenciador.resumo()
+    linha = f"Runtimes: {r['em_uso']}/{r['max']} em uso, {r['ociosos']} ocioso(s)"
+    if r["fila"]:
+        linha += f" | {r['fila']} job(s) na fila"
+    st.caption(linha)
+
+
+def render_worker_stats(job: Optional[JobState]) -> None:
+    stats = {}
+    if job is not None:
+        with job.lock:
+            stats = {wid: dict(s) for wid, s in job.worker_stats.items()}
+    if not stats:
+        st.caption("Workers: nenhuma consulta ainda.")
+        return
+
+    linhas = []
+    for wid in sorted(stats):
+        s = stats[wid]
+        por_min = 60.0 * s["autos"] / s["segundos"] if s["segundos"] > 0 else 0.0
+        linha = f"W{wid}: {s['autos']} autos | {por_min:.1f}/min"
+        if "rss_mb" in s:
+            linha += f" | {s['rss_mb']:.0f} MB"
+        if s.get("reciclagens"):
+            linha += f" | {s['reciclagens']} reciclagem(ns)"
+        linhas.append(linha)
+    if job.vazao is not None:
+        v = job.vazao.estado()
+        linha = f"Vazão: delay {v['atraso']:.2f}s | {v['concorrencia']}/{v['max_workers']} worker(s) ativos"
+        if v["reducoes"]:
+            linha += f" | {v['reducoes']} recuo(s), último: {v['ultimo_sinal']}"
+        linhas.append(linha)
+    if job.disjuntor is not None:
+        d = job.disjuntor.resumo()
+        if d["estado"] == DISJUNTOR_ABERTO:
+            linhas.append(f"Disjuntor ABERTO até {time.strftime('%H:%M:%S', time.localtime(d['aberto_ate']))}")
+        elif d["estado"] == DISJUNTOR_MEIO_ABERTO:
+            linhas.append("Disjuntor meio-aberto: consulta de sonda em andamento")
+        elif d["aberturas"]:
+            linhas.append(f"Disjuntor fechado ({d['aberturas']} abertura(s) no job)")
+    if job.adiados:
+        linhas.append(f"{len(job.adiados)} auto(s) aguardando rodada adiada")
+    st.caption("\n\n".join(linhas))
+
+
+# Os painéis abaixo só leem o JobState; enquanto o job roda eles se atualizam
+# sozinhos (fragment), sem reexecutar o script inteiro.
+INTERVALO_POLL = 2 if running else None
+
+
+@st.fragment(run_every=INTERVALO_POLL)
+def painel_workers():
+    render_runtimes()
+    render_worker_stats(manager.get(st.session_state.job_id, SESSAO))
+
+
+@st.fragment(run_every=INTERVALO_POLL)
+def painel_metricas():
+    r = METRICAS.resumo()
+    if not r["etapas"]:
+        st.caption("Sem métricas ainda.")
+        return
+    st.dataframe(
+        [
+            {"etapa": etapa, "n": h["count"], "p50": h["p50"], "p95": h["p95"], "p99": h["p99"]}
+            for etapa, h in sorted(r["etapas"].items())
+        ],
+        hide_index=True,
+        use_container_width=True,
+    )
+    if r["contadores"]:
+        st.caption(" | ".join(f"{k}: {v}" for k, v in sorted(r["contadores"].items())))
+    st.caption(f"Exportado em {CFG.metricas_dir}/antt_metrics.(json|prom)")
 
-def processar_auto(rt: SeleniumRuntime, auto: str) -> Dict[str, Any]:
-    res = {"status": "erro", "dados": {}, "mensagem": ""}
-    driver = rt.driver
-    wait = rt.wait
-    janela_main = driver.current_window_handle
 
-    try:
-        campo = wait.until(
-            EC.element_to_be_clickable(
-                (
-                    By.ID,
-                    "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_txbAutoInfracao",
-                )
-            )
-        )
-        campo.clear()
-        campo.send_keys(auto)
+with st.sidebar:
+    st.header("Opções")
+    debug = st.checkbox("Modo debug (exceções/screenshot)", value=False)
+    cfg.detalhe_em_aba = st.checkbox(
+        "Detalhe em aba reutilizada (sem popup por auto)",
+        value=cfg.detalhe_em_aba,
+        disabled=running,
+    )
+    backend = st.radio(
+        "Backend de consulta",
+        [BACKEND_SELENIUM, BACKEND_HTTP],
+        format_func=lambda b: "Navegador (Selenium)" if b == BACKEND_SELENIUM else "HTTP direto (sem navegador)",
+        disabled=running,
+    )
+    headless = st.checkbox("Executar headless", value=True)
+    cfg.perfil_enxuto = st.checkbox(
+        "Perfil enxuto do Chromium (bloqueia imagens/CSS/fontes)",
+        value=cfg.perfil_enxuto,
+        disabled=running,
+    )
+    cfg.reusar_sessao = st.checkbox(
+        "Reaproveitar cookies do login ao reiniciar o driver",
+        value=cfg.reusar_sessao,
+        disabled=running,
+    )
 
-        encontrou = False
-        for _ in range(3):
-            try:
-                btn = driver.find_element(
-                    By.ID,
-                    "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_btnPesquisar",
-                )
-                driver.execute_script("arguments[0].click();", btn)
-                time.sleep(2)
-
-                wait.until(
-                    EC.presence_of_element_located(
-                        (
-                            By.ID,
-                            "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_gdvAutoInfracao_btnEditar_0",
-                        )
-                    )
-                )
-                encontrou = True
-                break
-            except Exception:
-                if "Nenhum registro" in (driver.page_source or ""):
-                    break
-
-        if not encontrou:
-            res["status"] = "nao_encontrado"
-            res["mensagem"] = "Auto não localizado"
-            return res
-
-        btn_edit = driver.find_element(
-            By.ID,
-            "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_gdvAutoInfracao_btnEditar_0",
+    checkpoint_every = st.slider("Checkpoint a cada N autos", min_value=5, max_value=30, value=10, step=5)
+    vazao_adaptativa = st.checkbox(
+        "Vazão adaptativa (ajusta delay e workers à saúde do site)", value=True, disabled=running
+    )
+    throttle = 0.0
+    if not vazao_adaptativa:
+        throttle = st.selectbox("Delay fixo entre consultas", [0.0, 0.2, 0.3, 0.5, 0.8], index=2)
+    cfg.abas_por_driver = st.slider(
+        "Abas por navegador (consultas simultâneas no mesmo login)",
+        min_value=1, max_value=6, value=cfg.abas_por_driver, step=1,
+        disabled=running or backend != BACKEND_SELENIUM,
+    )
+    n_workers = st.slider(
+        "Workers paralelos (Chromium)", min_value=1, max_value=8, value=1, step=1,
+        help=f"Limitado a {CFG.max_runtimes} runtimes no processo, somando os jobs de todos os usuários.",
+    )
+
+    colunas_extra = st.text_input(
+        "Colunas da entrada a manter no resultado (separadas por ;)",
+        value="; ".join(cfg.colunas_extra),
+        disabled=running,
+    )
+    cfg.colunas_extra = tuple(c.strip() for c in colunas_extra.split(";") if c.strip())
+
+    with st.expander("Reciclagem do navegador"):
+        st.caption("Troca o Chromium entre dois autos ao atingir um limite (0 = desligado).")
+        cfg.reciclar_apos_autos = int(st.number_input(
+            "Após N autos", min_value=0, value=cfg.reciclar_apos_autos, step=50
+        ))
+        cfg.reciclar_rss_mb = st.number_input(
+            "Memória do navegador (MB)", min_value=0.0, value=cfg.reciclar_rss_mb, step=100.0
         )
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn_edit)
-        time.sleep(1)
-        driver.execute_script("arguments[0].click();", btn_edit)
-
-        WebDriverWait(driver, 15).until(EC.number_of_windows_to_be(2))
-        for w in driver.window_handles:
-            if w != janela_main:
-                driver.switch_to.window(w)
-                break
-        time.sleep(3)
-
-        dados = {}
-        try:
-            id_proc = "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_txbProcesso"
-            wait.until(EC.visibility_of_element_located((By.ID, id_proc)))
-            dados["processo"] = esperar_dados(rt, id_proc) or driver.find_element(By.ID, id_proc).get_attribute("value")
-
-            dados["data_infracao"] = driver.find_element(
-                By.ID,
-                "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_txbDataInfracao",
-            ).get_attribute("value")
-
-            dados["codigo"] = driver.find_element(
-                By.ID,
-                "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_txbCodigoInfracao",
-            ).get_attribute("value")
-
-            dados["fato"] = driver.find_element(
-                By.ID,
-                "ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_txbObservacaoFiscalizacao",
-            ).get_attribute("value")
-
-            try:
-                xp = '//*[@id="ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ucDetalheAutoInfracao5083_ucDocumentosDoProcesso442_gdvDocumentosProcesso"]'
-                wait.until(EC.presence_of_element_located((By.XPATH, xp)))
-                tab = driver.find_element(By.XPATH, xp)
-                trs = tab.find_elements(By.TAG_NAME, "tr")
-
-                if len(trs) > 1:
-                    tds = trs[-1].find_elements(By.TAG_NAME, "td")
-                    if len(tds) >= 4:
-                        dados["data_andamento"] = tds[3].text
-                        dados["andamento"] = tds[1].text
-                    elif len(tds) >= 2:
-                        dados["data_andamento"] = tds[-1].text
-                        dados["andamento"] = tds[0].text
-                else:
-                    dados["andamento"] = "Sem andamentos"
-                    dados["data_andamento"] = ""
-            except Exception:
-                dados["andamento"] = "Erro Tabela"
-                dados["data_andamento"] = ""
-
-            res["status"] = "sucesso"
-            res["dados"] = dados
-            res["mensagem"] = "Sucesso"
-
-        except Exception as e:
-            res["mensagem"] = f"Erro leitura: {e}"
-
-        try:
-            driver.close()
-        except Exception:
-            pass
-        driver.switch_to.window(janela_main)
-        return res
-
-    except Exception as e:
-        res["mensagem"] = f"Erro fluxo: {e}"
-        try:
-            driver.switch_to.window(janela_main)
-        except Exception:
-            pass
-        return res
-
-
-def processar_auto_com_recuperacao(
-    rt: SeleniumRuntime,
-    auto: str,
-    usuario: str,
-    senha: str,
-    headless: bool,
-    debug: bool,
-    max_retries: int = 2,
-) -> Dict[str, Any]:
-    last_exc = None
-    for attempt in range(max_retries + 1):
-        try:
-            ok = ensure_session(rt, usuario, senha, headless=headless, debug=debug)
-            if not ok:
-                return {"status": "erro", "dados": {}, "mensagem": "Falha no login/relogin"}
-
-            res = processar_auto(rt, auto)
-
-            if res.get("status") != "sucesso" and not is_logged_in(rt):
-                ui_log("Perda de sessão detectada. Forçando reinício do driver...", "warning")
-                rt.stop()
-                continue
-
-            return res
-
-        except WebDriverException as e:
-            last_exc = e
-            ui_log(f"Erro WebDriver (tentativa {attempt+1}). Reiniciando driver...", "warning")
-            rt.stop()
-            time.sleep(1)
-            continue
-        except Exception as e:
-            last_exc = e
-            time.sleep(1)
-            continue
-
-    return {"status": "erro", "dados": {}, "mensagem": f"Falha após retries: {last_exc}"}
-
-
-# =============================================================================
-# PIPELINE EM LOTES + CHECKPOINT + RERUN
-# =============================================================================
-def iniciar_job(file_bytes: bytes):
-    job_id = make_job_id(file_bytes)
-    st.session_state.job_id = job_id
-
-    st.session_state.cursor = 0
-    st.session_state.total = 0
-    st.session_state.ok = 0
-    st.session_state.fail = 0
-
-    st.session_state.result_xlsx_path = None
-    st.session_state.result_xlsx_name = None
-
-    st.session_state.summary = ""
-    st.session_state.last_error = ""
-    st.session_state.ui_logs = []
-    ui_log(f"Job iniciado: {job_id}")
-
-
-def carregar_df_or_checkpoint(uploaded_file) -> pd.DataFrame:
-    job_id = st.session_state.job_id
-
-    df_ck, meta = load_checkpoint(job_id)
-    if df_ck is not None and meta is not None:
-        st.session_state.cursor = int(meta.get("cursor", 0))
-        st.session_state.total = int(meta.get("total", len(df_ck)))
-        st.session_state.ok = int(meta.get("ok", 0))
-        st.session_state.fail = int(meta.get("fail", 0))
-        ui_log(f"Checkpoint carregado. Retomando em {st.session_state.cursor}/{st.session_state.total}.")
-        return ensure_output_columns(df_ck)
-
-    df = pd.read_excel(uploaded_file)
-    if CFG.col_auto not in df.columns:
-        raise ValueError(f"Coluna obrigatória ausente: {CFG.col_auto}")
-    df = ensure_output_columns(df)
-
-    df_filtrado = df[df[CFG.col_auto].astype(str).str.strip() != ""]
-    st.session_state.total = int(len(df_filtrado))
-    st.session_state.cursor = 0
-    st.session_state.ok = 0
-    st.session_state.fail = 0
-
-    ui_log(f"Planilha carregada. Total de autos: {st.session_state.total}.")
-    return df
-
-
-def rodar_lote(
-    df: pd.DataFrame,
-    usuario: str,
-    senha: str,
-    headless: bool,
-    debug: bool,
-    batch_size: int,
-    checkpoint_every: int,
-    throttle: float,
-):
-    job_id = st.session_state.job_id
-    rt = get_runtime()
-
-    df_filtrado_idx = df[df[CFG.col_auto].astype(str).str.strip() != ""].index.tolist()
-    total = len(df_filtrado_idx)
-    st.session_state.total = total
-
-    start_cursor = st.session_state.cursor
-    end_cursor = min(start_cursor + batch_size, total)
-    ui_log(f"Iniciando lote: {start_cursor+1} até {end_cursor} de {total}.")
-
-    progress = st.progress(start_cursor / max(total, 1))
-    live = st.empty()
-
-    for pos in range(start_cursor, end_cursor):
-        original_idx = df_filtrado_idx[pos]
-        auto = str(df.at[original_idx, CFG.col_auto]).strip()
-
-        res = processar_auto_com_recuperacao(
-            rt, auto, usuario, senha,
-            headless=headless, debug=debug, max_retries=2
+        cfg.reciclar_idade_min = st.number_input(
+            "Idade do navegador (min)", min_value=0.0, value=cfg.reciclar_idade_min, step=15.0
+        )
+        cfg.reserva_quente = st.checkbox(
+            "Navegador reserva já logado", value=cfg.reserva_quente, disabled=running,
+            help="Um Chromium extra (conta no teto de runtimes) assume na hora quando o de um worker "
+                 "cai ou é reciclado.",
         )
 
-        df.at[original_idx, CFG.col_status] = res.get("mensagem", "")
-
-        if res.get("status") == "sucesso":
-            d = res.get("dados", {})
-            df.at[original_idx, CFG.col_processo] = d.get("processo", "")
-            df.at[original_idx, CFG.col_data] = d.get("data_infracao", "")
-            df.at[original_idx, CFG.col_codigo] = d.get("codigo", "")
-            df.at[original_idx, CFG.col_fato] = d.get("fato", "")
-            df.at[original_idx, CFG.col_andamento] = d.get("andamento", "")
-            df.at[original_idx, CFG.col_data_andamento] = d.get("data_andamento", "")
-            st.session_state.ok += 1
-        else:
-            st.session_state.fail += 1
-
-        st.session_state.cursor = pos + 1
-
-        if (st.session_state.cursor % 10 == 0) or (st.session_state.cursor == total):
-            live.caption(
-                f"Progresso: {st.session_state.cursor}/{total} | OK: {st.session_state.ok} | Falhas: {st.session_state.fail}"
-            )
-            ui_log(f"Progresso: {st.session_state.cursor}/{total} (OK: {st.session_state.ok}, Falhas: {st.session_state.fail}).")
-
-        progress.progress(st.session_state.cursor / max(total, 1))
-
-        if (st.session_state.cursor % checkpoint_every == 0) or (st.session_state.cursor == total):
-            meta = {
-                "cursor": st.session_state.cursor,
-                "total": total,
-                "ok": st.session_state.ok,
-                "fail": st.session_state.fail,
-                "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
-            }
-
-            try:
-                save_checkpoint(df, meta, job_id)
-                ui_log(f"Checkpoint salvo em {st.session_state.cursor}/{total}.")
-            except Exception as e:
-                ui_log(f"Falha ao salvar checkpoint (seguindo execução): {e}", "warning")
-
-            try:
-                partial_path = save_result_xlsx(df, job_id)
-                st.session_state.result_xlsx_path = partial_path
-                st.session_state.result_xlsx_name = f"ANTT_Parcial_{job_id}_{st.session_state.cursor}de{total}.xlsx"
-                ui_log("Arquivo parcial atualizado para download.")
-            except Exception as e:
-                ui_log(f"Falha ao gerar XLSX parcial: {e}", "warning")
-
-        if throttle > 0:
-            time.sleep(throttle)
-
-    progress.empty()
-    live.empty()
-
-    if st.session_state.cursor >= total:
-        ui_log("Processamento finalizado. Gerando arquivo final...")
-        try:
-            final_path = save_result_xlsx(df, job_id)
-            st.session_state.result_xlsx_path = final_path
-            st.session_state.result_xlsx_name = f"ANTT_Resultado_{time.strftime('%Y%m%d_%H%M%S')}.xlsx"
-            ui_log("Arquivo final pronto para download.")
-        except Exception as e:
-            ui_log(f"Falha ao gerar XLSX final: {e}", "error")
-
-        st.session_state.summary = f"Concluído. OK: {st.session_state.ok} | Falhas/Não encontrados: {st.session_state.fail}"
-        st.session_state.running = False
-    else:
-        st.session_state.summary = f"Em andamento. OK: {st.session_state.ok} | Falhas: {st.session_state.fail}"
-
+    with st.expander("Atualização incremental"):
+        st.caption(
+            "Envie uma planilha de resultado anterior: só são reconsultados os autos sem "
+            "andamento final e não consultados recentemente; os que mudarem ficam marcados."
+        )
+        atualizacao = st.checkbox("Atualizar resultado anterior", value=False, disabled=running)
+        finais = st.text_area(
+            "Andamentos finais (um por linha)",
+            value="\n".join(cfg.andamentos_finais),
+            disabled=running,
+        )
+        cfg.andamentos_finais = tuple(a.strip() for a in finais.splitlines() if a.strip())
+        cfg.atualizar_apos_h = st.number_input(
+            "Reconsultar o que foi consultado há mais de (horas)",
+            min_value=0.0, value=cfg.atualizar_apos_h, step=24.0, disabled=running,
+        )
 
-# =============================================================================
-# UI
-# =============================================================================
-st.title("Robô ANTT - Consulta Automatizada (Robusto)")
+    with st.expander("Cache de resultados"):
+        usar_cache = st.checkbox("Usar cache entre jobs", value=True)
+        forcar_atualizacao = st.checkbox("Forçar atualização (ignorar cache)", value=False)
+        cfg.cache_ttl_sucesso_h = st.number_input(
+            "Validade - sucesso (horas)", min_value=0.0, value=cfg.cache_ttl_sucesso_h, step=1.0
+        )
+        cfg.cache_ttl_nao_encontrado_h = st.number_input(
+            "Validade - não encontrado (horas)", min_value=0.0, value=cfg.cache_ttl_nao_encontrado_h, step=1.0
+        )
+        cfg.cache_max_mb = st.number_input(
+            "Tamanho máximo (MB)", min_value=1.0, value=cfg.cache_max_mb, step=32.0
+        )
 
-with st.sidebar:
-    st.header("Opções")
-    debug = st.checkbox("Modo debug (exceções/screenshot)", value=False)
-    headless = st.checkbox("Executar headless", value=True)
+    st.subheader("Workers")
+    painel_workers()
 
-    batch_size = st.slider("Tamanho do lote", min_value=10, max_value=40, value=20, step=5)
-    checkpoint_every = st.slider("Checkpoint a cada N autos", min_value=5, max_value=30, value=10, step=5)
-    throttle = st.selectbox("Delay entre consultas", [0.0, 0.2, 0.3, 0.5, 0.8], index=2)
+    with st.expander("Métricas por etapa (s)"):
+        painel_metricas()
 
 col1, col2 = st.columns(2)
 with col1:
-    usuario = st.text_input("Usuário", disabled=st.session_state.running)
+    usuario = st.text_input("Usuário", disabled=running)
 with col2:
-    senha = st.text_input("Senha", type="password", disabled=st.session_state.running)
+    senha = st.text_input("Senha", type="password", disabled=running)
 
 arquivo = st.file_uploader(
-    "Planilha (.xlsx) com coluna 'Auto de Infração'",
-    type=["xlsx"],
-    disabled=st.session_state.running
+    "Planilha (.xlsx, .csv ou .parquet) com coluna 'Auto de Infração'",
+    type=["xlsx", "csv", "parquet"],
+    disabled=running
 )
 
 b1, b2, b3 = st.columns(3)
 with b1:
-    start = st.button("Iniciar / Retomar", type="primary", use_container_width=True, disabled=st.session_state.running)
+    start = st.button("Iniciar / Retomar", type="primary", use_container_width=True, disabled=running)
 with b2:
-    stop = st.button("Parar", use_container_width=True, disabled=not st.session_state.running)
+    stop = st.button("Parar", use_container_width=True, disabled=not running)
 with b3:
     reset = st.button("Limpar estado", use_container_width=True)
 
 if reset:
-    try:
-        get_runtime().stop()
-    except Exception:
-        pass
+    # Só o job desta sessão: ele devolve a própria concessão ao terminar e os
+    # runtimes dos outros usuários não são tocados. O job de outra sessão
+    # (mesma planilha) segue intacto; aqui só o estado desta é limpo.
+    manager.remover(st.session_state.job_id, SESSAO)
     st.session_state.clear()
     init_state()
     st.rerun()
 
-if stop:
-    st.session_state.running = False
-    ui_log("Execução interrompida pelo usuário.", "warning")
+if stop and job is not None:
+    # Efeito imediato: os workers não pegam o próximo auto.
+    manager.parar(job.job_id, SESSAO)
+    job.log("Execução interrompida pelo usuário.", "warning")
     st.warning("Execução interrompida.")
 
 if start:
     if not usuario or not senha or arquivo is None:
         st.error("Preencha usuário, senha e selecione a planilha.")
     else:
-        file_bytes = arquivo.getvalue()
-        if not st.session_state.job_id:
-            iniciar_job(file_bytes)
-        st.session_state.running = True
-        ui_log("Execução iniciada.")
-
-# Painel de logs (leve)
-with st.status("Execução", expanded=True) as status_box:
-    logs = st.session_state.ui_logs[-25:]
-    if logs:
-        for ts, level, msg in logs:
-            if level == "error":
-                st.error(f"[{ts}] {msg}")
-            elif level == "warning":
-                st.warning(f"[{ts}] {msg}")
+        try:
+            if not st.session_state.job_id:
+                st.session_state.job_id = make_job_id(
+                    arquivo.getvalue(), modo_atualizacao(cfg) if atualizacao else ""
+                )
+                st.session_state.result_xlsx_path = None
+                st.session_state.result_xlsx_name = None
+            st.session_state.last_error = ""
+
+            job = manager.obter_ou_criar(st.session_state.job_id, SESSAO)
+            job.log(f"Job iniciado: {job.job_id}")
+            df = carregar_df_or_checkpoint(arquivo, job, atualizacao=atualizacao, cfg=cfg)
+            if job.total <= 0 and not atualizacao:
+                st.error("Nenhum auto encontrado.")
             else:
-                st.write(f"[{ts}] {msg}")
-    else:
-        st.write("Nenhum log ainda.")
-
-    if st.session_state.running:
-        status_box.update(label="Execução (em andamento)", state="running", expanded=True)
-    elif st.session_state.last_error:
-        status_box.update(label="Execução (com erro)", state="error", expanded=True)
-    elif st.session_state.summary:
-        status_box.update(label="Execução (finalizada)", state="complete", expanded=False)
-    else:
-        status_box.update(label="Execução (ociosa)", state="complete", expanded=False)
+                manager.iniciar(
+                    job,
+                    df,
+                    JobParams(
+                        usuario=usuario,
+                        senha=senha,
+                        headless=headless,
+                        debug=debug,
+                        checkpoint_every=int(checkpoint_every),
+                        throttle=float(throttle),
+                        vazao_adaptativa=vazao_adaptativa,
+                        n_workers=int(n_workers),
+                        backend=backend,
+                        cache=get_result_cache(
+                            CFG.cache_dir, cfg.cache_ttl_sucesso_h, cfg.cache_ttl_nao_encontrado_h, cfg.cache_max_mb
+                        ) if usar_cache else None,
+                        forcar_atualizacao=forcar_atualizacao,
+                        gerenciador=gerenciador,
+                        config=copiar_config(cfg),
+                    ),
+                )
+                job.log("Execução iniciada.")
+                st.session_state.job_em_andamento = True
+                st.rerun()
 
-# Execução em lotes + rerun controlado
-if st.session_state.running:
-    try:
-        df = carregar_df_or_checkpoint(arquivo)
-        if st.session_state.total <= 0:
-            st.error("Nenhum auto encontrado.")
-            st.session_state.running = False
+        except JobEmUso as e:
+            st.session_state.job_id = None
+            st.error(f"{e} Aguarde o fim dele ou use outra planilha.")
+        except Exception as e:
+            st.session_state.last_error = str(e)
+            st.error(f"Erro no processamento: {e}")
+            if debug:
+                st.exception(e)
+
+
+@st.fragment(run_every=INTERVALO_POLL)
+def painel_execucao():
+    job = manager.get(st.session_state.job_id, SESSAO)
+
+    if job is not None and job.running:
+        st.progress(job.cursor / max(job.total, 1))
+        st.caption(f"Progresso: {job.cursor}/{job.total} | OK: {job.ok} | Falhas: {job.fail}")
+
+    with st.status("Execução", expanded=True) as status_box:
+        logs = job.ultimos_logs(25) if job is not None else []
+        if logs:
+            for ts, level, msg in logs:
+                if level == "error":
+                    st.error(f"[{ts}] {msg}")
+                elif level == "warning":
+                    st.warning(f"[{ts}] {msg}")
+                else:
+                    st.write(f"[{ts}] {msg}")
         else:
-            rodar_lote(
-                df=df,
-                usuario=usuario,
-                senha=senha,
-                headless=headless,
-                debug=debug,
-                batch_size=int(batch_size),
-                checkpoint_every=int(checkpoint_every),
-                throttle=float(throttle),
-            )
-
-            if st.session_state.running and st.session_state.cursor < st.session_state.total:
-                time.sleep(0.2)
-                st.rerun()
+            st.write("Nenhum log ainda.")
+
+        if job is not None and job.running:
+            status_box.update(label="Execução (em andamento)", state="running", expanded=True)
+        elif st.session_state.last_error or (job is not None and job.last_error):
+            status_box.update(label="Execução (com erro)", state="error", expanded=True)
+        elif job is not None and job.summary:
+            status_box.update(label="Execução (finalizada)", state="complete", expanded=False)
+        else:
+            status_box.update(label="Execução (ociosa)", state="complete", expanded=False)
 
-    except Exception as e:
-        st.session_state.running = False
-        st.session_state.last_error = str(e)
-        ui_log(f"Erro no processamento: {e}", "error")
-        st.error(f"Erro no processamento: {e}")
-        if debug:
-            st.exception(e)
-
-# Resumo
-if st.session_state.summary:
-    if st.session_state.running:
-        st.info(st.session_state.summary)
-    else:
-        st.success(st.session_state.summary)
+    # Resumo
+    if job is not None and job.summary:
+        if job.running:
+            st.info(job.summary)
+        else:
+            st.success(job.summary)
+
+    # O job terminou desde a última leitura: rerun completo para liberar os
+    # botões e mostrar o download.
+    if st.session_state.job_em_andamento and not (job is not None and job.running):
+        st.session_state.job_em_andamento = False
+        st.rerun(scope="app")
+
+
+painel_execucao()
+
+if job is not None and job.result_xlsx_path:
+    st.session_state.result_xlsx_path = job.result_xlsx_path
+    st.session_state.result_xlsx_name = job.result_xlsx_name
+
+# Arquivo parcial: gerado só quando pedido (e reaproveitado se o diário não mudou)
+if (
+    job is not None
+    and not running
+    and arquivo is not None
+    and 0 < job.cursor < job.total
+):
+    if st.button("Preparar arquivo parcial para download", use_container_width=True):
+        try:
+            job_cfg = job.config or cfg
+            offset = journal_offset(job.job_id, job_cfg.jobs_dir)
+            path = result_xlsx_em_cache(job.job_id, offset, job_cfg.jobs_dir)
+            if path is None:
+                df_parcial = ler_planilha_entrada(arquivo, job_cfg)
+                if job.atualizacao:
+                    df_parcial[job_cfg.col_alterado] = ""
+                load_checkpoint(df_parcial, job.job_id, job_cfg.jobs_dir)
+                with METRICAS.medir("xlsx"):
+                    path = save_result_xlsx(df_parcial, job.job_id, offset=offset, jobs_dir=job_cfg.jobs_dir)
+            st.session_state.result_xlsx_path = path
+            st.session_state.result_xlsx_name = f"ANTT_Parcial_{job.job_id}_{job.cursor}de{job.total}.xlsx"
+        except Exception as e:
+            st.error(f"Falha ao gerar XLSX parcial: {e}")
 
 # Download sempre disponível (parcial/final)
 if st.session_state.result_xlsx_path and os.path.exists(st.session_state.result_xlsx_path):
@@ -777,3 +475,23 @@ if st.session_state.result_xlsx_path and os.path.exists(st.session_state.result_
         )
 else:
     st.caption("Nenhum arquivo disponível para download ainda.")
+
+# Relatório do diário de eventos (o mesmo do antt_relatorio.py), depois do job
+if job is not None and not running:
+    path_eventos = paths_for_job(job.job_id, (job.config or cfg).jobs_dir)["eventos"]
+    if os.path.exists(path_eventos):
+        with st.expander("Relatório da execução"):
+            try:
+                st.code(formatar(resumir(ler_eventos(path_eventos))), language=None)
+            except Exception as e:
+                st.error(f"Falha ao gerar o relatório: {e}")
+            with open(path_eventos, "rb") as f:
+                st.download_button(
+                    "Baixar diário de eventos (JSONL)",
+                    data=f,
+                    file_name=f"ANTT_Eventos_{job.job_id}.jsonl",
+                    mime="application/x-ndjson",
+                    on_click="ignore",
+                    use_container_width=True,
+                    key="download_eventos",
+                )
@@ -0,0 +1,166 @@
+"""
+Benchmark reprodutível do robô contra o mock local (bench/mock_antt.py) ou
+contra qualquer host indicado em --base-url.
+
+Roda N autos por processar_auto_com_recuperacao e informa autos/min,
+p50/p95/p99 da latência por auto (e por etapa, via METRICAS) e o pico de RSS
+do processo mais os filhos (chromedriver/Chromium), amostrado de /proc.
+
+    python bench/benchmark.py -n 200 --backend http --latencia-ms 150
+    python bench/benchmark.py -n 50 --backend selenium --workers 2 --saida bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from antt_core import (  # noqa: E402
+    BACKEND_HTTP,
+    BACKEND_SELENIUM,
+    CFG,
+    METRICAS,
+    novo_runtime,
+    percentil,
+    processar_auto_com_recuperacao,
+    rss_processos_kb,
+)
+from mock_antt import MockConfig, base_url, iniciar_mock  # noqa: E402
+
+
+class AmostradorRss:
+    """Thread que guarda o pico de RSS da árvore de processos."""
+
+    def __init__(self, intervalo: float = 0.25):
+        self.intervalo = intervalo
+        self.pico_kb = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self.pico_kb = max(self.pico_kb, rss_processos_kb())
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+        self.pico_kb = max(self.pico_kb, rss_processos_kb())
+
+
+def rodar(autos: List[str], args) -> Dict[str, Any]:
+    latencias: List[float] = []
+    status: Counter = Counter()
+    lock = threading.Lock()
+    proximos = iter(enumerate(autos))
+
+    def worker():
+        rt = novo_runtime(args.backend)
+        try:
+            while True:
+                with lock:
+                    item = next(proximos, None)
+                if item is None:
+                    return
+                _, auto = item
+                t0 = time.perf_counter()
+                res = processar_auto_com_recuperacao(
+                    rt, auto, args.usuario, args.senha,
+                    headless=not args.sem_headless, debug=args.debug,
+                )
+                dt = time.perf_counter() - t0
+                with lock:
+                    latencias.append(dt)
+                    status[res.get("status", "erro")] += 1
+        finally:
+            rt.stop()
+
+    with AmostradorRss() as rss:
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duracao = time.perf_counter() - t0
+
+    ordenadas = sorted(latencias)
+    return {
+        "backend": args.backend,
+        "workers": args.workers,
+        "autos": len(autos),
+        "duracao_s": round(duracao, 2),
+        "autos_por_min": round(len(latencias) / duracao * 60.0, 1) if duracao else 0.0,
+        "latencia_s": {
+            "p50": percentil(ordenadas, 50),
+            "p95": percentil(ordenadas, 95),
+            "p99": percentil(ordenadas, 99),
+        },
+        "status": dict(status),
+        "pico_rss_mb": round(rss.pico_kb / 1024.0, 1),
+        "metricas": METRICAS.resumo(),
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark do robô ANTT contra o mock local.")
+    p.add_argument("-n", "--autos", type=int, default=100)
+    p.add_argument("--backend", choices=[BACKEND_SELENIUM, BACKEND_HTTP], default=BACKEND_HTTP)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--base-url", default="", help="Usa um servidor já em execução em vez do mock embutido.")
+    p.add_argument("--latencia-ms", type=float, default=100.0)
+    p.add_argument("--jitter-ms", type=float, default=30.0)
+    p.add_argument("--taxa-erro", type=float, default=0.0)
+    p.add_argument("--expira-sessao-s", type=float, default=0.0)
+    p.add_argument("--usuario", default="bench")
+    p.add_argument("--senha", default="bench")
+    p.add_argument("--timeout", type=int, default=CFG.timeout)
+    p.add_argument("--sem-headless", action="store_true")
+    p.add_argument("--debug", action="store_true")
+    p.add_argument("--saida", default="", help="Grava o relatório em JSON neste caminho.")
+    args = p.parse_args(argv)
+
+    servidor = None
+    if args.base_url:
+        CFG.usar_base_url(args.base_url)
+    else:
+        servidor = iniciar_mock(MockConfig(
+            latencia_ms=args.latencia_ms,
+            jitter_ms=args.jitter_ms,
+            taxa_erro=args.taxa_erro,
+            expira_sessao_s=args.expira_sessao_s,
+        ))
+        CFG.usar_base_url(base_url(servidor))
+    CFG.timeout = args.timeout
+
+    autos = [f"E{100000 + i:07d}" for i in range(args.autos)]
+    try:
+        rel = rodar(autos, args)
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+
+    lat = rel["latencia_s"]
+    print(
+        f"{rel['autos']} autos em {rel['duracao_s']}s ({rel['backend']}, {rel['workers']} worker(s)): "
+        f"{rel['autos_por_min']} autos/min | p50 {lat['p50']}s p95 {lat['p95']}s p99 {lat['p99']}s | "
+        f"pico RSS {rel['pico_rss_mb']} MB | {rel['status']}"
+    )
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(rel, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
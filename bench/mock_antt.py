@@ -0,0 +1,364 @@
+"""
+Servidor local que imita a estrutura do site da ANTT da qual o robô depende:
+Login.aspx, ConsultaProcessoSituacao.aspx (txbAutoInfracao / btnPesquisar /
+gdvAutoInfracao_btnEditar_0), o detalhe aberto por window.open com os campos
+ucDetalheAutoInfracao5083_* e a gdvDocumentosProcesso, respostas "Nenhum
+registro" e páginas "Exceção de Sistema".
+
+Latência, taxa de erro e expiração de sessão são configuráveis.
+
+    python bench/mock_antt.py --porta 8765 --latencia-ms 300 --taxa-erro 0.02
+"""
+import os
+import sys
+import html
+import time
+import random
+import hashlib
+import argparse
+import threading
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from antt_core import (  # noqa: E402
+    ID_AUTO,
+    ID_BTN_OK,
+    ID_CODIGO,
+    ID_DATA_INFRACAO,
+    ID_DOCUMENTOS,
+    ID_EDITAR_0,
+    ID_FATO,
+    ID_PESQUISAR,
+    ID_PROCESSO,
+    ID_SENHA,
+    ID_USUARIO,
+    PATH_CONSULTA,
+    PATH_LOGIN,
+)
+
+PATH_HOME = "/spm/Site/Default.aspx"
+PATH_DETALHE = "/spm/Site/DefesaCTB/DetalheAutoInfracao.aspx"
+PATH_RECURSOS = "/spm/Site/recursos/"
+# Recursos estáticos referenciados por toda página, como no site real
+# (o perfil enxuto do SeleniumRuntime deve bloqueá-los).
+RECURSOS = {
+    "site.css": "text/css",
+    "tema.css": "text/css",
+    "logo.png": "image/png",
+    "banner.jpg": "image/jpeg",
+    "fonte.woff2": "font/woff2",
+}
+COOKIE = "ASP.NET_SessionId"
+
+
+def nome_aspnet(el_id: str) -> str:
+    """ContentPlaceHolderCorpo_..._txbX -> ctl00$ContentPlaceHolderCorpo$...$txbX"""
+    return "ctl00$" + el_id.replace("_", "$")
+
+
+@dataclass
+class MockConfig:
+    latencia_ms: float = 0.0
+    jitter_ms: float = 0.0
+    taxa_erro: float = 0.0
+    expira_sessao_s: float = 0.0  # 0 = nunca
+    usuario: str = ""  # vazio = aceita qualquer credencial não vazia
+    senha: str = ""
+    taxa_nao_encontrado: float = 0.1
+    seed: int = 42
+    tamanho_recursos_kb: int = 0  # 0 = páginas sem recursos estáticos
+
+
+class MockState:
+    def __init__(self, cfg: MockConfig):
+        self.cfg = cfg
+        self.lock = threading.Lock()
+        self.sessoes: Dict[str, float] = {}  # id -> criada_em
+        self.rng = random.Random(cfg.seed)
+        self.requisicoes = 0
+
+    def nova_sessao(self) -> str:
+        sid = uuid.uuid4().hex
+        with self.lock:
+            self.sessoes[sid] = time.time()
+        return sid
+
+    def sessao_valida(self, sid: Optional[str]) -> bool:
+        with self.lock:
+            criada = self.sessoes.get(sid or "")
+            if criada is None:
+                return False
+            if self.cfg.expira_sessao_s and time.time() - criada > self.cfg.expira_sessao_s:
+                del self.sessoes[sid]
+                return False
+            return True
+
+    def sortear_erro(self) -> bool:
+        with self.lock:
+            self.requisicoes += 1
+            return self.rng.random() < self.cfg.taxa_erro
+
+
+def dados_do_auto(auto: str, taxa_nao_encontrado: float) -> Optional[Dict[str, object]]:
+    """Dados determinísticos por auto (o mesmo auto sempre devolve o mesmo resultado)."""
+    h = int(hashlib.sha256(auto.encode("utf-8")).hexdigest(), 16)
+    if auto.upper().startswith("X") or (h % 1000) / 1000.0 < taxa_nao_encontrado:
+        return None
+    n_docs = h % 5
+    docs = [
+        (f"DOC{(h >> i) % 9999:04d}", f"Andamento {i + 1} do auto {auto}", "ANTT", f"{1 + i % 28:02d}/0{1 + i % 9}/2024")
+        for i in range(n_docs)
+    ]
+    return {
+        "processo": f"50500.{h % 1000000:06d}/2024-{h % 97:02d}",
+        "data_infracao": f"{1 + h % 28:02d}/{1 + h % 12:02d}/2023",
+        "codigo": f"{h % 900 + 100}",
+        "fato": f"Fato gerador simulado para {auto}",
+        "documentos": docs,
+    }
+
+
+def tags_recursos() -> str:
+    tags = []
+    for nome, tipo in RECURSOS.items():
+        url = PATH_RECURSOS + nome
+        if tipo == "text/css":
+            tags.append(f'<link rel="stylesheet" href="{url}">')
+        elif tipo.startswith("image/"):
+            tags.append(f'<img src="{url}" alt="">')
+        else:
+            tags.append(f'<link rel="preload" as="font" type="{tipo}" href="{url}" crossorigin>')
+    return "\n".join(tags)
+
+
+def pagina(titulo: str, corpo: str, viewstate: str = "") -> str:
+    vs = viewstate or uuid.uuid4().hex
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{titulo}</title></head>
+<body>
+<form method="post" action="" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{vs}">
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{vs[::-1]}">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="">
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="">
+{corpo}
+</form>
+</body></html>"""
+
+
+def pagina_login() -> str:
+    return pagina("Login", f"""
+<input type="text" id="{ID_USUARIO}" name="{nome_aspnet(ID_USUARIO)}">
+<input type="password" id="{ID_SENHA}" name="{nome_aspnet(ID_SENHA)}">
+<input type="submit" id="{ID_BTN_OK}" name="{nome_aspnet(ID_BTN_OK)}" value="OK">
+""")
+
+
+def pagina_excecao() -> str:
+    return "<html><body><h1>Exceção de Sistema</h1><p>Ocorreu um erro inesperado.</p></body></html>"
+
+
+def pagina_consulta(auto: str = "", resultado: str = "", script: str = "") -> str:
+    return pagina("Consulta", f"""
+<input type="text" id="{ID_AUTO}" name="{nome_aspnet(ID_AUTO)}" value="{html.escape(auto)}">
+<input type="submit" id="{ID_PESQUISAR}" name="{nome_aspnet(ID_PESQUISAR)}" value="Pesquisar">
+<div id="resultado">{resultado}</div>
+{script}
+""")
+
+
+def grade_resultado(auto: str) -> str:
+    return f"""
+<table id="ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_ContentPlaceHolderCorpo_gdvAutoInfracao">
+<tr><th></th><th>Auto</th></tr>
+<tr><td><input type="submit" id="{ID_EDITAR_0}" name="{nome_aspnet(ID_EDITAR_0)}" value="Editar"></td>
+<td>{html.escape(auto)}</td></tr>
+</table>
+<input type="hidden" name="auto_atual" value="{html.escape(auto)}">
+"""
+
+
+def pagina_detalhe(d: Dict[str, object]) -> str:
+    linhas = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(c)}</td>" for c in doc) + "</tr>" for doc in d["documentos"]
+    )
+    return pagina("Detalhe", f"""
+<input type="text" id="{ID_PROCESSO}" value="{d['processo']}" readonly>
+<input type="text" id="{ID_DATA_INFRACAO}" value="{d['data_infracao']}" readonly>
+<input type="text" id="{ID_CODIGO}" value="{d['codigo']}" readonly>
+<textarea id="{ID_FATO}" readonly>{html.escape(str(d['fato']))}</textarea>
+<table id="{ID_DOCUMENTOS}">
+<tr><th>Documento</th><th>Descrição</th><th>Origem</th><th>Data</th></tr>
+{linhas}
+</table>
+""")
+
+
+def criar_handler(state: MockState):
+    cfg = state.cfg
+    conteudo_recurso = b"/*" + b"x" * max(0, cfg.tamanho_recursos_kb * 1024 - 4) + b"*/"
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):  # silencioso
+            pass
+
+        def _esperar(self):
+            if cfg.latencia_ms or cfg.jitter_ms:
+                ms = cfg.latencia_ms + random.uniform(-cfg.jitter_ms, cfg.jitter_ms)
+                time.sleep(max(0.0, ms) / 1000.0)
+
+        def _sessao(self) -> Optional[str]:
+            for parte in (self.headers.get("Cookie") or "").split(";"):
+                k, _, v = parte.strip().partition("=")
+                if k == COOKIE:
+                    return v
+            return None
+
+        def _responder(self, corpo: str, status: int = 200, headers: Optional[Dict[str, str]] = None):
+            if cfg.tamanho_recursos_kb and "<body>" in corpo:
+                corpo = corpo.replace("<body>", "<body>\n" + tags_recursos(), 1)
+            dados = corpo.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _redirecionar(self, destino: str, headers: Optional[Dict[str, str]] = None):
+            h = {"Location": destino}
+            h.update(headers or {})
+            self._responder("", 302, h)
+
+        def _form(self) -> Dict[str, str]:
+            n = int(self.headers.get("Content-Length") or 0)
+            bruto = self.rfile.read(n).decode("utf-8") if n else ""
+            return {k: v[0] for k, v in parse_qs(bruto, keep_blank_values=True).items()}
+
+        def do_GET(self):
+            self._esperar()
+            url = urlparse(self.path)
+            if url.path == PATH_LOGIN:
+                return self._responder(pagina_login())
+            if url.path == PATH_HOME:
+                return self._responder("<html><body>Bem-vindo</body></html>")
+            if url.path.startswith(PATH_RECURSOS):
+                tipo = RECURSOS.get(url.path[len(PATH_RECURSOS):])
+                if tipo is None:
+                    return self._responder("", 404)
+                self.send_response(200)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(conteudo_recurso)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(conteudo_recurso)
+                return
+
+            if not state.sessao_valida(self._sessao()):
+                return self._redirecionar(PATH_LOGIN)
+            if state.sortear_erro():
+                return self._responder(pagina_excecao())
+
+            if url.path == PATH_CONSULTA:
+                return self._responder(pagina_consulta())
+            if url.path == PATH_DETALHE:
+                auto = parse_qs(url.query).get("auto", [""])[0]
+                d = dados_do_auto(auto, cfg.taxa_nao_encontrado)
+                if d is None:
+                    return self._responder(pagina_excecao())
+                return self._responder(pagina_detalhe(d))
+            self._responder("<html><body>404</body></html>", 404)
+
+        def do_POST(self):
+            self._esperar()
+            url = urlparse(self.path)
+            form = self._form()
+
+            if url.path == PATH_LOGIN:
+                u = form.get(nome_aspnet(ID_USUARIO), "")
+                s = form.get(nome_aspnet(ID_SENHA), "")
+                ok = (u == cfg.usuario and s == cfg.senha) if cfg.usuario else (u and s)
+                if not ok:
+                    return self._responder(pagina_login())
+                sid = state.nova_sessao()
+                return self._redirecionar(PATH_HOME, {"Set-Cookie": f"{COOKIE}={sid}; Path=/; HttpOnly"})
+
+            if url.path != PATH_CONSULTA:
+                return self._responder("<html><body>404</body></html>", 404)
+            if not state.sessao_valida(self._sessao()):
+                return self._redirecionar(PATH_LOGIN)
+            if state.sortear_erro():
+                return self._responder(pagina_excecao())
+
+            auto = form.get(nome_aspnet(ID_AUTO), "").strip()
+            if nome_aspnet(ID_EDITAR_0) in form:
+                auto_atual = form.get("auto_atual", auto)
+                script = (
+                    "<script>window.open('DetalheAutoInfracao.aspx?auto="
+                    f"{html.escape(auto_atual)}', '_blank', 'width=900,height=700');</script>"
+                )
+                return self._responder(pagina_consulta(auto, grade_resultado(auto_atual), script))
+
+            if dados_do_auto(auto, cfg.taxa_nao_encontrado) is None:
+                return self._responder(pagina_consulta(auto, "<span>Nenhum registro encontrado.</span>"))
+            return self._responder(pagina_consulta(auto, grade_resultado(auto)))
+
+    return Handler
+
+
+def iniciar_mock(cfg: MockConfig, host: str = "127.0.0.1", porta: int = 0) -> ThreadingHTTPServer:
+    """Sobe o servidor numa thread daemon; `server.server_address` tem a porta real."""
+    server = ThreadingHTTPServer((host, porta), criar_handler(MockState(cfg)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-antt", daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, porta = server.server_address[:2]
+    return f"http://{host}:{porta}"
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Mock local do site da ANTT para testes e benchmark.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--porta", type=int, default=8765)
+    p.add_argument("--latencia-ms", type=float, default=0.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de respostas 'Exceção de Sistema'.")
+    p.add_argument("--taxa-nao-encontrado", type=float, default=0.1)
+    p.add_argument("--expira-sessao-s", type=float, default=0.0, help="0 = sessão não expira.")
+    p.add_argument("--tamanho-recursos-kb", type=int, default=0, help="CSS/imagens/fontes por página (0 = nenhum).")
+    p.add_argument("--usuario", default="")
+    p.add_argument("--senha", default="")
+    args = p.parse_args(argv)
+
+    cfg = MockConfig(
+        latencia_ms=args.latencia_ms,
+        jitter_ms=args.jitter_ms,
+        taxa_erro=args.taxa_erro,
+        expira_sessao_s=args.expira_sessao_s,
+        usuario=args.usuario,
+        senha=args.senha,
+        taxa_nao_encontrado=args.taxa_nao_encontrado,
+        tamanho_recursos_kb=args.tamanho_recursos_kb,
+    )
+    server = ThreadingHTTPServer((args.host, args.porta), criar_handler(MockState(cfg)))
+    print(f"Mock ANTT em http://{args.host}:{args.porta}{PATH_LOGIN}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Compara o SeleniumRuntime com e sem o perfil enxuto (CFG.perfil_enxuto)
+contra o mock local: tempo de carga da página de consulta, latência por auto
+e memória (RSS) dos renderers e da árvore chromedriver + Chromium.
+
+    python bench/perfil_navegador.py -n 30 --cargas 20 --tamanho-recursos-kb 200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from antt_core import (  # noqa: E402
+    CFG,
+    SeleniumRuntime,
+    ensure_session,
+    percentil,
+    processar_auto_com_recuperacao,
+)
+from mock_antt import MockConfig, base_url, iniciar_mock  # noqa: E402
+
+PERFIS = (("padrao", False), ("enxuto", True))
+
+
+def medir_perfil(enxuto: bool, args) -> Dict[str, Any]:
+    CFG.perfil_enxuto = enxuto
+    rt = SeleniumRuntime()
+    try:
+        t0 = time.perf_counter()
+        if not ensure_session(rt, args.usuario, args.senha, headless=not args.sem_headless, debug=args.debug):
+            raise RuntimeError("login no mock falhou")
+        inicio = time.perf_counter() - t0
+
+        cargas = []
+        for _ in range(args.cargas):
+            t0 = time.perf_counter()
+            rt.driver.get(CFG.url_consulta)
+            cargas.append(time.perf_counter() - t0)
+
+        latencias = []
+        pico_renderer = pico_total = 0
+        for i in range(args.autos):
+            t0 = time.perf_counter()
+            processar_auto_com_recuperacao(
+                rt, f"E{100000 + i:07d}", args.usuario, args.senha,
+                headless=not args.sem_headless, debug=args.debug,
+            )
+            latencias.append(time.perf_counter() - t0)
+            pico_renderer = max(pico_renderer, rt.memoria_kb("renderer"))
+            pico_total = max(pico_total, rt.memoria_kb())
+
+        cargas.sort()
+        latencias.sort()
+        return {
+            "inicio_e_login_s": round(inicio, 2),
+            "carga_consulta_s": {"p50": percentil(cargas, 50), "p95": percentil(cargas, 95)},
+            "auto_s": {"p50": percentil(latencias, 50), "p95": percentil(latencias, 95)},
+            "pico_renderer_mb": round(pico_renderer / 1024.0, 1),
+            "pico_navegador_mb": round(pico_total / 1024.0, 1),
+        }
+    finally:
+        rt.stop()
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Relatório do perfil enxuto do Chromium.")
+    p.add_argument("-n", "--autos", type=int, default=30)
+    p.add_argument("--cargas", type=int, default=20, help="Cargas da página de consulta medidas.")
+    p.add_argument("--latencia-ms", type=float, default=50.0)
+    p.add_argument("--tamanho-recursos-kb", type=int, default=200)
+    p.add_argument("--usuario", default="bench")
+    p.add_argument("--senha", default="bench")
+    p.add_argument("--sem-headless", action="store_true")
+    p.add_argument("--debug", action="store_true")
+    p.add_argument("--saida", default="", help="Grava o relatório em JSON neste caminho.")
+    args = p.parse_args(argv)
+
+    servidor = iniciar_mock(MockConfig(
+        latencia_ms=args.latencia_ms,
+        tamanho_recursos_kb=args.tamanho_recursos_kb,
+    ))
+    CFG.usar_base_url(base_url(servidor))
+    CFG.reusar_sessao = False  # cada perfil paga o próprio login
+    try:
+        rel = {nome: medir_perfil(enxuto, args) for nome, enxuto in PERFIS}
+    finally:
+        servidor.shutdown()
+
+    print(f"{'':8} {'carga p50':>10} {'carga p95':>10} {'auto p50':>9} {'auto p95':>9} {'renderer':>10} {'navegador':>10}")
+    for nome, r in rel.items():
+        print(
+            f"{nome:8} {r['carga_consulta_s']['p50']:>9}s {r['carga_consulta_s']['p95']:>9}s "
+            f"{r['auto_s']['p50']:>8}s {r['auto_s']['p95']:>8}s "
+            f"{r['pico_renderer_mb']:>7} MB {r['pico_navegador_mb']:>7} MB"
+        )
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(rel, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
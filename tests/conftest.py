@@ -0,0 +1,47 @@
+import os
+import sys
+from dataclasses import fields, replace
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "bench"))
+
+from antt_core import CFG, Config  # noqa: E402
+from mock_antt import MockConfig, base_url, iniciar_mock  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def cfg_isolado(tmp_path):
+    """Diretórios do CFG no tmp_path do teste; o CFG volta ao que era no fim (a CLI o altera)."""
+    salvo = replace(CFG)
+    for nome in ("jobs_dir", "cache_dir", "metricas_dir", "sessao_dir", "shards_dir"):
+        diretorio = tmp_path / nome
+        diretorio.mkdir()
+        setattr(CFG, nome, str(diretorio))
+    yield CFG
+    for f in fields(Config):
+        setattr(CFG, f.name, getattr(salvo, f.name))
+
+
+@pytest.fixture
+def subir_mock():
+    """
+    Sobe o mock do site (bench/mock_antt.py) e aponta o CFG para ele.
+    `servidor.mock_cfg` é a MockConfig em uso (alterável com o mock no ar).
+    """
+    servidores = []
+
+    def subir(**kwargs):
+        mock_cfg = MockConfig(**{"usuario": "u", "senha": "p", "taxa_nao_encontrado": 0.0, **kwargs})
+        servidor = iniciar_mock(mock_cfg)
+        servidor.mock_cfg = mock_cfg
+        servidores.append(servidor)
+        CFG.usar_base_url(base_url(servidor))
+        return servidor
+
+    yield subir
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
@@ -0,0 +1,190 @@
+"""Pipeline de abas (SlotAba/processar_autos_em_abas) com um navegador falso no lugar do Chromium."""
+import json
+
+from antt_core import (
+    ID_AUTO,
+    ID_EDITAR_0,
+    ID_PESQUISAR,
+    JS_DESFECHO_BUSCA,
+    JS_ESTADO_CONSULTA,
+    JS_ESTADO_DETALHE,
+    JS_EXTRAIR_DETALHE,
+    JS_MARCAR_BUSCA,
+    JS_NAVEGAR,
+    JS_PREPARAR_CAPTURA,
+    SeleniumRuntime,
+    processar_autos_em_abas,
+)
+
+CLICAR = "document.getElementById(arguments[0]).click();"
+LER_DESTINO = "return sessionStorage.getItem('anttDetalheUrl');"
+LIMPAR_CAPTURA = "sessionStorage.removeItem('anttCapturar');"
+
+
+class Aba:
+    def __init__(self):
+        self.pagina = "blank"
+        self.auto = ""
+        self.carregando = 0  # sondagens até o documento novo ficar pronto
+        self.destino = None
+
+
+class Campo:
+    def __init__(self, aba):
+        self.aba = aba
+
+    def clear(self):
+        self.aba.auto = ""
+
+    def send_keys(self, texto):
+        self.aba.auto += texto
+
+
+class NavegadorFalso:
+    """
+    Cada aba é uma pequena máquina de estados do site: consulta → desfecho da
+    pesquisa → destino do btnEditar_0 → detalhe. `desfechos` diz, por auto, o
+    que cada pesquisa sucessiva devolve ("resultado", "nenhum" ou "excecao").
+    """
+
+    def __init__(self, url_consulta, desfechos):
+        self.url_consulta = url_consulta
+        self.desfechos = {auto: list(seq) for auto, seq in desfechos.items()}
+        self.abas = {"main": Aba()}
+        self.focada = "main"
+        self.criadas = 0
+        self.passos = []  # (ação, auto), na ordem em que o navegador as viu
+        self.switch_to = self
+
+    # switch_to
+    def window(self, handle):
+        self.focada = handle
+
+    def new_window(self, tipo):
+        self.criadas += 1
+        handle = f"aba{self.criadas}"
+        self.abas[handle] = Aba()
+        self.focada = handle
+
+    @property
+    def window_handles(self):
+        return list(self.abas)
+
+    @property
+    def current_window_handle(self):
+        return self.focada
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def find_element(self, by, valor):
+        aba = self.abas[self.focada]
+        assert valor == ID_AUTO and aba.pagina == "consulta"
+        return Campo(aba)
+
+    def execute_script(self, js, *args):
+        aba = self.abas[self.focada]
+        if js in (JS_ESTADO_CONSULTA, JS_DESFECHO_BUSCA, JS_ESTADO_DETALHE) and aba.carregando:
+            aba.carregando -= 1
+            return None
+        if js == JS_NAVEGAR:
+            url = args[0]
+            if url == self.url_consulta:
+                aba.pagina = "consulta"
+            else:
+                aba.pagina, aba.auto = "detalhe", url.rsplit("=", 1)[1]
+            aba.carregando = 2
+        elif js == JS_ESTADO_CONSULTA:
+            return "pronta" if aba.pagina == "consulta" else "outra"
+        elif js == CLICAR and args[0] == ID_PESQUISAR:
+            self.passos.append(("pesquisa", aba.auto))
+            aba.pagina = self.desfechos[aba.auto].pop(0)
+            aba.carregando = 3
+        elif js == JS_DESFECHO_BUSCA:
+            return aba.pagina if aba.pagina in ("resultado", "nenhum", "excecao") else None
+        elif js == CLICAR and args[0] == ID_EDITAR_0:
+            aba.destino = f"{self.url_consulta}?detalhe={aba.auto}"
+        elif js == LER_DESTINO:
+            return aba.destino
+        elif js == JS_PREPARAR_CAPTURA:
+            aba.destino = None
+        elif js == JS_ESTADO_DETALHE:
+            return "ok" if aba.pagina == "detalhe" else None
+        elif js == JS_EXTRAIR_DETALHE:
+            self.passos.append(("detalhe", aba.auto))
+            campos = {k: f"{k} de {aba.auto}" for k in args[0]}
+            documentos = [["Data", "Andamento"], ["1", f"Julgado {aba.auto}", "-", "02/03/2026"]]
+            return json.dumps({"campos": campos, "documentos": documentos})
+        elif js not in (JS_MARCAR_BUSCA, LIMPAR_CAPTURA):
+            raise AssertionError(f"script inesperado: {js[:60]}")
+        return None
+
+
+def runtime_com(navegador, cfg):
+    rt = SeleniumRuntime()
+    rt.cfg = cfg
+    rt.driver = navegador
+    rt.janela_main = "main"
+    return rt
+
+
+def test_autos_andam_juntos_e_voltam_na_ordem(cfg_isolado):
+    nav = NavegadorFalso(cfg_isolado.url_consulta, {
+        "AI1": ["resultado"],
+        "AI2": ["nenhum"],
+        "AI3": ["excecao", "resultado"],
+    })
+    rt = runtime_com(nav, cfg_isolado)
+
+    res = processar_autos_em_abas(rt, ["AI1", "AI2", "AI3"])
+
+    assert [r["status"] for r in res] == ["sucesso", "nao_encontrado", "sucesso"]
+    assert res[0]["dados"]["andamento"] == "Julgado AI1"
+    assert res[0]["dados"]["data_andamento"] == "02/03/2026"
+    assert all(v.endswith("de AI1") for k, v in res[0]["dados"].items() if k not in ("andamento", "data_andamento"))
+    assert res[2]["dados"]["andamento"] == "Julgado AI3"
+    assert "busca_2" in res[2]["tempos"]  # a exceção do site foi repetida na mesma aba
+    assert rt.excecoes == 1
+
+    # As três pesquisas saem antes do primeiro detalhe ser lido: os autos
+    # esperam o site ao mesmo tempo, não um depois do outro.
+    primeiro_detalhe = nav.passos.index(("detalhe", "AI1"))
+    assert {a for acao, a in nav.passos[:primeiro_detalhe] if acao == "pesquisa"} == {"AI1", "AI2", "AI3"}
+
+    # Três pares (consulta, detalhe), o primeiro na janela principal; o foco volta para ela.
+    assert len(rt.abas) == 3 and rt.abas[0][0] == "main"
+    assert len({h for par in rt.abas for h in par}) == 6
+    assert nav.focada == "main"
+
+    # O próximo lote reaproveita as abas.
+    nav.desfechos.update({"AI4": ["nenhum"], "AI5": ["resultado"]})
+    res = processar_autos_em_abas(rt, ["AI4", "AI5"])
+    assert [r["status"] for r in res] == ["nao_encontrado", "sucesso"]
+    assert len(nav.abas) == 6
+
+
+def test_excecao_repetida_desiste_na_terceira(cfg_isolado):
+    nav = NavegadorFalso(cfg_isolado.url_consulta, {"AI1": ["excecao"] * 3, "AI2": ["resultado"]})
+    rt = runtime_com(nav, cfg_isolado)
+
+    res = processar_autos_em_abas(rt, ["AI1", "AI2"])
+
+    assert res[0]["status"] == "erro" and "Exceção de Sistema" in res[0]["mensagem"]
+    assert res[1]["status"] == "sucesso"
+    assert nav.passos.count(("pesquisa", "AI1")) == 3
+    assert rt.excecoes == 3
+
+
+def test_par_com_aba_fechada_e_refeito(cfg_isolado):
+    nav = NavegadorFalso(cfg_isolado.url_consulta, {"AI1": ["resultado"] * 2, "AI2": ["resultado"] * 2})
+    rt = runtime_com(nav, cfg_isolado)
+    processar_autos_em_abas(rt, ["AI1", "AI2"])
+    fechada = rt.abas[1][1]
+    del nav.abas[fechada]  # o usuário (ou um crash da aba) fechou o detalhe do slot 1
+
+    res = processar_autos_em_abas(rt, ["AI1", "AI2"])
+
+    assert [r["status"] for r in res] == ["sucesso", "sucesso"]
+    handles = [h for par in rt.abas for h in par]
+    assert len(rt.abas) == 2 and fechada not in handles
+    assert set(handles) <= set(nav.window_handles)
@@ -0,0 +1,46 @@
+import datetime as dt
+
+import pandas as pd
+
+from antt_core import CFG, copiar_config, ensure_output_columns, linhas_para_atualizar, modo_atualizacao
+
+AGORA = dt.datetime(2026, 10, 17, 12, 0, 0)
+
+
+def resultado_anterior(linhas):
+    df = pd.DataFrame(linhas, columns=[CFG.col_auto, CFG.col_andamento, CFG.col_consultado_em])
+    return ensure_output_columns(df)
+
+
+def test_pula_andamentos_finais_e_consultas_recentes():
+    recente = (AGORA - dt.timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+    antiga = (AGORA - dt.timedelta(days=10)).strftime("%Y-%m-%d %H:%M:%S")
+    df = resultado_anterior([
+        ["A1", "  processo   ARQUIVADO ", antiga],  # final, com espaços e caixa diferentes
+        ["A2", "Em análise", recente],
+        ["A3", "Em análise", antiga],
+        ["A4", "", ""],                            # nunca consultado
+        ["A5", "Em análise", "17/10/2026"],        # data ilegível: reconsulta
+    ])
+    selecao, motivos = linhas_para_atualizar(df, agora=AGORA.timestamp())
+    assert selecao.tolist() == [False, False, True, True, True]
+    assert motivos == {"finais": 1, "recentes": 1}
+
+
+def test_usa_a_configuracao_do_job():
+    cfg = copiar_config()
+    cfg.andamentos_finais = ("Em análise",)
+    cfg.atualizar_apos_h = 0.0
+    df = resultado_anterior([["A1", "Em análise", ""], ["A2", "Processo Arquivado", ""]])
+    selecao, motivos = linhas_para_atualizar(df, agora=AGORA.timestamp(), cfg=cfg)
+    assert selecao.tolist() == [False, True]
+    assert modo_atualizacao(cfg) != modo_atualizacao()
+
+
+def test_colunas_vem_da_configuracao_do_job():
+    cfg = copiar_config()
+    cfg.col_andamento = "Andamento"
+    cfg.col_consultado_em = "Data da consulta"
+    df = pd.DataFrame({"Andamento": ["Processo Arquivado", "Em análise"], "Data da consulta": ["", ""]})
+    selecao, _ = linhas_para_atualizar(df, agora=AGORA.timestamp(), cfg=cfg)
+    assert selecao.tolist() == [False, True]
@@ -0,0 +1,69 @@
+import sqlite3
+import time
+
+import pandas as pd
+import pytest
+
+from antt_core import CFG, ResultCache, aplicar_resultado, registro_journal
+
+SUCESSO = {"status": "sucesso", "dados": {"processo": "50500.1/2024"}, "mensagem": "OK"}
+NAO_ENCONTRADO = {"status": "nao_encontrado", "dados": {}, "mensagem": "Nenhum registro"}
+
+
+@pytest.fixture
+def cache():
+    return ResultCache(CFG.cache_dir, ttl_sucesso_h=24.0, ttl_nao_encontrado_h=1.0, max_mb=64.0)
+
+
+def test_guarda_so_desfechos_definitivos(cache):
+    cache.put("A1", SUCESSO)
+    cache.put("A2", {"status": "erro", "dados": {}, "mensagem": "Timeout"})
+    guardado = cache.get("A1")
+    assert {k: v for k, v in guardado.items() if k != "ts"} == {**SUCESSO, "cache": True}
+    assert cache.get("A2") is None
+
+
+def test_ttl_por_status(cache, monkeypatch):
+    cache.put("A1", SUCESSO)
+    cache.put("A2", NAO_ENCONTRADO)
+    agora = time.time()
+    monkeypatch.setattr(time, "time", lambda: agora + 2 * 3600)
+    assert cache.get("A1") is not None
+    assert cache.get("A2") is None
+
+
+def test_acerto_de_cache_mantem_a_data_da_consulta(cache, monkeypatch):
+    consulta = time.mktime((2024, 3, 1, 10, 30, 0, 0, 0, -1))
+    monkeypatch.setattr(time, "time", lambda: consulta)
+    cache.put("A1", SUCESSO)
+    monkeypatch.setattr(time, "time", lambda: consulta + 3600)
+    res = cache.get("A1")
+
+    df = pd.DataFrame({CFG.col_auto: ["A1"], CFG.col_status: [""], CFG.col_consultado_em: [""]})
+    aplicar_resultado(df, 0, res)
+    assert df.at[0, CFG.col_consultado_em] == "2024-03-01 10:30:00"
+    assert registro_journal(0, 0, "A1", res)["ts"] == "2024-03-01 10:30:00"
+
+
+def test_evict_remove_as_mais_antigas_numa_passada(cache):
+    cache.max_bytes = 256 * 1024
+    grande = {**SUCESSO, "dados": {"fato": "x" * 400}}
+    for i in range(2000):
+        cache.put(f"A{i:05d}", grande)
+    # put chama evict a cada 200; uma chamada extra deixa o banco abaixo do limite.
+    cache.evict()
+    assert cache.tamanho_bytes() <= cache.max_bytes
+    assert cache.get("A00000") is None
+    assert cache.get("A01999") is not None
+    assert cache.evict() == 0
+
+
+def test_banco_antigo_e_convertido_para_incremental(tmp_path):
+    path = tmp_path / "resultados.sqlite3"
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE resultados (auto TEXT PRIMARY KEY, status TEXT NOT NULL,"
+                " mensagem TEXT, dados TEXT, ts REAL NOT NULL)")
+    con.commit()
+    con.close()
+    cache = ResultCache(str(tmp_path), 1.0, 1.0, 1.0)
+    assert cache._con().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
@@ -0,0 +1,79 @@
+import json
+import os
+
+import pandas as pd
+
+from antt_core import (
+    CFG,
+    CheckpointJournal,
+    FALHA_TRANSITORIA,
+    ensure_output_columns,
+    journal_offset,
+    load_checkpoint,
+    paths_for_job,
+    registro_journal,
+)
+
+SUCESSO = {"status": "sucesso", "dados": {"processo": "50500.1/2024"}, "mensagem": "OK"}
+NAO_ENCONTRADO = {"status": "nao_encontrado", "dados": {}, "mensagem": "Nenhum registro"}
+TRANSITORIA = {"status": "erro", "dados": {}, "mensagem": "Erro fluxo: Exceção de Sistema", "falha": FALHA_TRANSITORIA}
+
+
+def planilha(n=4):
+    return ensure_output_columns(pd.DataFrame({CFG.col_auto: [f"A{i:04d}" for i in range(n)]}))
+
+
+def gravar(job_id, registros):
+    journal = CheckpointJournal(job_id, fsync_every=2)
+    try:
+        for pos, res in registros:
+            journal.append(registro_journal(pos, pos, f"A{pos:04d}", res))
+    finally:
+        journal.close()
+
+
+def test_sem_diario_nao_ha_checkpoint():
+    assert load_checkpoint(planilha(), "nada") is None
+
+
+def test_retomada_reaplica_o_diario():
+    gravar("job", [(0, SUCESSO), (1, NAO_ENCONTRADO), (2, TRANSITORIA)])
+    df = planilha()
+    meta = load_checkpoint(df, "job")
+    assert meta["cursor"] == 3
+    assert (meta["ok"], meta["fail"]) == (1, 2)
+    assert meta["adiados"] == [2]
+    assert df.at[0, CFG.col_processo] == "50500.1/2024"
+    assert df.at[3, CFG.col_status] == ""
+
+
+def test_rodada_adiada_que_deu_certo_sai_dos_adiados():
+    gravar("job", [(0, TRANSITORIA), (1, SUCESSO), (0, SUCESSO)])
+    meta = load_checkpoint(planilha(), "job")
+    assert meta["adiados"] == []
+    assert (meta["ok"], meta["fail"]) == (2, 0)
+
+
+def test_linha_truncada_no_fim_e_ignorada_e_reparada():
+    gravar("job", [(0, SUCESSO), (1, SUCESSO)])
+    path = paths_for_job("job")["journal"]
+    with open(path, "ab") as f:
+        f.write(json.dumps(registro_journal(2, 2, "A0002", SUCESSO)).encode("utf-8")[:25])
+
+    assert load_checkpoint(planilha(), "job")["cursor"] == 2
+    # Reaberto para continuar, o diário perde a linha truncada antes do próximo registro.
+    gravar("job", [(2, NAO_ENCONTRADO)])
+    with open(path, "rb") as f:
+        linhas = f.read().splitlines()
+    assert [json.loads(linha)["pos"] for linha in linhas] == [0, 1, 2]
+    assert journal_offset("job") == os.path.getsize(path)
+
+
+def test_diario_em_outro_diretorio(tmp_path):
+    outro = tmp_path / "compartilhado"
+    outro.mkdir()
+    journal = CheckpointJournal("job", jobs_dir=str(outro))
+    journal.append(registro_journal(0, 0, "A0000", SUCESSO))
+    journal.close()
+    assert load_checkpoint(planilha(), "job") is None
+    assert load_checkpoint(planilha(), "job", str(outro))["cursor"] == 1
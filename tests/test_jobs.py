@@ -0,0 +1,149 @@
+"""JobManager: isolamento entre sessões da UI e entre jobs simultâneos no mesmo processo."""
+import os
+import time
+
+import pytest
+
+from antt_core import (
+    BACKEND_HTTP,
+    CFG,
+    GerenciadorRuntimes,
+    JobEmUso,
+    JobManager,
+    JobParams,
+    carregar_df_or_checkpoint,
+    copiar_config,
+    make_job_id,
+    novo_runtime,
+    paths_for_job,
+)
+
+
+def carregar_job(manager, tmp_path, nome, n_autos, dono=None, cfg=None):
+    entrada = tmp_path / f"{nome}.csv"
+    autos = [f"AI{nome.upper()}{i:04d}" for i in range(n_autos)]
+    entrada.write_text(CFG.col_auto + "\n" + "\n".join(autos) + "\n", encoding="utf-8")
+    job = manager.obter_ou_criar(make_job_id(entrada.read_bytes()), dono or nome)
+    return job, carregar_df_or_checkpoint(str(entrada), job, cfg=cfg)
+
+
+def test_job_de_outra_sessao_nao_e_recarregado_parado_nem_removido():
+    ativas = {"A", "B"}
+    manager = JobManager(lambda sessao: sessao in ativas)
+    job_id = make_job_id(b"mesma planilha")
+    job = manager.obter_ou_criar(job_id, "A")
+
+    with pytest.raises(JobEmUso):
+        manager.obter_ou_criar(job_id, "B")
+    assert manager.get(job_id, "B") is None
+    assert not manager.parar(job_id, "B")
+    assert not manager.remover(job_id, "B")
+    assert not job.stop_event.is_set()
+    assert manager.get(job_id, "A") is job
+
+    assert manager.remover(job_id, "A")
+    assert job.stop_event.is_set()
+    assert manager.get(job_id, "A") is None
+
+
+def test_job_rodando_nao_e_recarregado_nem_pela_dona():
+    manager = JobManager()
+    job = manager.obter_ou_criar("j", "A")
+    job.running = True
+    with pytest.raises(JobEmUso):
+        manager.obter_ou_criar("j", "A")
+    job.running = False
+    assert manager.obter_ou_criar("j", "A") is job
+
+
+def test_job_parado_de_sessao_encerrada_passa_para_a_nova():
+    ativas = {"A"}
+    manager = JobManager(lambda sessao: sessao in ativas)
+    job = manager.obter_ou_criar("j", "A")
+    ativas.clear()  # a página foi recarregada: a sessão A acabou
+    assert manager.obter_ou_criar("j", "B") is job
+    assert manager.get("j", "A") is None
+    assert manager.get("j", "B") is job
+
+
+def test_jobs_simultaneos_usam_cada_um_a_propria_configuracao(subir_mock, tmp_path):
+    subir_mock(latencia_ms=20)
+    manager = JobManager()
+    jobs = []
+    for nome in ("a", "b"):
+        cfg = copiar_config()
+        cfg.jobs_dir = str(tmp_path / f"jobs_{nome}")
+        cfg.metricas_dir = str(tmp_path / f"metricas_{nome}")
+        os.makedirs(cfg.jobs_dir)
+        os.makedirs(cfg.metricas_dir)
+        job, df = carregar_job(manager, tmp_path, nome, 6, cfg=cfg)
+        params = JobParams(
+            usuario="u", senha="p", backend=BACKEND_HTTP, vazao_adaptativa=False, throttle=0.0,
+            n_workers=2, config=cfg,
+        )
+        manager.iniciar(job, df, params)
+        jobs.append((job, cfg))
+    # Mudar o CFG com os jobs rodando não os afeta.
+    CFG.jobs_dir = str(tmp_path / "nao_usar")
+
+    for job, cfg in jobs:
+        job.thread.join(60)
+        assert not job.running
+        assert job.summary.startswith("Concluído. OK: 6")
+        p = paths_for_job(job.job_id, cfg.jobs_dir)
+        assert os.path.exists(p["journal"]) and os.path.exists(p["result_xlsx"])
+        assert os.path.exists(os.path.join(cfg.metricas_dir, "antt_metrics.json"))
+    assert not os.path.exists(CFG.jobs_dir)
+    assert not os.listdir(CFG.metricas_dir)
+
+
+def test_jobs_esperam_na_fila_e_reaproveitam_o_runtime(subir_mock, tmp_path):
+    subir_mock(latencia_ms=30)
+    criados = []
+
+    def fabrica(backend):
+        criados.append(novo_runtime(backend))
+        return criados[-1]
+
+    gerenciador = GerenciadorRuntimes(1, fabrica=fabrica)
+    manager = JobManager()
+    jobs = []
+
+    def iniciar(nome, n_autos):
+        job, df = carregar_job(manager, tmp_path, nome, n_autos)
+        params = JobParams(
+            usuario="u", senha="p", backend=BACKEND_HTTP, vazao_adaptativa=False, throttle=0.0,
+            n_workers=2, gerenciador=gerenciador,
+        )
+        manager.iniciar(job, df, params)
+        jobs.append(job)
+        return job
+
+    try:
+        a = iniciar("a", 12)
+        espera = time.time() + 10
+        while gerenciador.resumo()["em_uso"] == 0 and time.time() < espera:
+            time.sleep(0.01)
+        b = iniciar("b", 4)
+        c = iniciar("c", 4)
+        espera = time.time() + 10
+        while gerenciador.resumo()["fila"] < 2 and time.time() < espera:
+            time.sleep(0.01)
+        assert gerenciador.resumo()["fila"] == 2
+        # c desiste enquanto espera: sai da fila sem ter consultado nada.
+        manager.parar(c.job_id, "c")
+        c.thread.join(10)
+        assert c.summary.startswith("Interrompido em 0/4")
+
+        for job, n_autos in ((a, 12), (b, 4)):
+            job.thread.join(60)
+            assert job.summary.startswith(f"Concluído. OK: {n_autos} ")
+        assert any("Aguardando runtime livre" in msg for _, _, msg in b.ultimos_logs(100))
+        assert any("segue com 1 de 2" in msg for _, _, msg in a.ultimos_logs(100))
+        # Mesma credencial: b recebeu o runtime (já logado) que a devolveu.
+        assert len(criados) == 1
+        assert gerenciador.resumo()["ociosos"] == 1
+    finally:
+        for job in jobs:
+            job.stop_event.set()
+        gerenciador.encerrar()
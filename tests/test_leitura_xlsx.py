@@ -0,0 +1,200 @@
+import zipfile
+import datetime as dt
+
+import pytest
+from openpyxl import Workbook
+
+from antt_core import (
+    CFG,
+    colunas_entrada,
+    ler_planilha_entrada,
+    ler_xlsx_streaming,
+    linhas_para_atualizar,
+)
+
+
+def salvar(tmp_path, linhas, nome="entrada.xlsx"):
+    wb = Workbook()
+    ws = wb.active
+    for linha in linhas:
+        ws.append(linha)
+    path = tmp_path / nome
+    wb.save(path)
+    return str(path)
+
+
+def test_data_salva_pelo_excel_vira_texto(tmp_path):
+    # O Excel converte o texto "Consultado em" em data ao salvar de novo.
+    path = salvar(tmp_path, [
+        [CFG.col_auto, CFG.col_consultado_em],
+        ["A1", dt.datetime(2026, 10, 17, 18, 39, 34)],
+        ["A2", "2026-10-17 18:39:34"],
+        ["A3", dt.date(2026, 10, 1)],
+        ["A4", 46312.5],
+    ])
+    dados = ler_xlsx_streaming(path, colunas_entrada())
+    assert dados[CFG.col_consultado_em] == [
+        "2026-10-17 18:39:34", "2026-10-17 18:39:34", "2026-10-01 00:00:00", "46312.5",
+    ]
+
+
+def test_atualizacao_nao_reconsulta_data_recente_em_celula_de_data(tmp_path):
+    agora = dt.datetime(2026, 10, 17, 20, 0, 0)
+    path = salvar(tmp_path, [
+        [CFG.col_auto, CFG.col_consultado_em, CFG.col_andamento],
+        ["A1", agora - dt.timedelta(hours=1), "Em análise"],
+        ["A2", agora - dt.timedelta(days=30), "Em análise"],
+    ])
+    df = ler_planilha_entrada(path)
+    selecao, motivos = linhas_para_atualizar(df, agora=agora.timestamp())
+    assert selecao.tolist() == [False, True]
+    assert motivos["recentes"] == 1
+
+
+# -----------------------------------------------------------------------------
+# Planilhas com o XML da aba escrito à mão (strings inline, <c/> sem valor,
+# linhas ausentes, células sem r=...), como as geradas por outros programas.
+# -----------------------------------------------------------------------------
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Planilha1" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+# Estilo 0: geral; 1: data (numFmtId 14, embutido); 2: data/hora personalizado.
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="dd/mm/yyyy\\ hh:mm:ss"/></numFmts>
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="1"><fill><patternFill patternType="none"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+
+def montar_xlsx(tmp_path, linhas_xml: str, strings=(), nome="fixture.xlsx"):
+    sst = "".join(f"<si><t>{s}</t></si>" for s in strings)
+    partes = {
+        "[Content_Types].xml": CONTENT_TYPES,
+        "_rels/.rels": RELS,
+        "xl/workbook.xml": WORKBOOK,
+        "xl/_rels/workbook.xml.rels": WORKBOOK_RELS,
+        "xl/styles.xml": STYLES,
+        "xl/sharedStrings.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            f'count="{len(strings)}" uniqueCount="{len(strings)}">{sst}</sst>'
+        ),
+        "xl/worksheets/sheet1.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f"<sheetData>{linhas_xml}</sheetData></worksheet>"
+        ),
+    }
+    path = tmp_path / nome
+    with zipfile.ZipFile(path, "w") as z:
+        for nome_parte, conteudo in partes.items():
+            z.writestr(nome_parte, conteudo)
+    return str(path)
+
+
+def ler(path):
+    return ler_xlsx_streaming(path, colunas_entrada())
+
+
+def test_strings_compartilhadas_inline_e_celula_vazia(tmp_path):
+    path = montar_xlsx(tmp_path, (
+        f'<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="inlineStr"><is><t>{CFG.col_andamento}</t></is></c></row>'
+        '<row r="2"><c r="A2" t="s"><v>1</v></c><c r="B2" t="inlineStr"><is><t> Em análise </t></is></c></row>'
+        '<row r="3"><c r="A3" t="inlineStr"><is><t>B-2 &amp; 3</t></is></c><c r="B3" s="0"/></row>'
+        '<row r="4"><c r="A4"><v>123</v></c><c r="B4" t="s"><v>1</v></c></row>'
+    ), strings=[CFG.col_auto, "A-1"])
+    dados = ler(path)
+    assert dados[CFG.col_auto] == ["A-1", "B-2 & 3", "123"]
+    assert dados[CFG.col_andamento] == ["Em análise", "", "A-1"]
+
+
+def test_datas_por_estilo(tmp_path):
+    path = montar_xlsx(tmp_path, (
+        f'<row r="1"><c r="A1" t="inlineStr"><is><t>{CFG.col_auto}</t></is></c>'
+        f'<c r="B1" t="inlineStr"><is><t>{CFG.col_consultado_em}</t></is></c></row>'
+        '<row r="2"><c r="A2"><v>1</v></c><c r="B2" s="2"><v>46312.777476851855</v></c></row>'
+        '<row r="3"><c r="A3"><v>2</v></c><c r="B3" s="1"><v>46296</v></c></row>'
+        '<row r="4"><c r="A4"><v>3</v></c><c r="B4" s="0"><v>46296.5</v></c></row>'
+        '<row r="5"><c r="A5"><v>4</v></c><c r="B5" t="d"><v>2026-10-17T18:39:34</v></c></row>'
+    ))
+    dados = ler(path)
+    assert dados[CFG.col_consultado_em] == [
+        "2026-10-17 18:39:34", "2026-10-01 00:00:00", "46296.5", "2026-10-17 18:39:34",
+    ]
+
+
+def test_linhas_em_branco_no_meio_e_no_fim(tmp_path):
+    path = montar_xlsx(tmp_path, (
+        f'<row r="1"><c r="A1" t="inlineStr"><is><t>{CFG.col_auto}</t></is></c></row>'
+        '<row r="2"><c r="A2"><v>1</v></c></row>'
+        '<row r="3"><c r="A3" s="0"/></row>'
+        '<row r="5"><c r="A5"><v>5</v></c></row>'
+        '<row r="6"><c r="A6" s="0"/></row>'
+        '<row r="7"/>'
+    ))
+    dados = ler(path)
+    assert dados[CFG.col_auto] == ["1", "", "", "5"]
+
+
+def test_cabecalho_depois_de_linhas_em_branco(tmp_path):
+    path = montar_xlsx(tmp_path, (
+        '<row r="1"><c r="A1" s="0"/></row>'
+        f'<row r="3"><c r="B3" t="inlineStr"><is><t>{CFG.col_auto}</t></is></c></row>'
+        '<row r="4"><c r="B4"><v>10</v></c></row>'
+        '<row r="5"><c r="B5"><v>11</v></c></row>'
+    ))
+    dados = ler(path)
+    assert dados[CFG.col_auto] == ["10", "11"]
+
+
+def test_cabecalho_repetido_vale_a_primeira_coluna(tmp_path):
+    path = montar_xlsx(tmp_path, (
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>0</v></c></row>'
+        '<row r="2"><c r="A2"><v>1</v></c><c r="B2"><v>99</v></c></row>'
+    ), strings=[CFG.col_auto])
+    dados = ler(path)
+    assert dados[CFG.col_auto] == ["1"]
+
+
+def test_celulas_sem_referencia_sao_lidas_pela_posicao(tmp_path):
+    path = montar_xlsx(tmp_path, (
+        f'<row><c t="inlineStr"><is><t>Outra</t></is></c><c t="inlineStr"><is><t>{CFG.col_auto}</t></is></c></row>'
+        '<row><c><v>7</v></c><c><v>1</v></c></row>'
+        '<row><c><v>8</v></c><c t="inlineStr"><is><t>A-2</t></is></c></row>'
+    ))
+    assert ler(path)[CFG.col_auto] == ["1", "A-2"]
+
+
+def test_sem_coluna_do_auto_falha(tmp_path):
+    path = montar_xlsx(tmp_path, '<row r="1"><c r="A1" t="inlineStr"><is><t>Outra</t></is></c></row>')
+    with pytest.raises(ValueError, match="Coluna obrigatória ausente"):
+        ler(path)
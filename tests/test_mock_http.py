@@ -0,0 +1,98 @@
+"""Backend HTTP e linha de comando contra o mock do site (bench/mock_antt.py)."""
+import time
+from functools import partial
+
+import pandas as pd
+import pytest
+
+import antt_cli
+import antt_core
+from antt_core import (
+    CFG,
+    FALHA_SESSAO,
+    FALHA_TRANSITORIA,
+    MSG_SESSAO_EXPIRADA,
+    DisjuntorFalhas,
+    HttpRuntime,
+    classificar_falha,
+    processar_auto_http,
+    realizar_login_http,
+)
+
+AUTOS = [f"AI{i:06d}" for i in range(10)] + ["X000001", "X000002"]
+
+
+@pytest.fixture
+def runtime():
+    rt = HttpRuntime()
+    rt.start()
+    yield rt
+    rt.stop()
+
+
+def test_consulta_http_sucesso_e_nao_encontrado(subir_mock, runtime):
+    subir_mock()
+    assert realizar_login_http(runtime, "u", "p", debug=False)
+    res = processar_auto_http(runtime, "AI000001")
+    assert res["status"] == "sucesso"
+    assert res["dados"]["processo"].startswith("50500.")
+    assert set(res["tempos"]) >= {"busca", "detalhe"}
+    res = processar_auto_http(runtime, "X000001")
+    assert res["status"] == "nao_encontrado"
+    assert classificar_falha(res) is not None
+
+
+def test_consulta_http_sessao_expirada_e_excecao_de_sistema(subir_mock, runtime):
+    servidor = subir_mock(expira_sessao_s=0.3)
+    assert realizar_login_http(runtime, "u", "p", debug=False)
+    time.sleep(0.5)
+    res = processar_auto_http(runtime, "AI000001")
+    assert res["mensagem"] == MSG_SESSAO_EXPIRADA
+    assert classificar_falha(res) == FALHA_SESSAO
+
+    servidor.mock_cfg.expira_sessao_s = 0.0
+    assert realizar_login_http(runtime, "u", "p", debug=False)
+    servidor.mock_cfg.taxa_erro = 1.0
+    res = processar_auto_http(runtime, "AI000001")
+    assert res["status"] == "erro"
+    assert "Exceção de Sistema" in res["mensagem"]
+    assert classificar_falha(res) == FALHA_TRANSITORIA
+
+
+def rodar_cli(tmp_path, monkeypatch, *extra):
+    monkeypatch.setenv("ANTT_USUARIO", "u")
+    monkeypatch.setenv("ANTT_SENHA", "p")
+    entrada = tmp_path / "entrada.csv"
+    entrada.write_text(CFG.col_auto + "\n" + "\n".join(AUTOS) + "\n", encoding="utf-8")
+    saida = tmp_path / "saida.xlsx"
+    rc = antt_cli.main([
+        str(entrada), "--backend", "http", "--sem-cache", "--vazao-fixa", "--throttle", "0",
+        "--metricas-dir", CFG.metricas_dir, "-o", str(saida), *extra,
+    ])
+    return rc, saida
+
+
+def test_cli_http_gera_o_resultado(subir_mock, tmp_path, monkeypatch, capsys):
+    subir_mock()
+    rc, saida = rodar_cli(tmp_path, monkeypatch, "--workers", "2")
+    assert rc == 0
+    assert "Concluído. OK: 10 | Falhas/Não encontrados: 2" in capsys.readouterr().out
+    df = pd.read_excel(saida, dtype=str).fillna("")
+    assert df[CFG.col_auto].tolist() == AUTOS
+    assert (df[CFG.col_processo] != "").tolist() == [True] * 10 + [False] * 2
+
+    # Rodar de novo retoma do checkpoint: nada a consultar.
+    rc, _ = rodar_cli(tmp_path, monkeypatch)
+    assert rc == 0
+    assert "OK: 10" in capsys.readouterr().out
+
+
+def test_cli_rodadas_adiadas_recuperam_falhas_transitorias(subir_mock, tmp_path, monkeypatch, capsys):
+    # Com 12 autos o disjuntor pode abrir; a pausa curta mantém o teste rápido.
+    monkeypatch.setattr(antt_core, "DisjuntorFalhas", partial(DisjuntorFalhas, pausa_s=0.2))
+    subir_mock(taxa_erro=0.15, seed=7)
+    rc, saida = rodar_cli(tmp_path, monkeypatch, "--retentativas-adiadas", "6", "--backoff-adiados-s", "0")
+    saida_txt = capsys.readouterr().out
+    assert rc == 0
+    assert "Rodada adiada" in saida_txt
+    assert "Concluído. OK: 10 | Falhas/Não encontrados: 2" in saida_txt
@@ -0,0 +1,77 @@
+"""antt_relatorio.resumir sobre um diário de eventos montado à mão."""
+import json
+from datetime import datetime
+
+from antt_core import DISJUNTOR_ABERTO, DISJUNTOR_FECHADO
+from antt_relatorio import formatar, ler_eventos, resumir
+
+T0 = datetime(2026, 3, 2, 9, 58).timestamp()
+
+
+def auto(minutos, n, duracao, status="sucesso", **extra):
+    return {"ts": T0 + minutos * 60, "tipo": "auto", "auto": f"AI{n:04d}", "linha": n + 2,
+            "duracao": duracao, "status": status, "tentativas": 1, **extra}
+
+
+def diario():
+    return [
+        {"ts": T0, "tipo": "inicio", "total": 6},
+        auto(0, 0, 1.0, tempos={"busca_1": 0.4, "detalhe": 0.5}),
+        auto(1, 1, 2.0, tempos={"busca_1": 0.3, "busca_2": 0.9}, tentativas=2, relogins=1),
+        auto(1, 2, 0.0, cache=True),
+        auto(3, 3, 9.0, "erro", falha="transitoria", mensagem="Timeout após 30s no auto 3"),
+        auto(4, 4, 8.0, "erro", falha="transitoria", mensagem="Timeout após 45s no auto 4"),
+        auto(62, 5, 3.0, "nao_encontrado", mensagem="Auto não localizado"),
+        {"ts": T0 + 120, "tipo": "reciclagem"},
+        {"ts": T0 + 130, "tipo": "disjuntor", "estado": DISJUNTOR_ABERTO},
+        {"ts": T0 + 190, "tipo": "disjuntor", "estado": DISJUNTOR_FECHADO},
+        {"ts": T0 + 200, "tipo": "log", "msg": "Worker 1: reiniciando em 5s"},
+        {"ts": T0 + 210, "tipo": "log", "msg": "Worker 2: reiniciando em 10s"},
+        {"ts": T0 + 3800, "tipo": "inicio", "total": 6},
+    ]
+
+
+def test_resumo_do_diario():
+    r = resumir(diario(), intervalo_min=5, top=2)
+
+    assert (r["eventos"], r["execucoes"], r["autos"], r["consultas"], r["cache"]) == (13, 2, 6, 5, 1)
+    assert r["inicio"].endswith("09:58:00")
+    assert r["resultados"] == {"sucesso": 3, "transitoria": 2, "nao_encontrado": 1}
+
+    # O acerto de cache (0s) fica fora da latência.
+    assert r["latencia"]["n"] == 5 and r["latencia"]["max"] == 9.0
+    assert r["etapas"]["busca"]["n"] == 3  # busca_1 e busca_2 juntas
+    assert r["etapas"]["detalhe"]["n"] == 1
+
+    janelas = [(v["janela"][-5:], v["autos"], v["falhas"]) for v in r["vazao"]]
+    assert janelas == [("09:55", 3, 0), ("10:00", 2, 2), ("11:00", 1, 0)]
+
+    assert [ev["auto"] for ev in r["mais_lentos"]] == ["AI0003", "AI0004"]
+    # Mensagens que só diferem em números caem no mesmo grupo.
+    assert len(r["falhas"]) == 1 and r["falhas"][0]["n"] == 2
+    assert r["falhas"][0]["mensagem"].startswith("[transitoria] Timeout após #s")
+
+    assert [(h["hora"], h["n"]) for h in r["por_hora"]] == [(9, 2), (10, 2), (11, 1)]
+    assert r["por_hora"][1]["taxa_falha"] == 1.0
+
+    assert r["sessao"] == {
+        "tentativas_extras": 1, "relogins": 1, "reinicios": 0, "reciclagens": 1,
+        "trocas_reserva": 0, "disjuntor_aberto": 1, "rodadas_adiadas": 0,
+    }
+    assert r["avisos"] == [{"mensagem": "Worker #: reiniciando em #s", "n": 2}]
+
+
+def test_diario_com_linha_truncada(tmp_path):
+    path = tmp_path / "eventos.jsonl"
+    linhas = [json.dumps(ev) for ev in diario()]
+    path.write_text("\n".join(linhas) + '\n{"ts": 1, "tipo": "au', encoding="utf-8")
+    eventos = ler_eventos(str(path))
+    assert len(eventos) == len(linhas)
+    texto = formatar(resumir(eventos))
+    assert "Autos: 6 (5 consultados, 1 do cache)" in texto
+
+
+def test_diario_vazio():
+    r = resumir([])
+    assert r["autos"] == 0 and r["latencia"]["n"] == 0 and r["vazao"] == []
+    assert "Período: - até -" in formatar(r)
@@ -0,0 +1,96 @@
+"""ReservaQuente e a troca de navegador, com um driver falso no lugar do Chromium."""
+import threading
+import time
+
+from antt_core import ReservaQuente, SeleniumRuntime, motivo_reciclagem
+
+
+class DriverFalso:
+    def __init__(self, nome):
+        self.nome = nome
+        self.liberar_get = threading.Event()
+        self.liberar_get.set()
+        self.em_get = threading.Event()
+        self.logado = True
+        self.encerrado = False
+
+    def get(self, url):
+        self.em_get.set()
+        self.liberar_get.wait(5)
+
+    def find_element(self, by, valor):
+        if not self.logado:
+            raise RuntimeError("sem o campo do auto")
+        return object()
+
+    def quit(self):
+        self.encerrado = True
+
+
+def runtime_com(driver, iniciado_em=0.0):
+    rt = SeleniumRuntime()
+    rt.driver = driver
+    rt.janela_main = f"{driver.nome}-main"
+    rt.iniciado_em = iniciado_em or time.time()
+    return rt
+
+
+def reserva_pronta(rt):
+    reserva = ReservaQuente(rt, "u", "p", headless=True, debug=False)
+    reserva.pronta = True
+    return reserva
+
+
+def test_troca_passa_o_navegador_logado_para_o_worker():
+    reserva = reserva_pronta(runtime_com(DriverFalso("reserva")))
+    antigo = DriverFalso("worker")
+    rt = runtime_com(antigo)
+
+    assert reserva.assumir_em(rt, 0, "driver caiu")
+    assert rt.driver.nome == "reserva" and rt.janela_main == "reserva-main"
+    assert antigo.encerrado
+    assert reserva.rt.driver is None and not reserva.pronta
+    assert reserva.trocas == 1
+    # Sem reserva pronta o worker segue pelo reinício a frio.
+    assert not reserva.assumir_em(runtime_com(DriverFalso("outro")), 1, "driver caiu")
+
+
+def test_idade_do_navegador_conta_da_troca(cfg_isolado):
+    cfg_isolado.reciclar_apos_autos = 0
+    cfg_isolado.reciclar_rss_mb = 0
+    cfg_isolado.reciclar_idade_min = 30
+    velho = runtime_com(DriverFalso("reserva"), iniciado_em=time.time() - 3600)
+    assert motivo_reciclagem(velho) is not None
+
+    reserva = reserva_pronta(velho)
+    rt = runtime_com(DriverFalso("worker"))
+    assert reserva.assumir_em(rt, 0, "reciclagem")
+    assert time.time() - rt.iniciado_em < 5
+    assert motivo_reciclagem(rt) is None
+
+
+def test_sonda_lenta_nao_trava_a_troca():
+    driver = DriverFalso("reserva")
+    reserva = reserva_pronta(runtime_com(driver))
+    driver.liberar_get.clear()
+    sonda = threading.Thread(target=reserva._sondar)
+    sonda.start()
+    assert driver.em_get.wait(5)
+
+    t0 = time.time()
+    assert not reserva.assumir_em(runtime_com(DriverFalso("worker")), 0, "driver caiu")
+    assert time.time() - t0 < 1.0
+
+    driver.liberar_get.set()
+    sonda.join(5)
+    assert reserva.pronta
+    assert reserva.assumir_em(runtime_com(DriverFalso("worker")), 0, "driver caiu")
+
+
+def test_sonda_que_perde_a_sessao_descarta_a_reserva():
+    driver = DriverFalso("reserva")
+    driver.logado = False
+    reserva = reserva_pronta(runtime_com(driver))
+    assert not reserva._sondar()
+    assert not reserva.pronta and driver.encerrado
+    assert not reserva.assumir_em(runtime_com(DriverFalso("worker")), 0, "driver caiu")
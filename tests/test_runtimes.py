@@ -0,0 +1,140 @@
+"""GerenciadorRuntimes: teto, fila FIFO e reaproveitamento dos runtimes emprestados aos jobs."""
+import threading
+import time
+
+import pytest
+
+from antt_core import BACKEND_HTTP, GerenciadorRuntimes
+
+
+class RuntimeFalso:
+    def __init__(self, backend):
+        self.backend = backend
+        self.vivo = True
+        self.parado = False
+
+    def is_alive(self):
+        return self.vivo
+
+    def stop(self):
+        self.parado = True
+        self.vivo = False
+
+
+@pytest.fixture
+def gerenciador():
+    criados = []
+
+    def criar(max_runtimes, **kwargs):
+        def fabrica(backend):
+            criados.append(RuntimeFalso(backend))
+            return criados[-1]
+
+        g = GerenciadorRuntimes(max_runtimes, fabrica=fabrica, **kwargs)
+        g.criados = criados
+        instancias.append(g)
+        return g
+
+    instancias = []
+    yield criar
+    for g in instancias:
+        g.encerrar()
+
+
+def esperar(cond, timeout=5.0):
+    fim = time.time() + timeout
+    while not cond():
+        if time.time() > fim:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def obter_em_thread(g, dono, atendidos, **kwargs):
+    def alvo():
+        concessao = g.obter(dono, 1, BACKEND_HTTP, "u", "p", **kwargs)
+        atendidos.append((dono, concessao))
+
+    t = threading.Thread(target=alvo, daemon=True)
+    t.start()
+    return t
+
+
+def test_teto_e_fila_na_ordem_de_chegada(gerenciador):
+    g = gerenciador(1)
+    a = g.obter("a", 3, BACKEND_HTTP, "u", "p")
+    assert len(a.runtimes) == 1  # o teto corta o pedido
+    assert g.resumo()["em_uso"] == 1
+
+    atendidos = []
+    tb = obter_em_thread(g, "b", atendidos)
+    assert esperar(lambda: g.resumo()["fila"] == 1)
+    tc = obter_em_thread(g, "c", atendidos)
+    assert esperar(lambda: g.resumo()["fila"] == 2)
+    time.sleep(0.1)
+    assert atendidos == []
+
+    a.devolver()
+    tb.join(5)
+    assert [dono for dono, _ in atendidos] == ["b"]
+    assert g.resumo()["fila"] == 1
+
+    atendidos[0][1].devolver()
+    tc.join(5)
+    assert [dono for dono, _ in atendidos] == ["b", "c"]
+    # Mesma credencial: b e c receberam o runtime que a devolveu.
+    assert len(g.criados) == 1
+    assert atendidos[1][1].runtimes == a.runtimes
+
+
+def test_cancelar_tira_o_pedido_da_fila(gerenciador):
+    g = gerenciador(1)
+    a = g.obter("a", 1, BACKEND_HTTP, "u", "p")
+    cancelar = threading.Event()
+    atendidos = []
+    t = obter_em_thread(g, "b", atendidos, cancelar=cancelar)
+    assert esperar(lambda: g.resumo()["fila"] == 1)
+    cancelar.set()
+    t.join(5)
+    assert atendidos == [("b", None)]
+    assert g.resumo()["fila"] == 0 and g.resumo()["em_uso"] == 1
+    a.devolver()
+    assert g.resumo()["em_uso"] == 0
+
+
+def test_ociosos_so_servem_a_mesma_credencial_e_perfil(gerenciador):
+    g = gerenciador(2)
+    a = g.obter("a", 1, BACKEND_HTTP, "u", "p", perfil="enxuto")
+    a.devolver()
+    assert g.resumo()["ociosos"] == 1
+
+    outro_perfil = g.obter("b", 1, BACKEND_HTTP, "u", "p", perfil="completo")
+    assert outro_perfil.runtimes != a.runtimes
+    outro_perfil.devolver()
+
+    mesmo = g.obter("c", 1, BACKEND_HTTP, "u", "p", perfil="enxuto")
+    assert mesmo.runtimes == a.runtimes
+    mesmo.devolver()
+
+    # Outra credencial pedindo o teto inteiro: os ociosos dos outros são encerrados.
+    v = g.obter("d", 2, BACKEND_HTTP, "v", "q", perfil="enxuto")
+    assert all(rt not in v.runtimes for rt in a.runtimes + outro_perfil.runtimes)
+    assert all(rt.parado for rt in a.runtimes + outro_perfil.runtimes)
+    assert g.resumo()["ociosos"] == 0 and g.resumo()["em_uso"] == 2
+    v.devolver()
+
+
+def test_runtime_morto_nao_volta_e_ociosos_vencem(gerenciador):
+    g = gerenciador(2, ocioso_s=0.05)
+    c = g.obter("a", 2, BACKEND_HTTP, "u", "p")
+    morto, vivo = c.runtimes
+    morto.vivo = False
+    c.devolver()
+    c.devolver()  # devolver de novo não mexe na contagem
+    assert morto.parado and not vivo.parado
+    assert g.resumo() == {"max": 2, "em_uso": 0, "ociosos": 1, "fila": 0, "concessoes": []}
+
+    time.sleep(0.1)
+    assert g.recolher_ociosos() == 1
+    assert vivo.parado
+    assert g.resumo()["ociosos"] == 0
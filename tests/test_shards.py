@@ -0,0 +1,84 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from antt_core import (
+    SHARD_CONCLUIDO,
+    SHARD_EM_ANDAMENTO,
+    SHARD_PENDENTE,
+    TabelaShards,
+    copiar_config,
+    dir_shards,
+    juntar_shards,
+    ler_info_shards,
+    preparar_shards,
+)
+
+
+@pytest.fixture
+def tabela(tmp_path):
+    t = TabelaShards(str(tmp_path / "shards.db"))
+    yield t
+    t.close()
+
+
+def test_criar_divide_e_e_idempotente(tabela):
+    assert tabela.criar(1050, 500) == 3
+    assert tabela.criar(10, 1) == 3
+    assert [(s["inicio"], s["fim"]) for s in tabela.listar()] == [(0, 500), (500, 1000), (1000, 1050)]
+
+
+def test_reivindicar_em_ordem_ate_acabar(tabela):
+    tabela.criar(3, 1)
+    assert [tabela.reivindicar("p1", 60)["id"] for _ in range(3)] == [0, 1, 2]
+    assert tabela.reivindicar("p2", 60) is None
+    assert tabela.contagem() == {SHARD_EM_ANDAMENTO: 3}
+
+
+def test_concessao_vencida_e_retomada_e_o_antigo_dono_perde_o_shard(tabela):
+    tabela.criar(1, 1)
+    tabela.reivindicar("p1", 0.01)
+    time.sleep(0.05)
+    shard = tabela.reivindicar("p2", 60)
+    assert (shard["id"], shard["tentativas"], shard["vencido_de"]) == (0, 2, "p1")
+    assert not tabela.renovar(0, "p1", 60)
+    assert not tabela.concluir(0, "p1")
+    assert tabela.renovar(0, "p2", 60)
+    assert tabela.concluir(0, "p2")
+    assert tabela.contagem() == {SHARD_CONCLUIDO: 1}
+
+
+def test_liberar_devolve_como_pendente(tabela):
+    tabela.criar(2, 1)
+    tabela.reivindicar("p1", 60)
+    assert tabela.liberar(0, "p1")
+    assert tabela.listar()[0]["estado"] == SHARD_PENDENTE
+    assert tabela.reivindicar("p2", 60)["id"] == 0
+
+
+def test_preparar_nao_depende_do_jobs_dir_global(tmp_path, cfg_isolado):
+    entrada = tmp_path / "entrada.csv"
+    entrada.write_text("Auto de Infração\n" + "\n".join(f"A{i:04d}" for i in range(7)) + "\n", encoding="utf-8")
+    jobs_dir = cfg_isolado.jobs_dir
+    job_id = preparar_shards(str(entrada), tamanho=3)
+    assert cfg_isolado.jobs_dir == jobs_dir
+    info = ler_info_shards(dir_shards(job_id))
+    assert (info["total"], info["shards"]) == (7, 3)
+    assert preparar_shards(str(entrada), tamanho=3) == job_id
+    with pytest.raises(FileNotFoundError):
+        ler_info_shards(dir_shards("inexistente"))
+    assert not os.path.exists(dir_shards("inexistente"))
+
+
+def test_colunas_extras_da_preparacao_valem_para_juntar(tmp_path):
+    entrada = tmp_path / "entrada.csv"
+    entrada.write_text("Auto de Infração;Placa\nA0001;ABC1234\nA0002;XYZ9876\n", encoding="utf-8")
+    cfg = copiar_config()
+    cfg.colunas_extra = ("Placa",)
+    job_id = preparar_shards(str(entrada), tamanho=1, cfg=cfg)
+    assert ler_info_shards(dir_shards(job_id))["colunas_extra"] == ["Placa"]
+    # O processo que junta não recebeu a configuração: a do job prevalece.
+    df = pd.read_excel(juntar_shards(job_id, parcial=True), dtype=str)
+    assert df["Placa"].tolist() == ["ABC1234", "XYZ9876"]
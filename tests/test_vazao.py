@@ -0,0 +1,118 @@
+from antt_core import (
+    DISJUNTOR_ABERTO,
+    DISJUNTOR_FECHADO,
+    DISJUNTOR_MEIO_ABERTO,
+    FALHA_PERMANENTE,
+    FALHA_SESSAO,
+    FALHA_TRANSITORIA,
+    METRICAS,
+    MSG_SESSAO_EXPIRADA,
+    ControleVazao,
+    DisjuntorFalhas,
+    classificar_falha,
+)
+
+OK = {"status": "sucesso"}
+TRANSITORIA = {"status": "erro", "falha": FALHA_TRANSITORIA}
+
+
+def test_classificacao_de_falhas():
+    assert classificar_falha({"status": "sucesso"}) is None
+    assert classificar_falha({"status": "nao_encontrado"}) == FALHA_PERMANENTE
+    assert classificar_falha({"status": "erro", "mensagem": MSG_SESSAO_EXPIRADA}) == FALHA_SESSAO
+    assert classificar_falha({"status": "erro", "mensagem": "Erro fluxo: Exceção de Sistema"}) == FALHA_TRANSITORIA
+    assert classificar_falha({"status": "erro", "mensagem": "Timeout"}) == FALHA_TRANSITORIA
+
+
+def test_comeca_sem_atraso_e_recua_numa_falha_transitoria():
+    v = ControleVazao(4)
+    assert (v.atraso, v.concorrencia) == (0.0, 4)
+    v.registrar(TRANSITORIA, 1.0)
+    assert (v.atraso, v.concorrencia, v.reducoes) == (0.5, 2, 1)
+    # Rajada: o segundo sinal dentro da carência não recua de novo.
+    v.registrar(TRANSITORIA, 1.0)
+    assert (v.atraso, v.concorrencia, v.reducoes) == (0.5, 2, 1)
+    assert v.ativo(1) and not v.ativo(2)
+
+
+def test_consultas_saudaveis_reduzem_o_atraso_e_reativam_workers():
+    v = ControleVazao(4, sucessos_para_subir=5)
+    v.registrar(TRANSITORIA, 1.0)
+    for _ in range(5):
+        v.registrar(OK, 1.0)
+    assert v.estado()["atraso"] == 0.0
+    assert v.concorrencia == 3
+
+
+def test_relogins_no_ritmo_da_sessao_nao_recuam_mas_em_excesso_sim():
+    v = ControleVazao(2, janela_relogins_s=300.0, max_relogins_por_worker=2)
+    for _ in range(3):
+        v.registrar({**OK, "relogins": 1}, 1.0)
+    assert v.reducoes == 0
+    v.registrar({**OK, "relogins": 1}, 1.0)
+    assert v.reducoes == 1
+    assert "4 relogins" in v.ultimo_sinal
+
+
+def test_reinicios_de_driver_recuam():
+    v = ControleVazao(4)
+    v.registrar({**OK, "reinicios": 1}, 1.0)
+    v.registrar({**OK, "reinicios": 1}, 1.0)
+    assert v.reducoes == 0
+    v.registrar({**OK, "reinicios": 1}, 1.0)
+    assert v.reducoes == 1
+    assert "3 reinícios" in v.ultimo_sinal
+
+
+def test_excecao_de_sistema_recua_mesmo_com_sucesso_na_repeticao():
+    v = ControleVazao(2)
+    v.registrar({**OK, "excecoes": 1}, 1.0)
+    assert v.reducoes == 1
+    assert "exceção de sistema" in v.ultimo_sinal
+
+
+def test_metricas_do_processo_nao_mexem_no_controle():
+    # Contadores globais somam todos os jobs: reinícios/exceções de outro job
+    # não podem recuar este.
+    v = ControleVazao(2)
+    for _ in range(5):
+        METRICAS.contar("driver_restart")
+        METRICAS.contar("relogin")
+        METRICAS.contar("pagina_excecao")
+        v.registrar(OK, 1.0)
+    assert v.reducoes == 0
+
+
+def test_latencia_muito_acima_da_base_recua():
+    v = ControleVazao(2)
+    for _ in range(10):
+        v.registrar(OK, 1.0)
+    # Consulta que incluiu subida do navegador/login não conta como lentidão do site.
+    v.registrar(OK, 10.0, preparo_sessao=True)
+    assert v.reducoes == 0
+    v.registrar(OK, 10.0)
+    assert v.reducoes == 1
+    assert "latência" in v.ultimo_sinal
+
+
+def test_cache_e_vazao_fixa_nao_mexem_no_controle():
+    v = ControleVazao(2)
+    v.registrar({**TRANSITORIA, "cache": True}, 0.0)
+    assert v.reducoes == 0
+    fixa = ControleVazao(2, adaptativo=False, atraso_fixo=0.3)
+    fixa.registrar(TRANSITORIA, 1.0)
+    assert (fixa.atraso, fixa.concorrencia) == (0.3, 2)
+
+
+def test_disjuntor_abre_sonda_e_fecha():
+    d = DisjuntorFalhas(janela=10, limite=0.5, minimo=4, pausa_s=0.0)
+    for _ in range(4):
+        d.registrar(0, TRANSITORIA)
+    assert d.estado == DISJUNTOR_ABERTO
+    # Pausa vencida: só o primeiro worker a pedir faz a sonda.
+    assert d.permitir(1)
+    assert d.estado == DISJUNTOR_MEIO_ABERTO
+    assert not d.permitir(0)
+    d.registrar(1, OK)
+    assert d.estado == DISJUNTOR_FECHADO
+    assert d.permitir(0)
@@ -0,0 +1,139 @@
+"""worker_loop com runtimes falsos: o que acontece em volta da consulta de cada auto."""
+import queue
+
+import pytest
+from selenium.common.exceptions import SessionNotCreatedException
+
+import antt_core
+from antt_core import (
+    METRICAS,
+    ControleVazao,
+    DisjuntorFalhas,
+    HttpRuntime,
+    JobParams,
+    JobState,
+    ReservaQuente,
+    SeleniumRuntime,
+    copiar_config,
+    worker_loop,
+)
+
+
+class DriverFalso:
+    def __init__(self, nome="worker"):
+        self.nome = nome
+        self.encerrado = False
+
+    def quit(self):
+        self.encerrado = True
+
+
+class RuntimeQueNaoSobe(SeleniumRuntime):
+    """Chromium que não consegue subir de novo (ex.: SessionNotCreatedException na reciclagem)."""
+
+    def start(self, headless=True):
+        raise SessionNotCreatedException("chrome não subiu")
+
+
+@pytest.fixture
+def rodar_worker(monkeypatch):
+    """Roda um worker_loop até esvaziar a fila, com `consultar` no lugar de processar_auto_com_cache."""
+    # worker_loop instala o log do job na thread corrente (a do pytest).
+    monkeypatch.setattr(antt_core._LOG_CTX, "sink", None, raising=False)
+    monkeypatch.setattr(antt_core._LOG_CTX, "eventos", None, raising=False)
+
+    def rodar(rt, autos, consultar, cfg=None, reserva=None):
+        monkeypatch.setattr(antt_core, "processar_auto_com_cache", consultar)
+        job = JobState("j")
+        job.reserva = reserva
+        job.vazao = ControleVazao(1)
+        job.disjuntor = DisjuntorFalhas()
+        fila = queue.Queue()
+        for pos, auto in enumerate(autos):
+            fila.put((pos, auto))
+        resultados = queue.Queue()
+        worker_loop(0, rt, fila, resultados, job, JobParams(usuario="u", senha="p", config=cfg or copiar_config()))
+        return job, [resultados.get_nowait() for _ in range(resultados.qsize())]
+
+    return rodar
+
+
+def test_falha_ao_reciclar_nao_derruba_o_worker(rodar_worker):
+    cfg = copiar_config()
+    cfg.reciclar_apos_autos = 1
+    cfg.reciclar_rss_mb = 0
+    rt = RuntimeQueNaoSobe()
+    rt.cfg = cfg
+    rt.driver = DriverFalso()
+    rt.iniciado_em = 1.0
+
+    consultados = []
+
+    def consultar(rt, auto, *args, **kwargs):
+        consultados.append((auto, rt.driver is not None))
+        rt.autos_servidos += 1
+        return {"status": "sucesso", "dados": {}, "mensagem": "OK"}
+
+    job, resultados = rodar_worker(rt, ["A1", "A2", "A3"], consultar, cfg)
+
+    # O primeiro auto dispara a reciclagem, que falha: os seguintes vão com o
+    # runtime parado (ensure_session o reinicia) em vez de a thread morrer.
+    assert consultados == [("A1", True), ("A2", False), ("A3", False)]
+    assert len(resultados) == 3
+    assert any("falha ao reciclar o navegador" in msg for _, _, msg in job.ultimos_logs())
+
+
+def test_sinais_de_sessao_vem_do_runtime_do_job(rodar_worker):
+    rt = HttpRuntime()
+
+    def consultar(rt, auto, *args, **kwargs):
+        rt.reinicios += 1
+        # Outro job no mesmo processo: conta nas métricas globais, não aqui.
+        METRICAS.contar("driver_restart")
+        METRICAS.contar("pagina_excecao")
+        return {"status": "sucesso", "dados": {}, "mensagem": "OK"}
+
+    job, resultados = rodar_worker(rt, ["A1", "A2", "A3"], consultar)
+    assert [res["reinicios"] for _, _, res, _ in resultados] == [1, 1, 1]
+    assert all("excecoes" not in res for _, _, res, _ in resultados)
+    assert job.vazao.reducoes == 1
+    assert "3 reinícios" in job.vazao.ultimo_sinal
+
+    def consultar_sem_incidentes(rt, auto, *args, **kwargs):
+        METRICAS.contar("driver_restart")
+        return {"status": "sucesso", "dados": {}, "mensagem": "OK"}
+
+    outro, _ = rodar_worker(HttpRuntime(), ["B1", "B2", "B3"], consultar_sem_incidentes)
+    assert outro.vazao.reducoes == 0
+
+
+def test_reserva_assume_quando_o_driver_cai(rodar_worker):
+    cfg = copiar_config()
+    cfg.reciclar_apos_autos = 0
+    cfg.reciclar_rss_mb = 0
+    cfg.reciclar_idade_min = 0
+    cfg.log_memoria_cada = 0
+    rt = SeleniumRuntime()
+    rt.cfg = cfg
+    rt.driver = caido = DriverFalso()
+    reserva_rt = SeleniumRuntime()
+    reserva_rt.driver = DriverFalso("reserva")
+    reserva = ReservaQuente(reserva_rt, "u", "p", headless=True, debug=False)
+    reserva.pronta = True
+
+    consultados = []
+
+    def consultar(rt, auto, *args, **kwargs):
+        consultados.append((auto, rt.driver.nome if rt.driver else None))
+        if auto == "A1":
+            rt.stop()  # processar_auto_com_recuperacao desistiu do Chromium
+            return {"status": "erro", "dados": {}, "mensagem": "driver caiu", "falha": "transitoria"}
+        return {"status": "sucesso", "dados": {}, "mensagem": "OK"}
+
+    _, resultados = rodar_worker(rt, ["A1", "A2"], consultar, cfg, reserva=reserva)
+
+    # O auto seguinte já vai no navegador da reserva, sem subida a frio.
+    assert consultados == [("A1", "worker"), ("A2", "reserva")]
+    assert caido.encerrado
+    assert reserva.trocas == 1 and not reserva.pronta
+    assert [res.get("reinicios") for _, _, res, _ in resultados] == [1, None]